@@ -0,0 +1,118 @@
+import codecs
+import select
+from collections import deque
+
+
+class CommandResult:
+    """Exit status and the tail of a remote command's output.
+
+    Only the last ``max_lines`` lines of each stream are kept; callers that
+    need every line get them through the ``on_stdout``/``on_stderr``
+    callbacks as they arrive. ``exit_status`` is the authoritative outcome.
+    """
+
+    def __init__(self, max_lines):
+        self.exit_status = None
+        self.stdout_lines = deque(maxlen=max_lines)
+        self.stderr_lines = deque(maxlen=max_lines)
+        self.stdout_count = 0
+        self.stderr_count = 0
+
+    @property
+    def ok(self):
+        return self.exit_status == 0
+
+    @property
+    def output(self):
+        return "".join(f"{line}\n" for line in self.stdout_lines)
+
+    @property
+    def error(self):
+        return "".join(f"{line}\n" for line in self.stderr_lines)
+
+    @property
+    def truncated(self):
+        return self.stdout_count > len(self.stdout_lines) or self.stderr_count > len(self.stderr_lines)
+
+
+class _LineSplitter:
+    """Incrementally decode bytes and emit complete lines"""
+
+    def __init__(self, sink):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.partial = ""
+        self.sink = sink
+
+    def feed(self, data):
+        text = self.partial + self.decoder.decode(data)
+        lines = text.split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.sink(line.rstrip("\r"))
+
+    def close(self):
+        text = self.partial + self.decoder.decode(b"", final=True)
+        self.partial = ""
+        if text:
+            self.sink(text.rstrip("\r"))
+
+
+def read_channel(channel, on_stdout=None, on_stderr=None, max_lines=5000, chunk_size=32768, poll_interval=1.0):
+    """Drain stdout and stderr of a paramiko channel together until the command exits.
+
+    Waiting on the channel with ``select`` and reading whichever stream has
+    data means neither stream can fill the SSH window and stall the remote
+    process while the other is being read, and memory stays bounded by
+    ``max_lines`` regardless of how much the command prints.
+    """
+    result = CommandResult(max_lines)
+
+    def stdout_line(line):
+        result.stdout_lines.append(line)
+        result.stdout_count += 1
+        if on_stdout:
+            on_stdout(line)
+
+    def stderr_line(line):
+        result.stderr_lines.append(line)
+        result.stderr_count += 1
+        if on_stderr:
+            on_stderr(line)
+
+    stdout = _LineSplitter(stdout_line)
+    stderr = _LineSplitter(stderr_line)
+
+    while True:
+        drained = False
+        if channel.recv_ready():
+            stdout.feed(channel.recv(chunk_size))
+            drained = True
+        if channel.recv_stderr_ready():
+            stderr.feed(channel.recv_stderr(chunk_size))
+            drained = True
+        if drained:
+            continue
+        if channel.exit_status_ready():
+            break
+        # A paramiko channel is readable when either stream has data or it closes
+        select.select([channel], [], [], poll_interval)
+
+    # Anything that raced in between the last read and the exit status
+    while channel.recv_ready():
+        stdout.feed(channel.recv(chunk_size))
+    while channel.recv_stderr_ready():
+        stderr.feed(channel.recv_stderr(chunk_size))
+    stdout.close()
+    stderr.close()
+
+    result.exit_status = channel.recv_exit_status()
+    return result
+
+
+def run_command(session, command, **kwargs):
+    """exec_command on a session (SSHClient or PooledSession) and read it with read_channel"""
+    stdin, stdout, stderr = session.exec_command(command)
+    channel = stdout.channel
+    # Commands here never read stdin; EOF stops anything that tries from blocking
+    channel.shutdown_write()
+    return read_channel(channel, **kwargs)
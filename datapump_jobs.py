@@ -0,0 +1,221 @@
+import re
+import time
+
+
+def make_job_name(prefix, timestamp):
+    """Build a JOB_NAME for expdp/impdp (upper case, at most 128 characters)"""
+    return f"{prefix}_{timestamp}".upper()[:128]
+
+
+class DataPumpJobState:
+    """Current or final state of a named Data Pump job"""
+
+    EXECUTING = "EXECUTING"
+    COMPLETED = "COMPLETED"
+    COMPLETED_WITH_ERRORS = "COMPLETED_WITH_ERRORS"
+    STOPPED = "STOPPED"
+    FAILED = "FAILED"
+    UNKNOWN = "UNKNOWN"
+
+    FINAL_STATES = (COMPLETED, COMPLETED_WITH_ERRORS, STOPPED, FAILED)
+
+    def __init__(self, job_name, state, errors=None, detail=""):
+        self.job_name = job_name
+        self.state = state
+        self.errors = errors or []
+        self.detail = detail
+
+    @property
+    def is_final(self):
+        return self.state in self.FINAL_STATES
+
+    @property
+    def completed(self):
+        """True when the job ran to the end, with or without object errors"""
+        return self.state in (self.COMPLETED, self.COMPLETED_WITH_ERRORS)
+
+    def __str__(self):
+        text = f"{self.job_name}: {self.state}"
+        if self.detail:
+            text += f" ({self.detail})"
+        if self.errors:
+            text += "; " + "; ".join(self.errors[:5])
+        return text
+
+
+# Final status lines written by expdp/impdp
+JOB_SUCCESS_RE = re.compile(r'Job "[^"]*"\."([^"]+)" successfully completed', re.IGNORECASE)
+JOB_ERRORS_RE = re.compile(r'Job "[^"]*"\."([^"]+)" completed with (\d+) error', re.IGNORECASE)
+JOB_FATAL_RE = re.compile(r'Job "[^"]*"\."([^"]+)" stopped due to fatal error', re.IGNORECASE)
+JOB_STOPPED_RE = re.compile(r'Job "[^"]*"\."([^"]+)" stopped', re.IGNORECASE)
+ORA_ERROR_RE = re.compile(r'\b(ORA-\d{5}|UDE-\d{5}|UDI-\d{5}|LRM-\d{5}):?.*')
+
+
+def parse_job_log(text, job_name):
+    """Return the final DataPumpJobState from Data Pump log text, or None if the job has not finished"""
+    errors = [match.group(0).strip() for match in ORA_ERROR_RE.finditer(text)]
+    state = None
+    detail = ""
+    for line in text.splitlines():
+        match = JOB_SUCCESS_RE.search(line)
+        if match and match.group(1).upper() == job_name.upper():
+            state, detail = DataPumpJobState.COMPLETED, ""
+            continue
+        match = JOB_ERRORS_RE.search(line)
+        if match and match.group(1).upper() == job_name.upper():
+            state, detail = DataPumpJobState.COMPLETED_WITH_ERRORS, f"{match.group(2)} error(s)"
+            continue
+        match = JOB_FATAL_RE.search(line)
+        if match and match.group(1).upper() == job_name.upper():
+            state, detail = DataPumpJobState.FAILED, "stopped due to fatal error"
+            continue
+        match = JOB_STOPPED_RE.search(line)
+        if match and match.group(1).upper() == job_name.upper():
+            state, detail = DataPumpJobState.STOPPED, line.strip()
+            continue
+        if "has been reopened" in line:
+            # Restarted after a stop; only later status lines count
+            state, detail = None, ""
+
+    if state is None:
+        return None
+    return DataPumpJobState(job_name, state, errors, detail)
+
+
+class DataPumpJobTracker:
+    """Follow a named Data Pump job until it reaches a final state.
+
+    Polls either ``DBA_DATAPUMP_JOBS`` over a cx_Oracle connection or the
+    tail of the job's log file over SSH. The poll interval starts at
+    ``min_interval`` and grows by ``backoff`` up to ``max_interval`` while
+    nothing changes, so short jobs are picked up almost immediately and long
+    ones are not polled needlessly.
+    """
+
+    LOG_TAIL_LINES = 200
+
+    def __init__(self, job_name, owner, min_interval=1.0, max_interval=30.0, backoff=1.5):
+        self.job_name = job_name.upper()
+        self.owner = owner.upper()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+    def poll_dictionary(self, connection):
+        """Return the job state from DBA_DATAPUMP_JOBS, or None once the job is gone"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT state FROM dba_datapump_jobs WHERE job_name = :1 AND owner_name = :2",
+                [self.job_name, self.owner]
+            )
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return self.dictionary_state(row[0] if row else None)
+
+    def poll_query(self, query):
+        """Same as poll_dictionary through a query function returning rows of fields (sqlplus or cx_Oracle)"""
+        rows = query(
+            "SELECT state FROM dba_datapump_jobs "
+            f"WHERE job_name = '{self.job_name}' AND owner_name = '{self.owner}'"
+        )
+        return self.dictionary_state(rows[0][0] if rows else None)
+
+    def dictionary_state(self, state):
+        if state is None:
+            return None
+        if state == "NOT RUNNING":
+            return DataPumpJobState(self.job_name, DataPumpJobState.STOPPED, detail="master table kept")
+        return DataPumpJobState(self.job_name, DataPumpJobState.EXECUTING, detail=state)
+
+    def directory_path(self, connection, directory):
+        """Resolve a Data Pump DIRECTORY object to its path on the database host"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT directory_path FROM dba_directories WHERE directory_name = :1",
+                [directory.upper()]
+            )
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        if row is None:
+            raise Exception(f"Directory {directory} does not exist")
+        return row[0]
+
+    def poll_log(self, session, log_path, missing_ok=False):
+        """Return the final state from the job's log, or None while the job is still running.
+
+        A missing log file means the job never started (FAILED) unless
+        missing_ok is set, in which case it is treated as still pending.
+        """
+        cmd = f"test -f {log_path} && tail -n {self.LOG_TAIL_LINES} {log_path} || echo __NO_LOG__"
+        stdin, stdout, stderr = session.exec_command(cmd)
+        text = stdout.read().decode(errors="replace")
+        if text.strip() == "__NO_LOG__":
+            if missing_ok:
+                return None
+            return DataPumpJobState(self.job_name, DataPumpJobState.FAILED, detail=f"log file {log_path} not found")
+        return parse_job_log(text, self.job_name)
+
+    def wait(self, poll, timeout=None, should_stop=None):
+        """Call poll() with adaptive backoff until it returns a final state"""
+        interval = self.min_interval
+        started = time.monotonic()
+        last_detail = None
+        while True:
+            state = poll()
+            if state is not None and state.is_final:
+                return state
+
+            detail = state.detail if state is not None else None
+            if detail != last_detail:
+                # Something changed; look again soon
+                interval = self.min_interval
+                last_detail = detail
+            else:
+                interval = min(self.max_interval, interval * self.backoff)
+
+            if timeout is not None and time.monotonic() - started > timeout:
+                return DataPumpJobState(self.job_name, DataPumpJobState.UNKNOWN, detail=f"no final state after {timeout}s")
+            if should_stop is not None and should_stop():
+                return DataPumpJobState(self.job_name, DataPumpJobState.UNKNOWN, detail="tracking stopped")
+            time.sleep(interval)
+
+    def wait_for_job(self, connection, session, log_path, timeout=None, startup_timeout=60, finish_grace=5):
+        """Wait on DBA_DATAPUMP_JOBS while the job runs, then read its final status from the log"""
+        return self.follow(
+            lambda: self.poll_dictionary(connection), session, log_path,
+            timeout=timeout, startup_timeout=startup_timeout, finish_grace=finish_grace
+        )
+
+    def follow(self, poll_job, session, log_path, timeout=None, startup_timeout=60, finish_grace=5,
+               should_stop=None):
+        """Follow the job through poll_job() while it is in the dictionary, then read its final status from the log.
+
+        A job that is neither in the dictionary nor finished in its log is
+        given startup_timeout seconds to appear and finish_grace polls to
+        write its last line before it is reported as FAILED.
+        """
+        started = time.monotonic()
+        missing_polls = [0]
+
+        def poll():
+            state = poll_job()
+            if state is not None:
+                missing_polls[0] = 0
+                return state
+            # Job is no longer (or not yet) in the dictionary: the log holds the outcome
+            final = self.poll_log(session, log_path, missing_ok=True)
+            if final is not None:
+                return final
+            missing_polls[0] += 1
+            if time.monotonic() - started > startup_timeout and missing_polls[0] > finish_grace:
+                return DataPumpJobState(
+                    self.job_name, DataPumpJobState.FAILED,
+                    detail="job is not running and its log has no final status"
+                )
+            return DataPumpJobState(self.job_name, DataPumpJobState.UNKNOWN, detail="waiting for status")
+
+        return self.wait(poll, timeout=timeout, should_stop=should_stop)
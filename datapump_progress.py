@@ -0,0 +1,190 @@
+import re
+import time
+from datapump_jobs import (DataPumpJobState, JOB_ERRORS_RE, JOB_FATAL_RE, JOB_STOPPED_RE,
+                           JOB_SUCCESS_RE, ORA_ERROR_RE)
+
+UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+# Lines expdp/impdp print while a job runs
+ESTIMATE_RE = re.compile(r'Total estimation using \w+ method:\s*([\d.]+)\s*([KMGT]?B)', re.IGNORECASE)
+PHASE_RE = re.compile(r'Processing object type\s+(\S+)', re.IGNORECASE)
+TABLE_RE = re.compile(
+    r'\.\s*\.\s*(exported|imported)\s+"([^"]+)"\."([^"]+)"(?::"([^"]+)")?\s+([\d.]+)\s*([KMGT]?B)\s+(\d+)\s+rows',
+    re.IGNORECASE
+)
+REOPENED_RE = re.compile(r'has been reopened', re.IGNORECASE)
+
+
+def to_bytes(value, unit):
+    return int(float(value) * UNITS[unit.upper()])
+
+
+class DataPumpEvent:
+    """One typed event parsed from expdp/impdp output"""
+
+    ESTIMATE = "estimate"
+    PHASE = "phase"
+    TABLE = "table"
+    ERROR = "error"
+    COMPLETED = "completed"
+    RESTARTED = "restarted"
+
+    def __init__(self, kind, **fields):
+        self.kind = kind
+        # estimate: bytes; phase: object_type; table: owner, table, partition, bytes, rows;
+        # error: code, message; completed: state (DataPumpJobState)
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        fields = {key: value for key, value in self.__dict__.items() if key != "kind"}
+        return f"DataPumpEvent({self.kind}, {fields})"
+
+
+class DataPumpOutputParser:
+    """Turn expdp/impdp output into DataPumpEvents one line at a time.
+
+    ``feed`` may be called from the command reader as lines arrive; the
+    final job state is available from ``state`` once a completion line for
+    ``job_name`` has been seen, so the outcome no longer depends on
+    substring guesses or on reading the log file afterwards.
+    """
+
+    def __init__(self, job_name):
+        self.job_name = job_name.upper()
+        self.errors = []
+        self.state = None
+
+    def feed(self, line):
+        """Parse one output line and return the events it produced"""
+        events = []
+        text = line.strip()
+        if not text:
+            return events
+
+        match = TABLE_RE.search(text)
+        if match:
+            events.append(DataPumpEvent(
+                DataPumpEvent.TABLE,
+                owner=match.group(2),
+                table=match.group(3),
+                partition=match.group(4),
+                bytes=to_bytes(match.group(5), match.group(6)),
+                rows=int(match.group(7))
+            ))
+            return events
+
+        match = PHASE_RE.search(text)
+        if match:
+            events.append(DataPumpEvent(DataPumpEvent.PHASE, object_type=match.group(1)))
+            return events
+
+        match = ESTIMATE_RE.search(text)
+        if match:
+            events.append(DataPumpEvent(DataPumpEvent.ESTIMATE, bytes=to_bytes(match.group(1), match.group(2))))
+            return events
+
+        if REOPENED_RE.search(text):
+            # Restarted after a stop; earlier completion lines no longer count
+            self.state = None
+            events.append(DataPumpEvent(DataPumpEvent.RESTARTED))
+            return events
+
+        state = self._completion(text)
+        if state:
+            self.state = state
+            events.append(DataPumpEvent(DataPumpEvent.COMPLETED, state=state))
+            return events
+
+        match = ORA_ERROR_RE.search(text)
+        if match:
+            self.errors.append(match.group(0).strip())
+            events.append(DataPumpEvent(DataPumpEvent.ERROR, code=match.group(1), message=match.group(0).strip()))
+        return events
+
+    def _completion(self, text):
+        for pattern, state in (
+            (JOB_SUCCESS_RE, DataPumpJobState.COMPLETED),
+            (JOB_ERRORS_RE, DataPumpJobState.COMPLETED_WITH_ERRORS),
+            (JOB_FATAL_RE, DataPumpJobState.FAILED),
+            (JOB_STOPPED_RE, DataPumpJobState.STOPPED),
+        ):
+            match = pattern.search(text)
+            if match and match.group(1).upper() == self.job_name:
+                if state == DataPumpJobState.COMPLETED_WITH_ERRORS:
+                    detail = f"{match.group(2)} error(s)"
+                elif state == DataPumpJobState.FAILED:
+                    detail = "stopped due to fatal error"
+                elif state == DataPumpJobState.STOPPED:
+                    detail = text
+                else:
+                    detail = ""
+                return DataPumpJobState(self.job_name, state, list(self.errors), detail)
+        return None
+
+
+class DataPumpProgress:
+    """Live throughput and ETA from parsed events.
+
+    The total comes from the export's estimate line, or for an import from
+    ``expected_bytes`` (what the export wrote). Throughput is measured from
+    the start of the TABLE_DATA phase, so metadata time does not dilute it.
+    """
+
+    def __init__(self, operation_type, expected_bytes=None):
+        self.operation_type = operation_type
+        self.expected_bytes = expected_bytes
+        self.done_bytes = 0
+        self.rows = 0
+        self.tables = 0
+        self.phase = None
+        self.last_table = None
+        self.started = time.monotonic()
+        self.data_started = None
+
+    def update(self, event):
+        if event.kind == DataPumpEvent.ESTIMATE:
+            self.expected_bytes = event.bytes
+        elif event.kind == DataPumpEvent.PHASE:
+            self.phase = event.object_type
+            if self.data_started is None and event.object_type.endswith("TABLE_DATA"):
+                self.data_started = time.monotonic()
+        elif event.kind == DataPumpEvent.TABLE:
+            if self.data_started is None:
+                self.data_started = self.started
+            self.done_bytes += event.bytes
+            self.rows += event.rows
+            self.tables += 1
+            self.last_table = f"{event.owner}.{event.table}" + (f":{event.partition}" if event.partition else "")
+
+    @property
+    def rate(self):
+        """Bytes per second since table data started moving"""
+        if self.data_started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.data_started
+        return self.done_bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def percent(self):
+        if not self.expected_bytes:
+            return None
+        return min(100.0, self.done_bytes * 100 / self.expected_bytes)
+
+    @property
+    def eta(self):
+        """Seconds until the expected bytes are done at the current rate, or None"""
+        if not self.expected_bytes or not self.rate:
+            return None
+        return max(0.0, (self.expected_bytes - self.done_bytes) / self.rate)
+
+    def __str__(self):
+        operation = self.operation_type.capitalize()
+        if self.tables == 0:
+            return f"{operation}: {self.phase or 'starting'}"
+        text = f"{operation}: {self.tables} tables, {self.done_bytes / 1024 / 1024:.0f} MB"
+        if self.expected_bytes:
+            text += f" of {self.expected_bytes / 1024 / 1024:.0f} MB ({self.percent:.0f}%)"
+        text += f" at {self.rate / 1024 / 1024:.1f} MB/s"
+        if self.eta is not None:
+            text += f", ETA {int(self.eta) // 60}m{int(self.eta) % 60:02d}s"
+        return text
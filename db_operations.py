@@ -1,17 +1,25 @@
-import cx_Oracle
-import paramiko
 import os
 from datetime import datetime
-import time
+from ssh_pool import default_pool
+from remote_env import default_env_cache
+from channel_reader import run_command
+from datapump_jobs import DataPumpJobTracker, make_job_name
+from refresh_runner import RefreshRunner
+from fanout_runner import FanOutRunner
 
 class OracleRefreshOperations:
-    def __init__(self, source_details, target_details):
+    def __init__(self, source_details, target_details, pool=None, env_cache=None):
         self.source = source_details
         self.target = target_details
+        self.pool = pool or default_pool
+        self.env_cache = env_cache or default_env_cache
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
     def connect_to_db(self, details):
         """Establish connection to Oracle database"""
+        # Imported here: headless SSH/sqlplus runs do not need Oracle client libraries
+        import cx_Oracle
+        
         dsn = cx_Oracle.makedsn(
             details['host'],
             details['port'],
@@ -23,124 +31,109 @@ class OracleRefreshOperations:
             dsn=dsn
         )
         
-    def get_remote_oracle_env(self, host, username, password):
-        """Get Oracle environment variables from remote server"""
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    def get_remote_oracle_env(self, host, username, password, refresh=False):
+        """Get Oracle environment variables from remote server (cached per host)"""
+        ssh = self.pool.get(host, username, password)
+        return self.env_cache.get(ssh, refresh=refresh)
         
-        try:
-            ssh.connect(host, username=username, password=password)
-            # Source the profile and print environment variables
-            cmd = "source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1; env | grep -E 'ORACLE|TNS|PATH'"
-            stdin, stdout, stderr = ssh.exec_command(cmd)
-            env_output = stdout.read().decode()
-            
-            # Parse environment variables
-            env_vars = {}
-            for line in env_output.splitlines():
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    env_vars[key.strip()] = value.strip()
-                    
-            return env_vars
-        finally:
-            ssh.close()
+    def ssh_session(self, details):
+        """Pooled SSH session for a runner details dict"""
+        return self.pool.get(details['host'], details['ssh_user'], details['ssh_password'])
+        
+    def open_sessions(self):
+        """Pooled SSH sessions to PROD and QA for the runner's details dicts"""
+        return [self.ssh_session(self.source), self.ssh_session(self.target)]
+        
+    def make_runner(self, config):
+        """Runner for a collected config on pooled sessions and the shared environment cache.
+        
+        A config with several ``targets`` gets a FanOutRunner that exports once for all of them.
+        """
+        targets = config.get('targets') or []
+        if len(targets) > 1:
+            target_sessions = [self.ssh_session(details) for details in targets]
+            return FanOutRunner(config, self.ssh_session(self.source), target_sessions, env_cache=self.env_cache)
+        if targets:
+            config = dict(config, target=targets[0])
+        source_session, target_session = self.open_sessions()
+        return RefreshRunner(config, source_session, target_session, env_cache=self.env_cache)
+        
+    def refresh_remote_env(self):
+        """Drop cached environments so the next command re-reads the profiles"""
+        self.env_cache.invalidate()
             
     def execute_remote_command(self, host, username, password, command):
         """Execute command on remote server using SSH with sourced environment"""
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Pooled transport: this only opens a new channel
+        ssh = self.pool.get(host, username, password)
         
-        try:
-            ssh.connect(host, username=username, password=password)
+        # Inject the cached Oracle environment instead of re-sourcing the profile
+        wrapped_command = self.env_cache.wrap(ssh, command)
+        
+        # Both streams are drained together; the exit status is the result
+        result = run_command(ssh, wrapped_command)
+        if not result.ok:
+            raise Exception(f"Remote command exited with status {result.exit_status}: {result.error.strip()}")
             
-            # Get Oracle environment
-            env_vars = self.get_remote_oracle_env(host, username, password)
+        return result.output
             
-            # Create the command with sourced environment
-            wrapped_command = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            export ORACLE_HOME="{env_vars.get('ORACLE_HOME', '')}"
-            export PATH="{env_vars.get('PATH', '')}"
-            export TNS_ADMIN="{env_vars.get('TNS_ADMIN', '')}"
-            export LD_LIBRARY_PATH="{env_vars.get('LD_LIBRARY_PATH', '')}"
-            {command}
-            """
+    def run_datapump_job(self, details, command, job_name, log_file, directory="DATA_PUMP_DIR"):
+        """Start expdp/impdp in the background and block until the job reports a final state"""
+        conn = self.connect_to_db(details)
+        try:
+            tracker = DataPumpJobTracker(job_name, details['user'])
+            log_path = f"{tracker.directory_path(conn, directory)}/{log_file}"
             
-            stdin, stdout, stderr = ssh.exec_command(wrapped_command)
-            output = stdout.read().decode()
-            error = stderr.read().decode()
+            # Detach the client so a dropped SSH connection cannot kill the job
+            self.execute_remote_command(
+                details['host'],
+                details['user'],
+                details['password'],
+                f"nohup {command.strip()} > /dev/null 2>&1 &"
+            )
             
-            if error:
-                raise Exception(f"Remote command error: {error}")
-                
-            return output
+            ssh = self.pool.get(details['host'], details['user'], details['password'])
+            state = tracker.wait_for_job(conn, ssh, log_path)
         finally:
-            ssh.close()
+            conn.close()
             
+        if not state.completed:
+            raise Exception(f"Data Pump job did not complete: {state}")
+        return state
+        
     def perform_full_refresh(self, dump_dir="/tmp"):
         """Perform full database refresh"""
         dump_file = f"{dump_dir}/full_export_{self.timestamp}.dmp"
         log_file = f"{dump_dir}/full_export_{self.timestamp}.log"
+        export_job = make_job_name("FULL_EXP", self.timestamp)
+        import_job = make_job_name("FULL_IMP", self.timestamp)
         
-        # Get environment variables from source and target servers
-        source_env = self.get_remote_oracle_env(
-            self.source['host'],
-            self.source['user'],
-            self.source['password']
-        )
-        
-        target_env = self.get_remote_oracle_env(
-            self.target['host'],
-            self.target['user'],
-            self.target['password']
-        )
-        
-        # Export command using source environment
+        # Export command (environment is injected by execute_remote_command)
         expdp_cmd = f"""
-        export ORACLE_HOME="{source_env.get('ORACLE_HOME', '')}"
-        export PATH="{source_env.get('PATH', '')}"
-        export TNS_ADMIN="{source_env.get('TNS_ADMIN', '')}"
         expdp {self.source['user']}/{self.source['password']}@{self.source['service']} \
         FULL=Y \
         DIRECTORY=DATA_PUMP_DIR \
         DUMPFILE=full_export_{self.timestamp}.dmp \
         LOGFILE=full_export_{self.timestamp}.log \
+        JOB_NAME={export_job} \
         FLASHBACK_TIME=systimestamp
         """
         
-        # Import command using target environment
+        # Import command (environment is injected by execute_remote_command)
         impdp_cmd = f"""
-        export ORACLE_HOME="{target_env.get('ORACLE_HOME', '')}"
-        export PATH="{target_env.get('PATH', '')}"
-        export TNS_ADMIN="{target_env.get('TNS_ADMIN', '')}"
         impdp {self.target['user']}/{self.target['password']}@{self.target['service']} \
         FULL=Y \
         DIRECTORY=DATA_PUMP_DIR \
         DUMPFILE=full_export_{self.timestamp}.dmp \
         LOGFILE=import_full_{self.timestamp}.log \
+        JOB_NAME={import_job} \
         TABLE_EXISTS_ACTION=REPLACE
         """
         
         try:
-            # Execute export with source environment
-            self.execute_remote_command(
-                self.source['host'],
-                self.source['user'],
-                self.source['password'],
-                expdp_cmd
-            )
-            
-            # Wait for export to complete
-            time.sleep(10)
-            
-            # Execute import with target environment
-            self.execute_remote_command(
-                self.target['host'],
-                self.target['user'],
-                self.target['password'],
-                impdp_cmd
-            )
+            # Run the export and start the import as soon as the job reports COMPLETED
+            self.run_datapump_job(self.source, expdp_cmd, export_job, f"full_export_{self.timestamp}.log")
+            self.run_datapump_job(self.target, impdp_cmd, import_job, f"import_full_{self.timestamp}.log")
             
             return True
             
@@ -152,65 +145,35 @@ class OracleRefreshOperations:
         schema_list = schemas.replace(" ", "")
         dump_file = f"{dump_dir}/schema_export_{self.timestamp}.dmp"
         log_file = f"{dump_dir}/schema_export_{self.timestamp}.log"
+        export_job = make_job_name("SCHEMA_EXP", self.timestamp)
+        import_job = make_job_name("SCHEMA_IMP", self.timestamp)
         
-        # Get environment variables from source and target servers
-        source_env = self.get_remote_oracle_env(
-            self.source['host'],
-            self.source['user'],
-            self.source['password']
-        )
-        
-        target_env = self.get_remote_oracle_env(
-            self.target['host'],
-            self.target['user'],
-            self.target['password']
-        )
-        
-        # Export command using source environment
+        # Export command (environment is injected by execute_remote_command)
         expdp_cmd = f"""
-        export ORACLE_HOME="{source_env.get('ORACLE_HOME', '')}"
-        export PATH="{source_env.get('PATH', '')}"
-        export TNS_ADMIN="{source_env.get('TNS_ADMIN', '')}"
         expdp {self.source['user']}/{self.source['password']}@{self.source['service']} \
         SCHEMAS={schema_list} \
         DIRECTORY=DATA_PUMP_DIR \
         DUMPFILE=schema_export_{self.timestamp}.dmp \
         LOGFILE=schema_export_{self.timestamp}.log \
+        JOB_NAME={export_job} \
         FLASHBACK_TIME=systimestamp
         """
         
-        # Import command using target environment
+        # Import command (environment is injected by execute_remote_command)
         impdp_cmd = f"""
-        export ORACLE_HOME="{target_env.get('ORACLE_HOME', '')}"
-        export PATH="{target_env.get('PATH', '')}"
-        export TNS_ADMIN="{target_env.get('TNS_ADMIN', '')}"
         impdp {self.target['user']}/{self.target['password']}@{self.target['service']} \
         SCHEMAS={schema_list} \
         DIRECTORY=DATA_PUMP_DIR \
         DUMPFILE=schema_export_{self.timestamp}.dmp \
         LOGFILE=import_schema_{self.timestamp}.log \
+        JOB_NAME={import_job} \
         TABLE_EXISTS_ACTION=REPLACE
         """
         
         try:
-            # Execute export with source environment
-            self.execute_remote_command(
-                self.source['host'],
-                self.source['user'],
-                self.source['password'],
-                expdp_cmd
-            )
-            
-            # Wait for export to complete
-            time.sleep(10)
-            
-            # Execute import with target environment
-            self.execute_remote_command(
-                self.target['host'],
-                self.target['user'],
-                self.target['password'],
-                impdp_cmd
-            )
+            # Run the export and start the import as soon as the job reports COMPLETED
+            self.run_datapump_job(self.source, expdp_cmd, export_job, f"schema_export_{self.timestamp}.log")
+            self.run_datapump_job(self.target, impdp_cmd, import_job, f"import_schema_{self.timestamp}.log")
             
             return True
             
@@ -0,0 +1,179 @@
+import json
+import os
+import shlex
+import threading
+import time
+from datetime import datetime
+
+
+def dump_glob(dump_file):
+    """Shell pattern for the files of a dumpfile= value (%U becomes *)"""
+    return dump_file.replace("%U", "*")
+
+
+def list_pieces(run_command, dir_path, dump_file, checksums=True):
+    """Name, size and (optionally) sha256 of each file of a dump set in dir_path.
+
+    ``run_command(command)`` runs a shell command on the host holding the
+    files and returns its stdout.
+    """
+    pattern = dump_glob(dump_file)
+    output = run_command(f"cd {shlex.quote(dir_path)} && stat -c '%n|%s' {pattern} 2>/dev/null; true")
+    pieces = {}
+    for line in output.splitlines():
+        if "|" in line:
+            name, size = line.strip().rsplit("|", 1)
+            pieces[name] = {'name': name, 'bytes': int(size), 'sha256': None}
+    if checksums and pieces:
+        output = run_command(f"cd {shlex.quote(dir_path)} && sha256sum {' '.join(shlex.quote(name) for name in pieces)}")
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].lstrip("*") in pieces:
+                pieces[parts[1].lstrip("*")]['sha256'] = parts[0]
+    return [pieces[name] for name in sorted(pieces)]
+
+
+class DumpEntry:
+    """One catalogued export: what it contains and where copies of it live"""
+
+    def __init__(self, stamp, source, mode, schemas, dump_file, scn=None, scn_time=None, pieces=None,
+                 locations=None, created_at=None, data_time=None):
+        self.stamp = stamp
+        # "host/pdb_name" of the exported database
+        self.source = source
+        self.mode = mode
+        self.schemas = sorted(schema.strip().upper() for schema in schemas if schema.strip())
+        self.dump_file = dump_file
+        self.scn = scn
+        # PROD's clock at that SCN
+        self.scn_time = scn_time
+        self.pieces = pieces or []
+        # [{'host': ..., 'dir_path': ...}] holding a complete copy
+        self.locations = locations or []
+        self.created_at = created_at or time.time()
+        # When the data was current (the SCN's time, on this host's clock); older entries only have created_at
+        self.data_time = data_time
+
+    @property
+    def total_bytes(self):
+        return sum(piece['bytes'] for piece in self.pieces)
+
+    @property
+    def taken_at(self):
+        return self.data_time or self.created_at
+
+    @property
+    def age(self):
+        """Seconds since the exported data was current, not since the export finished"""
+        return time.time() - self.taken_at
+
+    def matches(self, source, mode, schemas):
+        return (
+            self.source == source
+            and self.mode == mode
+            and self.schemas == sorted(schema.strip().upper() for schema in schemas if schema.strip())
+        )
+
+    def has_copy(self, host, dir_path):
+        return any(location['host'] == host and location['dir_path'] == dir_path for location in self.locations)
+
+    def same_pieces(self, pieces):
+        """True when pieces (from list_pieces) have the catalogued names and sizes"""
+        return (
+            [(piece['name'], piece['bytes']) for piece in pieces]
+            == [(piece['name'], piece['bytes']) for piece in self.pieces]
+        )
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __str__(self):
+        taken = datetime.fromtimestamp(self.taken_at).strftime("%Y-%m-%d %H:%M:%S")
+        scope = ",".join(self.schemas) if self.schemas else "full"
+        scn = f" SCN {self.scn}" if self.scn else ""
+        return (
+            f"{self.dump_file} ({scope}{scn}, {len(self.pieces)} files, "
+            f"{self.total_bytes / 1024 / 1024:.0f} MB, taken {taken})"
+        )
+
+
+class DumpCatalog:
+    """Exports known to this tool host, kept as JSON next to the grant snapshots.
+
+    A refresh records each export it writes (schemas, mode, SCN, pieces with
+    sizes and checksums) and every directory a complete copy was shipped to.
+    Before exporting, ``find`` returns the newest matching export younger
+    than the staleness limit; ``expired`` lists entries past the retention
+    period so their files can be removed from ``dir_path``. All methods are
+    thread-safe, and every change rewrites the file atomically.
+    """
+
+    def __init__(self, path="dump_catalog.json"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return [DumpEntry.from_dict(data) for data in json.load(f)['dumps']]
+        except FileNotFoundError:
+            return []
+
+    def _save(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({'dumps': [entry.to_dict() for entry in entries]}, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def entries(self):
+        with self._lock:
+            return self._load()
+
+    def record(self, entry):
+        with self._lock:
+            entries = [existing for existing in self._load() if existing.dump_file != entry.dump_file]
+            entries.append(entry)
+            self._save(entries)
+
+    def add_location(self, dump_file, host, dir_path):
+        """Note that a complete copy of dump_file now exists in host:dir_path"""
+        with self._lock:
+            entries = self._load()
+            for entry in entries:
+                if entry.dump_file == dump_file and not entry.has_copy(host, dir_path):
+                    entry.locations.append({'host': host, 'dir_path': dir_path})
+            self._save(entries)
+
+    def remove_location(self, dump_file, host, dir_path):
+        """Forget a copy; the entry goes once no copy is left"""
+        with self._lock:
+            entries = []
+            for entry in self._load():
+                if entry.dump_file == dump_file:
+                    entry.locations = [
+                        location for location in entry.locations
+                        if not (location['host'] == host and location['dir_path'] == dir_path)
+                    ]
+                    if not entry.locations:
+                        continue
+                entries.append(entry)
+            self._save(entries)
+
+    def find(self, source, mode, schemas, max_age):
+        """Newest export of the same database, mode and schemas no older than max_age seconds"""
+        candidates = [
+            entry for entry in self.entries()
+            if entry.matches(source, mode, schemas) and entry.age <= max_age
+        ]
+        return max(candidates, key=lambda entry: entry.taken_at) if candidates else None
+
+    def expired(self, retention):
+        """Entries older than retention seconds"""
+        return [entry for entry in self.entries() if entry.age > retention]
@@ -0,0 +1,377 @@
+import queue
+import shlex
+import threading
+import time
+
+# Stream codecs for on-the-wire compression: (compress, decompress, max level)
+CODECS = {
+    "gzip": ("gzip -c -{level}", "gzip -dc", 9),
+    "zstd": ("zstd -c -q -T0 -{level}", "zstd -dc -q", 19),
+}
+
+
+class TransferCancelled(Exception):
+    """Raised when a transfer is stopped by its should_stop callback"""
+
+
+class TransferStats:
+    """Byte count and timing for one transferred file.
+
+    ``bytes_sent`` is the size of the file; ``wire_bytes`` is what actually
+    crossed the network, which is smaller when a codec is used.
+    """
+
+    def __init__(self, path, bytes_sent, elapsed, wire_bytes=None, codec=None):
+        self.path = path
+        self.bytes_sent = bytes_sent
+        self.elapsed = elapsed
+        self.wire_bytes = bytes_sent if wire_bytes is None else wire_bytes
+        self.codec = codec
+
+    @property
+    def rate_mb_s(self):
+        """Effective throughput in file bytes per second"""
+        return self.bytes_sent / 1024 / 1024 / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def wire_rate_mb_s(self):
+        return self.wire_bytes / 1024 / 1024 / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def ratio(self):
+        return self.bytes_sent / self.wire_bytes if self.wire_bytes else 1.0
+
+    def __str__(self):
+        text = f"{self.path}: {self.bytes_sent / 1024 / 1024:.1f} MB in {self.elapsed:.1f}s ({self.rate_mb_s:.1f} MB/s)"
+        if self.codec:
+            text += (
+                f", {self.codec} {self.wire_bytes / 1024 / 1024:.1f} MB on the wire "
+                f"(ratio {self.ratio:.2f}x, wire {self.wire_rate_mb_s:.1f} MB/s)"
+            )
+        return text
+
+
+class SftpRelay:
+    """Stream dump files from the source host to the target host through this machine.
+
+    Reads are prefetched on the source SFTP channel with many outstanding
+    requests and writes are pipelined on the target channel, so neither side
+    waits for a round trip per block. A reader thread and the writer are
+    decoupled by a fixed-size ring of ``ring_size`` buffers of
+    ``chunk_size`` bytes, and reads are requested one ring's worth at a
+    time, which bounds memory to about two rings regardless of file size.
+
+    With a ``codec`` ("gzip" or "zstd") the file is compressed by a remote
+    pipe on the source host and decompressed by one on the target host
+    instead, so only compressed bytes cross the WAN. Progress callbacks then
+    receive wire bytes and ``total`` is None.
+    """
+
+    def __init__(self, source_session, target_session, chunk_size=1024 * 1024, ring_size=16,
+                 max_requests=64, progress=None, report_interval=2.0, should_stop=None,
+                 codec=None, level=3):
+        if codec and codec not in CODECS:
+            raise Exception(f"Unknown transfer codec {codec}; choose one of {', '.join(CODECS)}")
+        self.codec = codec or None
+        self.level = level
+        self._codec_checked = False
+        self.source_session = source_session
+        self.target_session = target_session
+        self.chunk_size = chunk_size
+        self.ring_size = ring_size
+        self.max_requests = max_requests
+        self.progress = progress
+        self.report_interval = report_interval
+        self.should_stop = should_stop
+        self._source_sftp = None
+        self._target_sftp = None
+
+    def _open(self):
+        if self._source_sftp is None:
+            self._source_sftp = self.source_session.open_sftp()
+        if self._target_sftp is None:
+            self._target_sftp = self.target_session.open_sftp()
+
+    def listdir_source(self, path):
+        """List a directory on the source host with file attributes"""
+        self._open()
+        return self._source_sftp.listdir_attr(path)
+
+    def close(self):
+        for sftp in (self._source_sftp, self._target_sftp):
+            if sftp is not None:
+                sftp.close()
+        self._source_sftp = None
+        self._target_sftp = None
+
+    def _read_into(self, source_path, size, ring, failure, abort):
+        """Reader thread: fill the ring with chunks, then a None sentinel.
+
+        Reads are requested one window of ``ring_size`` chunks at a time.
+        paramiko buffers prefetched replies whether or not they have been
+        read, so the next window is only requested once the previous one has
+        been handed to the ring (``put`` blocks while it is full). At most
+        one window waits in paramiko and one in the ring.
+        """
+        window = self.ring_size * self.chunk_size
+        try:
+            with self._source_sftp.open(source_path, "rb") as src:
+                offset = 0
+                while offset < size and not abort.is_set():
+                    end = min(offset + window, size)
+                    chunks = [
+                        (start, min(self.chunk_size, end - start))
+                        for start in range(offset, end, self.chunk_size)
+                    ]
+                    for chunk in src.readv(chunks, max_concurrent_prefetch_requests=self.max_requests):
+                        if abort.is_set() or not chunk:
+                            # Stopped, or the file shrank; the size check in copy() reports the latter
+                            return
+                        ring.put(chunk)
+                    offset = end
+        except Exception as e:
+            failure.append(e)
+        finally:
+            ring.put(None)
+
+    def copy(self, source_path, target_path, mode=0o644):
+        """Relay one file and return its TransferStats"""
+        if self.codec:
+            return self.copy_compressed(source_path, target_path, mode)
+        self._open()
+        size = self._source_sftp.stat(source_path).st_size
+
+        ring = queue.Queue(maxsize=self.ring_size)
+        failure = []
+        abort = threading.Event()
+        reader = threading.Thread(
+            target=self._read_into,
+            args=(source_path, size, ring, failure, abort),
+            name="sftp-relay-reader",
+            daemon=True
+        )
+
+        started = time.monotonic()
+        last_report = started
+        sent = 0
+        reader.start()
+        try:
+            with self._target_sftp.open(target_path, "wb") as dst:
+                dst.set_pipelined(True)
+                while True:
+                    chunk = ring.get()
+                    if chunk is None:
+                        break
+                    dst.write(chunk)
+                    sent += len(chunk)
+
+                    now = time.monotonic()
+                    if self.progress and now - last_report >= self.report_interval:
+                        self.progress(source_path, sent, size, sent / (now - started))
+                        last_report = now
+                    if self.should_stop and self.should_stop():
+                        raise TransferCancelled(f"Transfer of {source_path} cancelled")
+        finally:
+            # Stop and unblock the reader if the writer stopped early
+            abort.set()
+            while reader.is_alive():
+                try:
+                    ring.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            reader.join()
+
+        if failure:
+            raise failure[0]
+
+        written = self._target_sftp.stat(target_path).st_size
+        if written != size:
+            raise Exception(f"Size mismatch for {target_path}: expected {size} bytes, found {written}")
+        self._target_sftp.chmod(target_path, mode)
+
+        elapsed = time.monotonic() - started
+        if self.progress:
+            self.progress(source_path, sent, size, sent / elapsed if elapsed > 0 else 0.0)
+        return TransferStats(source_path, sent, elapsed)
+
+    def _check_codec(self):
+        """Make sure the codec binary exists on both hosts before streaming"""
+        if self._codec_checked:
+            return
+        binary = self.codec
+        for session, side in ((self.source_session, "source"), (self.target_session, "target")):
+            stdin, stdout, stderr = session.exec_command(f"command -v {binary}")
+            if stdout.channel.recv_exit_status() != 0:
+                raise Exception(f"{binary} is not installed on the {side} host")
+        self._codec_checked = True
+
+    def _pump_channel(self, channel, ring, failure, abort):
+        """Reader thread: move compressed bytes from the source pipe into the ring"""
+        try:
+            while not abort.is_set():
+                chunk = channel.recv(self.chunk_size)
+                if not chunk:
+                    break
+                ring.put(chunk)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            ring.put(None)
+
+    def copy_compressed(self, source_path, target_path, mode=0o644):
+        """Relay one file through remote compress/decompress pipes and return its TransferStats"""
+        self._check_codec()
+        self._open()
+        size = self._source_sftp.stat(source_path).st_size
+        compress, decompress, max_level = CODECS[self.codec]
+        level = max(1, min(int(self.level), max_level))
+
+        src_stdin, src_stdout, src_stderr = self.source_session.exec_command(
+            f"{compress.format(level=level)} {shlex.quote(source_path)}"
+        )
+        dst_stdin, dst_stdout, dst_stderr = self.target_session.exec_command(
+            f"{decompress} > {shlex.quote(target_path)}"
+        )
+        src_channel = src_stdout.channel
+        dst_channel = dst_stdin.channel
+
+        ring = queue.Queue(maxsize=self.ring_size)
+        failure = []
+        abort = threading.Event()
+        reader = threading.Thread(
+            target=self._pump_channel,
+            args=(src_channel, ring, failure, abort),
+            name="pipe-relay-reader",
+            daemon=True
+        )
+
+        started = time.monotonic()
+        last_report = started
+        wire = 0
+        reader.start()
+        try:
+            while True:
+                chunk = ring.get()
+                if chunk is None:
+                    break
+                dst_channel.sendall(chunk)
+                wire += len(chunk)
+
+                now = time.monotonic()
+                if self.progress and now - last_report >= self.report_interval:
+                    self.progress(source_path, wire, None, wire / (now - started))
+                    last_report = now
+                if self.should_stop and self.should_stop():
+                    raise TransferCancelled(f"Transfer of {source_path} cancelled")
+            dst_channel.shutdown_write()
+        except Exception:
+            # Stop both remote pipes; a half-written target file is useless
+            src_channel.close()
+            dst_channel.close()
+            raise
+        finally:
+            abort.set()
+            while reader.is_alive():
+                try:
+                    ring.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            reader.join()
+
+        if failure:
+            raise failure[0]
+        if src_channel.recv_exit_status() != 0:
+            raise Exception(f"{self.codec} failed on the source host: {src_stderr.read().decode().strip()}")
+        if dst_channel.recv_exit_status() != 0:
+            raise Exception(f"{self.codec} failed on the target host: {dst_stderr.read().decode().strip()}")
+
+        written = self._target_sftp.stat(target_path).st_size
+        if written != size:
+            raise Exception(f"Size mismatch for {target_path}: expected {size} bytes, found {written}")
+        self._target_sftp.chmod(target_path, mode)
+
+        elapsed = time.monotonic() - started
+        return TransferStats(source_path, size, elapsed, wire_bytes=wire, codec=self.codec)
+
+
+def parse_size(text):
+    """Convert a Data Pump size such as 2G, 500M or 1048576 to bytes"""
+    text = str(text).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    if text and text[-1] == "B":
+        text = text[:-1]
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class DumpPieceShipper:
+    """Ship the pieces of a ``%U`` dump file set while expdp is still writing it.
+
+    A piece counts as closed once it has reached (nearly) FILESIZE and its
+    size did not change between two polls. Data Pump never grows a full
+    piece again, but it may rewrite piece headers when the job ends, so the
+    final pass re-sends any piece whose size or mtime changed after it was
+    shipped. Pieces named in ``skip`` (already intact on the target) are
+    left alone, and ``on_copied`` receives the TransferStats of each copy.
+    """
+
+    # Pieces are closed slightly under FILESIZE because of block alignment
+    FULL_RATIO = 0.98
+
+    def __init__(self, relay, source_dir, target_dir, prefix, piece_size, poll_interval=10, log=None,
+                 skip=None, on_copied=None):
+        self.relay = relay
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.prefix = prefix
+        self.piece_size = piece_size
+        self.poll_interval = poll_interval
+        self.log = log or (lambda message: None)
+        self.skip = set(skip or ())
+        self.on_copied = on_copied
+        self.shipped = {}
+        self.stats = []
+        self._last_sizes = {}
+
+    def list_pieces(self):
+        """Return SFTP attributes of the pieces written so far, in file order"""
+        pieces = [
+            attr for attr in self.relay.listdir_source(self.source_dir)
+            if attr.filename.startswith(self.prefix) and attr.filename.endswith(".dmp")
+        ]
+        return sorted(pieces, key=lambda attr: attr.filename)
+
+    def ship_ready(self, final=False):
+        """Transfer every closed piece that has not been shipped in its current state"""
+        for attr in self.list_pieces():
+            name = attr.filename
+            state = (attr.st_size, attr.st_mtime)
+            if name in self.skip or self.shipped.get(name) == state:
+                continue
+            if not final:
+                stable = self._last_sizes.get(name) == attr.st_size
+                self._last_sizes[name] = attr.st_size
+                if attr.st_size < self.piece_size * self.FULL_RATIO or not stable:
+                    continue
+
+            action = "Re-sending" if name in self.shipped else "Shipping"
+            self.log(f"{action} dump piece {name} ({attr.st_size / 1024 / 1024:.0f} MB)")
+            stats = self.relay.copy(f"{self.source_dir}/{name}", f"{self.target_dir}/{name}")
+            self.shipped[name] = state
+            self.stats.append(stats)
+            self.log(f"Transferred {stats}")
+            if self.on_copied:
+                self.on_copied(stats)
+
+    def run(self, export_done, should_stop=None):
+        """Ship pieces until export_done is set, then ship the rest"""
+        while not export_done.is_set():
+            if should_stop and should_stop():
+                raise TransferCancelled("Dump piece transfer cancelled")
+            self.ship_ready()
+            export_done.wait(self.poll_interval)
+        if should_stop and should_stop():
+            raise TransferCancelled("Dump piece transfer cancelled")
+        self.ship_ready(final=True)
+        return self.stats
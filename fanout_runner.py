@@ -0,0 +1,232 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from refresh_runner import NETWORK_REFRESH, RefreshCancelled, RefreshRunner
+from run_spans import SpanRecorder
+
+# Per-target outcome of a fan-out run
+TARGET_PENDING = "not started"
+TARGET_RUNNING = "running"
+TARGET_COMPLETED = "completed"
+TARGET_FAILED = "failed"
+TARGET_CANCELLED = "cancelled"
+
+
+def target_label(details):
+    """Short name for a target in log lines and the status table"""
+    return details.get('name') or details['pdb_name']
+
+
+def duplicate_labels(targets):
+    """Labels shared by several targets; each target needs its own status, passwords and snapshot directory"""
+    seen = set()
+    duplicates = []
+    for details in targets:
+        label = target_label(details)
+        if label.upper() in seen and label not in duplicates:
+            duplicates.append(label)
+        seen.add(label.upper())
+    return duplicates
+
+
+class FanOutRunner:
+    """Export from PROD once and refresh several targets from the same dump.
+
+    ``config['targets']`` lists target details dicts (each may carry a
+    ``name``). A leader RefreshRunner sizes and runs the single export, then
+    one RefreshRunner per target transfers the dump, cleans, imports and runs
+    the post-refresh tasks with ``run(export=False)``, at most
+    ``target_concurrency`` at a time. A failing target does not stop the
+    others; each gets its own status and the run fails afterwards if any did.
+
+    Exposes the same control and ``events`` interface as RefreshRunner, so
+    the GUI and the CLI drive either. Pipelined transfer and per-schema jobs
+    interleave the export with one target's import and are turned off here.
+    """
+
+    def __init__(self, config, source_session, target_sessions, env_cache=None):
+        self.config = config
+        self.refresh_type = config['refresh_type']
+        self.target_concurrency = max(1, int(config.get('target_concurrency') or 2))
+        self.events = queue.Queue()
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.notes = []
+
+        base = {key: value for key, value in config.items() if key != 'targets'}
+        if base.get('pipelined'):
+            base['pipelined'] = False
+            self.notes.append("Pipelined transfer is off for fan-out runs; the dump is exported once, then copied")
+        if base.get('incremental'):
+            base['incremental'] = False
+            self.notes.append("Incremental mode is off for fan-out runs; each target has its own refresh point")
+        if int(base.get('schema_concurrency') or 1) > 1:
+            base['schema_concurrency'] = 1
+            self.notes.append("Per-schema jobs are off for fan-out runs; each target imports the whole dump")
+        if base.get('resume'):
+            self.notes.append("Fan-out runs cannot be resumed from a run journal; refreshing every target again")
+        # Target runners share one timestamp, so their journals would collide
+        base['journal'] = False
+        base['resume'] = None
+
+        snapshot_dir = config.get('snapshot_dir') or "snapshots"
+        targets = config['targets']
+        duplicates = duplicate_labels(targets)
+        if duplicates:
+            raise Exception(f"Several targets are called {', '.join(duplicates)}; give each target a distinct 'name'")
+
+        # One span file and textfile for the whole run; each span names its target
+        self.spans = SpanRecorder(
+            os.path.join(config.get('span_dir') or "logs", f"spans_{self.timestamp}.jsonl"),
+            self.timestamp,
+            config.get('prometheus_textfile'),
+            run_labels={
+                'source': f"{config['source']['host']}/{config['source']['pdb_name']}",
+                'target': ",".join(target_label(details) for details in targets),
+                'refresh_type': self.refresh_type
+            }
+        )
+        self.leader = RefreshRunner(
+            dict(base, target=targets[0]), source_session, target_sessions[0], env_cache,
+            events=self.events, label="PROD", timestamp=self.timestamp, spans=self.spans
+        )
+        self.runners = []
+        for details, session in zip(targets, target_sessions):
+            label = target_label(details)
+            self.runners.append(RefreshRunner(
+                dict(base, target=details, snapshot_dir=os.path.join(snapshot_dir, label)),
+                source_session, session, env_cache,
+                events=self.events, label=label, timestamp=self.timestamp, spans=self.spans
+            ))
+        self.status = {runner.label: TARGET_PENDING for runner in self.runners}
+        self.errors = {}
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Worker control, same interface as RefreshRunner
+    # ------------------------------------------------------------------
+    def all_runners(self):
+        return [self.leader] + self.runners
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fanout-runner", daemon=True)
+        self._thread.start()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_paused(self):
+        return self.leader.is_paused()
+
+    def pause(self):
+        for runner in self.all_runners():
+            runner.pause()
+
+    def resume(self):
+        for runner in self.all_runners():
+            runner.resume()
+
+    def cancel(self):
+        for runner in self.all_runners():
+            runner.cancel()
+
+    def log(self, message):
+        self.events.put(("log", message))
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+    def _run(self):
+        try:
+            self.run()
+            self.write_prometheus(True)
+            self.events.put(("done", None))
+        except RefreshCancelled as e:
+            self.log(f"\n=== {str(e)} ===")
+            self.write_prometheus(False)
+            self.events.put(("cancelled", str(e)))
+        except Exception as e:
+            self.log(f"\nERROR: {str(e)}")
+            self.write_prometheus(False)
+            self.events.put(("failed", str(e)))
+
+    def write_prometheus(self, success):
+        try:
+            self.spans.write_prometheus(success)
+        except Exception as e:
+            self.log(f"Warning: Could not write {self.spans.prometheus_path}: {str(e)}")
+
+    def run(self):
+        """Export once, then refresh every target from that dump"""
+        self.log(f"\n=== Fan-out refresh of {len(self.runners)} targets "
+                 f"({', '.join(self.status)}), {self.target_concurrency} at a time ===")
+        for note in self.notes:
+            self.log(note)
+        self.log(f"Timing spans: {self.spans.path}")
+
+        if self.refresh_type != NETWORK_REFRESH:
+            self.export_once()
+
+        with ThreadPoolExecutor(max_workers=self.target_concurrency, thread_name_prefix="fanout-target") as pool:
+            list(pool.map(self.run_target, self.runners))
+
+        self.log_status()
+        if self.leader.is_cancelled():
+            raise RefreshCancelled("Refresh cancelled by user")
+        failed = [label for label, status in self.status.items() if status == TARGET_FAILED]
+        if failed:
+            raise Exception(f"{len(failed)} of {len(self.runners)} targets failed: {', '.join(failed)}")
+        self.log("\n=== Fan-out refresh completed successfully! ===")
+
+    def export_once(self):
+        """Size and run (or reuse from the catalog) the single PROD export, then hand it to the target runners"""
+        leader = self.leader
+        try:
+            if leader.auto_size:
+                with leader.stage("Sizing plan"):
+                    leader.plan_sizing()
+            if not leader.reuse_catalogued_dump():
+                # Targets check their own disks and tablespaces before their transfer
+                if leader.preflight_checks:
+                    with leader.stage("Pre-flight"):
+                        leader.preflight(reused=False)
+                with leader.stage("Export"):
+                    leader.export_source()
+                leader.catalog_export()
+        finally:
+            leader.log_stage_timings()
+            leader.close()
+
+        for runner in self.runners:
+            runner.auto_size = False
+            runner.parallel = leader.parallel
+            runner.filesize = leader.filesize
+            runner.dump_stamp = leader.dump_stamp
+            runner.reused_dump = leader.reused_dump
+            runner.set_dump_layout(multi_piece=leader.multi_piece)
+            runner.export_bytes = dict(leader.export_bytes)
+            runner.export_points = dict(leader.export_points)
+            # Piece checksums let each target's journal verify the copies it made
+            runner.dump_pieces = dict(leader.dump_pieces)
+
+    def run_target(self, runner):
+        """Refresh one target from the shared dump; its outcome never affects the others"""
+        self.status[runner.label] = TARGET_RUNNING
+        try:
+            runner.run(export=False)
+            self.status[runner.label] = TARGET_COMPLETED
+        except RefreshCancelled:
+            self.status[runner.label] = TARGET_CANCELLED
+        except Exception as e:
+            self.status[runner.label] = TARGET_FAILED
+            self.errors[runner.label] = str(e)
+            runner.log(f"ERROR: {str(e)}")
+        finally:
+            runner.close()
+
+    def log_status(self):
+        self.log("\n=== Fan-out target status ===")
+        for label, status in self.status.items():
+            error = self.errors.get(label)
+            self.log(f"  {label:<20} {status}{f' ({error})' if error else ''}")
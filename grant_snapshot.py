@@ -0,0 +1,224 @@
+import json
+from datetime import datetime
+from remote_sql import sql_in_list
+from schema_clean import quote_literal
+
+# Grant kinds in replay order: DEFAULT_ROLE must follow the role grants it refers to.
+# Each entry is (DBMS_METADATA kind, dictionary view, grantee column, extra filter).
+GRANT_SOURCES = (
+    ('ROLE_GRANT', 'dba_role_privs', 'grantee', ""),
+    ('SYSTEM_GRANT', 'dba_sys_privs', 'grantee', ""),
+    ('OBJECT_GRANT', 'dba_tab_privs', 'grantee', ""),
+    ('TABLESPACE_QUOTA', 'dba_ts_quotas', 'username', ""),
+    ('DEFAULT_ROLE', 'dba_role_privs', 'grantee', " AND default_role = 'YES'"),
+)
+
+SQLTERMINATOR_ON = (
+    "BEGIN DBMS_METADATA.SET_TRANSFORM_PARAM(DBMS_METADATA.SESSION_TRANSFORM, 'SQLTERMINATOR', TRUE); END;"
+)
+
+
+def granted_ddl_query(schemas):
+    """One query returning (grantee, kind, DDL) for every grant kind of every schema.
+
+    GET_GRANTED_DDL raises ORA-31608 for a kind the user has nothing of, so
+    it is only called for (grantee, kind) pairs that exist in the dictionary.
+    Default and temporary tablespaces are not grants but are captured too.
+    """
+    in_list = sql_in_list(schemas)
+    pairs = " UNION ".join(
+        f"SELECT {column} grantee, '{kind}' kind, {order} ord FROM {view} WHERE {column} IN ({in_list}){extra}"
+        for order, (kind, view, column, extra) in enumerate(GRANT_SOURCES)
+    )
+    return f"""
+        SELECT grantee, kind, ddl FROM (
+            SELECT p.grantee, p.kind, p.ord, DBMS_METADATA.GET_GRANTED_DDL(p.kind, p.grantee) ddl
+            FROM ({pairs}) p
+            UNION ALL
+            SELECT username, 'USER_TABLESPACES', -1,
+                   TO_CLOB('ALTER USER "'||username||'" DEFAULT TABLESPACE "'||default_tablespace||
+                           '" TEMPORARY TABLESPACE "'||temporary_tablespace||'";')
+            FROM dba_users WHERE username IN ({in_list})
+        ) ORDER BY grantee, ord"""
+
+
+def split_ddl(text):
+    """Split DBMS_METADATA output (SQLTERMINATOR on) into single statements.
+
+    SQL statements end with ``;`` and are returned without it; PL/SQL
+    blocks (quota DDL) end with a ``/`` line and keep their ``END;``.
+    """
+    statements = []
+    current = []
+    plsql = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not current:
+            if not stripped:
+                continue
+            plsql = stripped.upper().startswith(("DECLARE", "BEGIN"))
+        if plsql and stripped == "/":
+            statements.append("\n".join(current).strip())
+            current = []
+            continue
+        current.append(line)
+        if not plsql and stripped.endswith(";"):
+            statements.append("\n".join(current).strip().rstrip(";"))
+            current = []
+    if current:
+        statement = "\n".join(current).strip()
+        statements.append(statement if plsql else statement.rstrip(";"))
+    return statements
+
+
+class GrantSnapshot:
+    """Grant DDL of a set of schemas, saved locally as JSON between backup and restore"""
+
+    def __init__(self, statements, taken_at=None):
+        # {schema: [(kind, ddl), ...]} in replay order
+        self.statements = statements
+        self.taken_at = taken_at or datetime.now().isoformat(timespec="seconds")
+
+    @classmethod
+    def from_rows(cls, rows, schemas):
+        """Build a snapshot from (grantee, kind, ddl text) rows"""
+        statements = {schema.strip().upper(): [] for schema in schemas if schema.strip()}
+        for grantee, kind, text in rows:
+            for ddl in split_ddl(text or ""):
+                statements.setdefault(grantee, []).append((kind, ddl))
+        return cls(statements)
+
+    def count(self):
+        return sum(len(ddls) for ddls in self.statements.values())
+
+    def for_schemas(self, schemas):
+        """Replay-ordered DDL for the given schemas"""
+        return [
+            ddl for schema in schemas
+            for kind, ddl in self.statements.get(schema.strip().upper(), [])
+        ]
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({'taken_at': self.taken_at, 'statements': self.statements}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        statements = {
+            schema: [tuple(entry) for entry in entries]
+            for schema, entries in data['statements'].items()
+        }
+        return cls(statements, data.get('taken_at'))
+
+
+def capture_grants(connection, schemas, arraysize=1000):
+    """Snapshot grants over a cx_Oracle connection in a single query.
+
+    CLOBs are fetched inline as strings so the whole result comes back in
+    ``arraysize`` batches instead of one LOB round trip per row.
+    """
+    import cx_Oracle
+
+    def clob_as_text(cursor, name, default_type, size, precision, scale):
+        if default_type == cx_Oracle.DB_TYPE_CLOB:
+            return cursor.var(cx_Oracle.DB_TYPE_LONG, arraysize=cursor.arraysize)
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(SQLTERMINATOR_ON)
+        cursor.arraysize = arraysize
+        cursor.prefetchrows = arraysize
+        cursor.outputtypehandler = clob_as_text
+        cursor.execute(granted_ddl_query(schemas))
+        return GrantSnapshot.from_rows(cursor.fetchall(), schemas)
+    finally:
+        cursor.close()
+
+
+def capture_grants_sqlplus(run_script, schemas):
+    """Snapshot grants with the same query through sqlplus, one output line per DDL line"""
+    output = run_script(f"""
+{SQLTERMINATOR_ON}
+/
+DECLARE
+    len PLS_INTEGER;
+    pos PLS_INTEGER;
+    nxt PLS_INTEGER;
+BEGIN
+    FOR g IN ({granted_ddl_query(schemas)}) LOOP
+        len := NVL(DBMS_LOB.GETLENGTH(g.ddl), 0);
+        pos := 1;
+        WHILE pos <= len LOOP
+            nxt := DBMS_LOB.INSTR(g.ddl, CHR(10), pos);
+            IF nxt = 0 THEN
+                nxt := len + 1;
+            END IF;
+            DBMS_OUTPUT.PUT_LINE('GRANT_DDL|'||g.grantee||'|'||g.kind||'|'||DBMS_LOB.SUBSTR(g.ddl, nxt - pos, pos));
+            pos := nxt + 1;
+        END LOOP;
+    END LOOP;
+END;
+/
+""", echo=False)
+
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("GRANT_DDL|"):
+            continue
+        grantee, kind, text = line[len("GRANT_DDL|"):].split("|", 2)
+        if rows and rows[-1][0] == grantee and rows[-1][1] == kind:
+            rows[-1][2] += "\n" + text
+        else:
+            rows.append([grantee, kind, text])
+    return GrantSnapshot.from_rows(rows, schemas)
+
+
+def restore_grants(connection, statements):
+    """Replay DDL in one batched round trip; return [(statement, error)] for those that failed"""
+    if not statements:
+        return []
+    cursor = connection.cursor()
+    try:
+        error = cursor.var(str, 4000, arraysize=len(statements))
+        cursor.setinputsizes(error=error)
+        cursor.executemany("""
+            BEGIN
+                :error := NULL;
+                EXECUTE IMMEDIATE :ddl;
+            EXCEPTION WHEN OTHERS THEN
+                :error := SQLERRM;
+            END;""", [{'ddl': ddl} for ddl in statements])
+        return [
+            (ddl, message) for ddl, message in zip(statements, error.values) if message
+        ]
+    finally:
+        cursor.close()
+
+
+def restore_grants_sqlplus(run_script, statements):
+    """Replay DDL as one PL/SQL block through sqlplus; return [(statement, error)] for those that failed"""
+    if not statements:
+        return []
+    calls = "\n".join(f"    run({index}, {quote_literal(ddl)});" for index, ddl in enumerate(statements))
+    output = run_script(f"""
+DECLARE
+    PROCEDURE run(p_index PLS_INTEGER, p_ddl VARCHAR2) IS
+    BEGIN
+        EXECUTE IMMEDIATE p_ddl;
+    EXCEPTION WHEN OTHERS THEN
+        DBMS_OUTPUT.PUT_LINE('GRANT_FAILED|'||p_index||'|'||SQLERRM);
+    END;
+BEGIN
+{calls}
+END;
+/
+""", echo=False)
+
+    failed = []
+    for line in output.splitlines():
+        if line.startswith("GRANT_FAILED|"):
+            index, message = line[len("GRANT_FAILED|"):].split("|", 1)
+            failed.append((statements[int(index)], message))
+    return failed
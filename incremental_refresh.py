@@ -0,0 +1,276 @@
+import json
+import os
+import re
+import threading
+import time
+from remote_sql import sql_in_list
+
+# Format of refresh point times, compared with PROD DATE columns
+POINT_TIME_FORMAT = "YYYY-MM-DD HH24:MI:SS"
+
+# Objects whose changes come along with their table in a TABLES= export
+TABLE_LEVEL_TYPES = ('TABLE', 'TABLE PARTITION', 'TABLE SUBPARTITION')
+IGNORED_TYPES = (
+    'INDEX', 'INDEX PARTITION', 'INDEX SUBPARTITION',
+    'LOB', 'LOB PARTITION', 'LOB SUBPARTITION', 'TRIGGER'
+)
+
+PLAIN_NAME_RE = re.compile(r'^[A-Z][A-Z0-9_#$]*$')
+
+
+def qualified_name(owner, table):
+    """OWNER.TABLE for a TABLES= list, quoting names that need it"""
+    parts = [part if PLAIN_NAME_RE.match(part) else f'"{part}"' for part in (owner, table)]
+    return ".".join(parts)
+
+
+def point_time(point):
+    return f"TO_DATE('{point['time']}', '{POINT_TIME_FORMAT}')"
+
+
+class RefreshPoints:
+    """Last refresh point per (source, target, schema), kept as JSON on this host.
+
+    A point is the SCN the refreshed data was exported at and PROD's clock
+    at that SCN; changes made after it are what an incremental refresh has
+    to move.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @staticmethod
+    def key(source, target):
+        return f"{source['host']}/{source['pdb_name']} -> {target['host']}/{target['pdb_name']}"
+
+    def get(self, source, target, schema):
+        with self._lock:
+            return self._load().get(self.key(source, target), {}).get(schema.upper())
+
+    def record(self, source, target, schemas, scn, taken):
+        with self._lock:
+            points = self._load()
+            pair = points.setdefault(self.key(source, target), {})
+            for schema in schemas:
+                pair[schema.upper()] = {'scn': scn, 'time': taken, 'recorded_at': time.time()}
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(points, f, indent=2)
+            os.replace(temporary, self.path)
+
+
+class IncrementalPlan:
+    """Tables to move, or why the refresh has to move whole schemas"""
+
+    def __init__(self, tables=None, fallback=None, total_tables=0):
+        # ["OWNER.TABLE", ...] for TABLES=; None when falling back
+        self.tables = tables
+        self.fallback = fallback
+        self.total_tables = total_tables
+
+    @property
+    def incremental(self):
+        return self.fallback is None
+
+    def __str__(self):
+        if not self.incremental:
+            return f"full schema refresh ({self.fallback})"
+        return f"{len(self.tables)} of {self.total_tables} tables changed"
+
+
+class IncrementalPlanner:
+    """Work out which PROD tables changed since each schema's last refresh point.
+
+    A table has changed when DBA_TAB_MODIFICATIONS shows DML or a truncate
+    after the point (monitoring info is flushed first), or when it, one of
+    its indexes or triggers had DDL or was created after it. Statistics
+    gathering clears DBA_TAB_MODIFICATIONS, so tables analysed after the
+    point with no modification row are checked by sampling ORA_ROWSCN.
+    Tables whose rows reference a changed table through a foreign key are
+    added, because replacing the parent drops the child's constraint.
+
+    The plan falls back to a full schema refresh when there is no point,
+    when other objects (views, code, sequences, types, ...) changed, when a
+    table was dropped on PROD, when a foreign key from outside the refreshed
+    schemas points at a changed table, or when more than ``max_fraction``
+    of the tables changed.
+    """
+
+    def __init__(self, query_source, query_target, run_source_script, log=None,
+                 sample_percent=5, max_fraction=0.5):
+        self.query_source = query_source
+        self.query_target = query_target
+        self.run_source_script = run_source_script
+        self.log = log or (lambda message: None)
+        self.sample_percent = sample_percent
+        self.max_fraction = max_fraction
+
+    def tables(self, query, schema):
+        rows = query(
+            "SELECT table_name FROM dba_tables "
+            f"WHERE owner = '{schema}' AND temporary = 'N' AND nested = 'NO' AND secondary = 'N' "
+            "AND NVL(iot_type, 'X') <> 'IOT_OVERFLOW' AND table_name NOT LIKE 'BIN$%'"
+        )
+        return {row[0] for row in rows}
+
+    def modified_tables(self, schema, point):
+        rows = self.query_source(
+            "SELECT DISTINCT table_name FROM dba_tab_modifications "
+            f"WHERE table_owner = '{schema}' AND timestamp > {point_time(point)} "
+            "AND (inserts + updates + deletes > 0 OR truncated = 'YES' OR drop_segments > 0)"
+        )
+        return {row[0] for row in rows}
+
+    def ddl_changes(self, schema, point):
+        """(table names touched by DDL, other objects changed) since the point"""
+        since = point_time(point)
+        rows = self.query_source(
+            "SELECT object_type||'|'||object_name FROM dba_objects "
+            f"WHERE owner = '{schema}' AND (last_ddl_time > {since} OR created > {since}) "
+            "AND object_name NOT LIKE 'BIN$%' "
+            "UNION "
+            "SELECT 'TABLE|'||i.table_name FROM dba_indexes i JOIN dba_objects o "
+            "ON o.owner = i.owner AND o.object_name = i.index_name AND o.object_type = 'INDEX' "
+            f"WHERE i.owner = '{schema}' AND i.table_owner = '{schema}' "
+            f"AND (o.last_ddl_time > {since} OR o.created > {since}) "
+            "UNION "
+            "SELECT 'TABLE|'||t.table_name FROM dba_triggers t JOIN dba_objects o "
+            "ON o.owner = t.owner AND o.object_name = t.trigger_name AND o.object_type = 'TRIGGER' "
+            f"WHERE t.owner = '{schema}' AND t.table_owner = '{schema}' AND t.base_object_type = 'TABLE' "
+            f"AND (o.last_ddl_time > {since} OR o.created > {since})"
+        )
+        tables = set()
+        others = []
+        for object_type, name in rows:
+            if object_type in TABLE_LEVEL_TYPES:
+                tables.add(name)
+            elif object_type not in IGNORED_TYPES:
+                others.append(f"{object_type} {schema}.{name}")
+        return tables, others
+
+    def analyzed_tables(self, schema, point):
+        rows = self.query_source(
+            "SELECT table_name FROM dba_tables "
+            f"WHERE owner = '{schema}' AND last_analyzed > {point_time(point)}"
+        )
+        return {row[0] for row in rows}
+
+    def rowscn_changed(self, schema, tables, point):
+        """Tables whose sampled ORA_ROWSCN is past the point; all of them if sampling fails"""
+        changed = set()
+        tables = sorted(tables)
+        for start in range(0, len(tables), 50):
+            batch = tables[start:start + 50]
+            sql = " UNION ALL ".join(
+                f"SELECT '{table}'||'|'||NVL(TO_CHAR((SELECT MAX(ORA_ROWSCN) FROM "
+                f"{qualified_name(schema, table)} SAMPLE BLOCK ({self.sample_percent}))), '0') FROM dual"
+                for table in batch
+            )
+            try:
+                for table, scn in self.query_source(sql):
+                    if int(scn) > int(point['scn']):
+                        changed.add(table)
+            except Exception as e:
+                self.log(f"ORA_ROWSCN sampling failed on {schema} ({str(e)}); treating analysed tables as changed")
+                changed.update(batch)
+        return changed
+
+    def foreign_keys(self, schemas):
+        """(child owner, child table, parent owner, parent table) for FKs touching the schemas"""
+        owners = sql_in_list(schemas)
+        rows = self.query_source(
+            "SELECT c.owner||'|'||c.table_name||'|'||p.owner||'|'||p.table_name "
+            "FROM dba_constraints c JOIN dba_constraints p "
+            "ON p.owner = c.r_owner AND p.constraint_name = c.r_constraint_name "
+            f"WHERE c.constraint_type = 'R' AND (c.owner IN ({owners}) OR p.owner IN ({owners}))"
+        )
+        return [tuple(row) for row in rows]
+
+    def plan(self, schemas, points):
+        """Return an IncrementalPlan for the schemas given their refresh points"""
+        schemas = [schema.strip().upper() for schema in schemas if schema.strip()]
+        missing = [schema for schema in schemas if not points.get(schema)]
+        if missing:
+            return IncrementalPlan(fallback=f"no refresh point for {', '.join(missing)}")
+
+        self.run_source_script("EXEC DBMS_STATS.FLUSH_DATABASE_MONITORING_INFO")
+
+        changed = set()
+        total = 0
+        for schema in schemas:
+            point = points[schema]
+            source_tables = self.tables(self.query_source, schema)
+            dropped = self.tables(self.query_target, schema) - source_tables
+            if dropped:
+                return IncrementalPlan(fallback=f"{len(dropped)} tables of {schema} no longer exist on PROD")
+
+            ddl_tables, others = self.ddl_changes(schema, point)
+            if others:
+                return IncrementalPlan(fallback=f"{', '.join(others[:5])} changed since the last refresh")
+
+            schema_changed = self.modified_tables(schema, point) | ddl_tables
+            unexplained = self.analyzed_tables(schema, point) - schema_changed
+            if unexplained:
+                schema_changed |= self.rowscn_changed(schema, unexplained, point)
+
+            total += len(source_tables)
+            changed |= {(schema, table) for table in schema_changed & source_tables}
+            self.log(f"  {schema}: {len(schema_changed & source_tables)} of {len(source_tables)} tables changed "
+                     f"since SCN {point['scn']} ({point['time']})")
+
+        # Replacing a parent drops the FKs that reference it: bring the children along
+        foreign_keys = self.foreign_keys(schemas)
+        added = True
+        while added:
+            added = False
+            for child_owner, child_table, parent_owner, parent_table in foreign_keys:
+                if (parent_owner, parent_table) in changed and (child_owner, child_table) not in changed:
+                    if child_owner not in schemas:
+                        return IncrementalPlan(
+                            fallback=f"{child_owner}.{child_table} outside the refresh references "
+                                     f"changed table {parent_owner}.{parent_table}"
+                        )
+                    changed.add((child_owner, child_table))
+                    added = True
+
+        if total and len(changed) > total * self.max_fraction:
+            return IncrementalPlan(
+                fallback=f"{len(changed)} of {total} tables changed; moving whole schemas is cheaper",
+                total_tables=total
+            )
+        tables = [qualified_name(owner, table) for owner, table in sorted(changed)]
+        return IncrementalPlan(tables=tables, total_tables=total)
+
+
+def sequence_sync_script(source_rows, target_rows):
+    """PL/SQL that moves QA sequences forward to PROD's LAST_NUMBER.
+
+    A TABLES= import brings rows but not sequences, so values generated on
+    PROD since the last refresh would otherwise be handed out again on QA.
+    Rows are (owner, sequence, last_number).
+    """
+    target = {(owner, name): int(number) for owner, name, number in target_rows}
+    statements = []
+    for owner, name, number in source_rows:
+        if (owner, name) in target and target[(owner, name)] < int(number):
+            statements.append(
+                "    BEGIN\n"
+                f"        EXECUTE IMMEDIATE 'ALTER SEQUENCE \"{owner}\".\"{name}\" RESTART START WITH {int(number)}';\n"
+                "    EXCEPTION WHEN OTHERS THEN\n"
+                f"        DBMS_OUTPUT.PUT_LINE('SEQUENCE_FAILED|{owner}.{name}|' || SQLERRM);\n"
+                "    END;"
+            )
+    if not statements:
+        return None
+    return "BEGIN\n" + "\n".join(statements) + "\nEND;\n/\n"
@@ -0,0 +1,93 @@
+import threading
+from contextlib import contextmanager
+
+
+class OracleConnectionPool:
+    """Keyed pool of cx_Oracle session pools, one per (host, port, service, user).
+
+    cx_Oracle is imported on first use: it needs Oracle client libraries on
+    this machine, which the SSH/sqlplus paths do not. Callers should check
+    ``available()`` and fall back to sqlplus over SSH when it returns False.
+    """
+
+    def __init__(self, min_sessions=1, max_sessions=16, arraysize=1000):
+        self.min_sessions = min_sessions
+        self.max_sessions = max_sessions
+        self.arraysize = arraysize
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        """True when cx_Oracle and the Oracle client libraries can be loaded"""
+        try:
+            import cx_Oracle
+            cx_Oracle.clientversion()
+            return True
+        except Exception:
+            return False
+
+    def get(self, host, port, service, user, password):
+        """Return the session pool for a database, creating it on first use"""
+        import cx_Oracle
+
+        key = (host, port, service, user)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is not None and pool.password != password:
+                # Credentials changed; drop the old pool
+                pool.pool.close(force=True)
+                pool = None
+            if pool is None:
+                pool = _KeyedPool(
+                    cx_Oracle.SessionPool(
+                        user=user,
+                        password=password,
+                        dsn=cx_Oracle.makedsn(host, port, service_name=service),
+                        min=self.min_sessions,
+                        max=self.max_sessions,
+                        increment=1,
+                        threaded=True
+                    ),
+                    password
+                )
+                self._pools[key] = pool
+        return pool.pool
+
+    def pool_for(self, details):
+        """Session pool for a PROD/QA details dict"""
+        return self.get(
+            details['host'],
+            details.get('port') or 1521,
+            details['pdb_name'],
+            details['oracle_user'],
+            details['oracle_password']
+        )
+
+    @contextmanager
+    def connection(self, details):
+        """Acquire a pooled connection for a PROD/QA details dict and release it afterwards"""
+        pool = self.pool_for(details)
+        connection = pool.acquire()
+        try:
+            yield connection
+        finally:
+            pool.release(connection)
+
+    def close_all(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.pool.close(force=True)
+            self._pools = {}
+
+
+class _KeyedPool:
+    """A session pool and the password it was created with"""
+
+    def __init__(self, pool, password):
+        self.pool = pool
+        self.password = password
+
+
+# Shared by the refresh runner and its helpers
+default_oracle_pool = OracleConnectionPool()
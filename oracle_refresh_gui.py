@@ -3,14 +3,19 @@ from tkinter import messagebox, scrolledtext
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from ttkbootstrap.scrolled import ScrolledFrame
-from ttkbootstrap.dialogs import Messagebox
 import json
 import os
-import paramiko
-from dotenv import load_dotenv
-import cx_Oracle
-from datetime import datetime
-from db_operations import OracleRefreshOperations
+import queue
+import threading
+from refresh_runner import RefreshRunner, FULL_REFRESH, SCHEMA_REFRESH, NETWORK_REFRESH
+from fanout_runner import target_label
+from terminal_log import TerminalLogSink
+from ssh_pool import default_pool
+from refresh_planner import SizingPlanner
+from remote_sql import run_query
+from remote_env import default_env_cache
+from schema_clean import CLEAN_MODES, CLEAN_OBJECTS
+from post_refresh import STATS_CONCURRENT, STATS_SESSIONS
 
 class ModernTheme:
     """Modern color scheme and styles"""
@@ -44,6 +49,12 @@ class ModernTheme:
     LIGHT_TERMINAL_FG = "#202124"
     
 class OracleRefreshGUI:
+    # Interval for draining refresh worker events on the Tk thread
+    EVENT_POLL_MS = 100
+    
+    # Lines kept in the Operation Log widget; older lines live in logs/*.log
+    TERMINAL_MAX_LINES = 5000
+
     def __init__(self, root):
         self.root = root
         self.root.title("Oracle 19c PDB Refresh Tool")
@@ -58,19 +69,43 @@ class OracleRefreshGUI:
         self.main_frame = ScrolledFrame(self.root, autohide=True)
         self.main_frame.pack(fill=BOTH, expand=YES, padx=ModernTheme.MARGIN)
         
-        # Create header with theme toggle
-        self.create_header()
-        self.create_source_section()
-        self.create_target_section()
-        self.create_refresh_section()
-        self.create_terminal_section()
-        
         # Initialize sessions
         self.source_session = None
         self.target_session = None
         
+        # Background refresh worker
+        self.runner = None
+
+        # Log lines written before the terminal section is built wait in the
+        # sink and appear once the widget is attached
+        self.log_sink = TerminalLogSink(self.root, None, max_lines=self.TERMINAL_MAX_LINES)
+        self.log_sink.start()
+        
+        # The header goes up before the first paint; the other sections are
+        # built one per event-loop turn so the window appears straight away
+        self.create_header()
+        self._pending_sections = [
+            self.create_source_section,
+            self.create_target_section,
+            self.create_refresh_section,
+            self.create_terminal_section
+        ]
+        self.root.after_idle(self._build_next_section)
+        
+    def _build_next_section(self):
+        """Build one pending section and schedule the next"""
+        if self._pending_sections:
+            self._pending_sections.pop(0)()
+            self.root.after_idle(self._build_next_section)
+            
+    def is_built(self):
+        """True once every section exists"""
+        return not self._pending_sections
+        
     def toggle_theme(self):
         """Toggle between light and dark themes"""
+        if not self.is_built():
+            return
         self.is_dark_mode = not self.is_dark_mode
         new_theme = "darkly" if self.is_dark_mode else "cosmo"
         self.root.style.theme_use(new_theme)
@@ -106,7 +141,7 @@ class OracleRefreshGUI:
             self.target_host, self.target_ssh_user, self.target_ssh_password,
             self.target_oracle_user, self.target_oracle_password, self.target_pdb_name,
             self.target_dir_name, self.target_dir_path,
-            self.schema_entry
+            self.schema_entry, self.filesize_entry
         ]
         
         for entry in entries:
@@ -440,7 +475,7 @@ class OracleRefreshGUI:
         # Initialize refresh type combobox with theme-aware colors
         self.refresh_type = ttk.Combobox(
             type_frame,
-            values=["FULL", "Schema"],
+            values=[FULL_REFRESH, SCHEMA_REFRESH, NETWORK_REFRESH],
             state="readonly",
             bootstyle=f"{ModernTheme.SUCCESS}"
         )
@@ -486,6 +521,112 @@ class OracleRefreshGUI:
         self.schema_entry = ttk.Entry(schema_entry_frame)
         self.schema_entry.pack(side=LEFT, fill=X, expand=YES)
         
+        # One Data Pump job per schema, this many running at once on each host
+        ttk.Label(
+            schema_entry_frame,
+            text="Jobs per host:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(ModernTheme.PADDING, ModernTheme.PADDING))
+        
+        self.schema_concurrency = ttk.Spinbox(schema_entry_frame, from_=1, to=8, width=4)
+        self.schema_concurrency.set(1)
+        self.schema_concurrency.pack(side=LEFT)
+        
+        # How the QA schemas are emptied before import
+        clean_frame = ttk.Frame(schema_frame)
+        clean_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        ttk.Label(
+            clean_frame,
+            text="Clean mode:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.clean_mode_combo = ttk.Combobox(
+            clean_frame,
+            values=list(CLEAN_MODES),
+            state="readonly",
+            width=10,
+            bootstyle=f"{ModernTheme.SUCCESS}"
+        )
+        self.clean_mode_combo.set(CLEAN_OBJECTS)
+        self.clean_mode_combo.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            clean_frame,
+            text="Sessions (parallel):",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.clean_sessions = ttk.Spinbox(clean_frame, from_=1, to=16, width=4)
+        self.clean_sessions.set(4)
+        self.clean_sessions.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            clean_frame,
+            text="recreate = DROP USER CASCADE and replay captured DDL",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT)
+        
+        # Incremental: move only tables changed since the last refresh of these schemas
+        incremental_frame = ttk.Frame(schema_frame)
+        incremental_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            incremental_frame,
+            text="Incremental (only tables changed since the last refresh; falls back to full schemas when unsafe)",
+            variable=self.incremental_var,
+            bootstyle=f"{ModernTheme.SUCCESS}-round-toggle"
+        ).pack(side=LEFT)
+        
+        # Post-refresh recompilation and statistics fan-out
+        post_frame = ttk.Frame(schema_frame)
+        post_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        ttk.Label(
+            post_frame,
+            text="Recompile threads:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.recompile_threads = ttk.Spinbox(post_frame, from_=1, to=32, width=4)
+        self.recompile_threads.set(4)
+        self.recompile_threads.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            post_frame,
+            text="Statistics:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.stats_mode_combo = ttk.Combobox(
+            post_frame,
+            values=[STATS_SESSIONS, STATS_CONCURRENT],
+            state="readonly",
+            width=10,
+            bootstyle=f"{ModernTheme.SUCCESS}"
+        )
+        self.stats_mode_combo.set(STATS_SESSIONS)
+        self.stats_mode_combo.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            post_frame,
+            text="Sessions:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.stats_sessions = ttk.Spinbox(post_frame, from_=1, to=16, width=4)
+        self.stats_sessions.set(4)
+        self.stats_sessions.pack(side=LEFT)
+        
         # Set initial colors for schema entry
         if self.is_dark_mode:
             self.schema_entry.configure(
@@ -500,6 +641,158 @@ class OracleRefreshGUI:
         if self.refresh_type.get() == "FULL":
             self.schema_entry.configure(state="disabled")
         
+        # Transfer options
+        transfer_frame = ttk.Frame(options_frame)
+        transfer_frame.pack(fill=X, pady=(0, ModernTheme.PADDING))
+        
+        transfer_label = ttk.Label(
+            transfer_frame,
+            text="Transfer Options",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_MEDIUM, "bold"),
+            bootstyle=f"{ModernTheme.SUCCESS}"
+        )
+        transfer_label.pack(fill=X, pady=(0, ModernTheme.PADDING))
+        
+        transfer_options_frame = ttk.Frame(transfer_frame)
+        transfer_options_frame.pack(fill=X)
+        
+        # Multi-piece dump shipped while expdp is still running
+        self.pipelined_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            transfer_options_frame,
+            text="Ship dump pieces while exporting",
+            variable=self.pipelined_var,
+            bootstyle=f"{ModernTheme.SUCCESS}-round-toggle"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            transfer_options_frame,
+            text="Piece size (FILESIZE):",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.filesize_entry = ttk.Entry(transfer_options_frame, width=8)
+        self.filesize_entry.insert(0, "2G")
+        self.filesize_entry.pack(side=LEFT)
+        
+        # Compression on the wire or inside expdp
+        compression_frame = ttk.Frame(transfer_frame)
+        compression_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        ttk.Label(
+            compression_frame,
+            text="Wire compression:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.codec_combo = ttk.Combobox(
+            compression_frame,
+            values=["none", "gzip", "zstd"],
+            state="readonly",
+            width=6,
+            bootstyle=f"{ModernTheme.SUCCESS}"
+        )
+        self.codec_combo.set("none")
+        self.codec_combo.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            compression_frame,
+            text="Level:",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.compression_level = ttk.Spinbox(compression_frame, from_=1, to=19, width=4)
+        self.compression_level.set(3)
+        self.compression_level.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.expdp_compression_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            compression_frame,
+            text="expdp COMPRESSION=ALL (Advanced Compression license)",
+            variable=self.expdp_compression_var,
+            bootstyle=f"{ModernTheme.SUCCESS}-round-toggle"
+        ).pack(side=LEFT)
+        
+        # Dump catalog: reuse a recent export of the same scope, expire old dump files
+        catalog_frame = ttk.Frame(transfer_frame)
+        catalog_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        ttk.Label(
+            catalog_frame,
+            text="Reuse export newer than (min, 0 = never):",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.reuse_dump_minutes = ttk.Spinbox(catalog_frame, from_=0, to=1440, increment=15, width=6)
+        self.reuse_dump_minutes.set(0)
+        self.reuse_dump_minutes.pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Label(
+            catalog_frame,
+            text="Remove dumps older than (h, 0 = keep):",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.dump_retention_hours = ttk.Spinbox(catalog_frame, from_=0, to=720, increment=12, width=6)
+        self.dump_retention_hours.set(0)
+        self.dump_retention_hours.pack(side=LEFT)
+        
+        # Pre-flight: refuse a refresh whose dump or data will not fit
+        preflight_frame = ttk.Frame(transfer_frame)
+        preflight_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        self.preflight_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            preflight_frame,
+            text="Pre-flight checks (dump estimate, free space, tablespace headroom, predicted duration)",
+            variable=self.preflight_var,
+            bootstyle=f"{ModernTheme.SUCCESS}-round-toggle"
+        ).pack(side=LEFT)
+        
+        # Run journal: continue a failed or cancelled run from its first unfinished stage
+        resume_frame = ttk.Frame(transfer_frame)
+        resume_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            resume_frame,
+            text="Resume the last unfinished refresh of this scope (skips finished stages, re-attaches Data Pump jobs)",
+            variable=self.resume_var,
+            bootstyle=f"{ModernTheme.SUCCESS}-round-toggle"
+        ).pack(side=LEFT)
+        
+        # Sizing plan: PARALLEL and FILESIZE from PROD/QA capacity
+        sizing_frame = ttk.Frame(transfer_frame)
+        sizing_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        self.auto_size_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            sizing_frame,
+            text="Auto-size PARALLEL and FILESIZE",
+            variable=self.auto_size_var,
+            bootstyle=f"{ModernTheme.SUCCESS}-round-toggle"
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        ttk.Button(
+            sizing_frame,
+            text="Preview Plan",
+            command=self.preview_plan,
+            bootstyle=(ModernTheme.INFO, OUTLINE)
+        ).pack(side=LEFT, padx=(0, ModernTheme.PADDING))
+        
+        self.plan_label = ttk.Label(
+            sizing_frame,
+            text="No plan yet",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        )
+        self.plan_label.pack(side=LEFT, fill=X, expand=YES)
+        
         # Action Buttons
         button_frame = ttk.Frame(refresh_frame)
         button_frame.pack(fill=X, pady=(ModernTheme.PADDING, 0))
@@ -523,13 +816,50 @@ class OracleRefreshGUI:
         load_button.pack(side=LEFT)
         
         # Start Refresh Button
-        start_button = ttk.Button(
+        self.start_button = ttk.Button(
             button_frame,
             text="Start Refresh",
             command=self.start_refresh,
             bootstyle=ModernTheme.SUCCESS
         )
-        start_button.pack(side=RIGHT)
+        self.start_button.pack(side=RIGHT)
+        
+        # Cancel and Pause Buttons (enabled while a refresh is running)
+        self.cancel_button = ttk.Button(
+            button_frame,
+            text="Cancel",
+            command=self.cancel_refresh,
+            state="disabled",
+            bootstyle=(ModernTheme.DANGER, OUTLINE)
+        )
+        self.cancel_button.pack(side=RIGHT, padx=(0, ModernTheme.PADDING))
+        
+        self.pause_button = ttk.Button(
+            button_frame,
+            text="Pause",
+            command=self.toggle_pause,
+            state="disabled",
+            bootstyle=(ModernTheme.WARNING, OUTLINE)
+        )
+        self.pause_button.pack(side=RIGHT, padx=(0, ModernTheme.PADDING))
+        
+        # Current stage of the running refresh
+        self.status_label = ttk.Label(
+            refresh_frame,
+            text="Idle",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            bootstyle=f"{ModernTheme.SECONDARY}"
+        )
+        self.status_label.pack(fill=X, pady=(ModernTheme.PADDING, 0))
+        
+        # Data Pump progress against the estimate
+        self.progress_bar = ttk.Progressbar(
+            refresh_frame,
+            mode="determinate",
+            maximum=100,
+            bootstyle=f"{ModernTheme.SUCCESS}-striped"
+        )
+        self.progress_bar.pack(fill=X, pady=(ModernTheme.PADDING, 0))
 
     def create_terminal_section(self):
         """Create terminal output section"""
@@ -567,35 +897,33 @@ class OracleRefreshGUI:
             foreground="#ff5555" if self.is_dark_mode else "#dc3545",
             font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL, "bold")
         )
+        
+        # Batched, bounded writer that also applies the success/error tags
+        self.log_sink.attach(self.terminal)
 
     def log_message(self, message):
         """Add message to terminal output with timestamp"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.terminal.insert(tk.END, f"{timestamp} - ", "timestamp")
-        self.terminal.insert(tk.END, f"{message}\n")
-        self.terminal.see(tk.END)
-        self.root.update()
+        self.log_sink.write(message)
         
     def test_source_connection(self):
         """Test SSH connection to source server"""
         try:
             self.log_message("Testing PROD server connection...")
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(
+            self.log_sink.flush()
+            self.root.update_idletasks()
+            ssh = default_pool.get(
                 self.source_host.get(),
-                username=self.source_ssh_user.get(),
-                password=self.source_ssh_password.get()
+                self.source_ssh_user.get(),
+                self.source_ssh_password.get()
             )
             self.source_session = ssh
             self.log_message("PROD server connection successful!")
             
-            # Test .bash_profile sourcing
+            # Resolve the Oracle environment once; later commands reuse the cached values
             self.log_message("Sourcing PROD server .bash_profile...")
-            stdin, stdout, stderr = ssh.exec_command("source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1; env | grep ORACLE")
-            env_output = stdout.read().decode()
-            if env_output:
-                self.log_message("PROD Oracle environment loaded successfully")
+            env_vars = default_env_cache.get(ssh, refresh=True)
+            if env_vars.get('ORACLE_HOME'):
+                self.log_message(f"PROD Oracle environment loaded successfully (ORACLE_HOME={env_vars['ORACLE_HOME']})")
             else:
                 self.log_message("Warning: No Oracle environment variables found in PROD")
                 
@@ -607,22 +935,21 @@ class OracleRefreshGUI:
         """Test SSH connection to target server"""
         try:
             self.log_message("Testing QA server connection...")
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(
+            self.log_sink.flush()
+            self.root.update_idletasks()
+            ssh = default_pool.get(
                 self.target_host.get(),
-                username=self.target_ssh_user.get(),
-                password=self.target_ssh_password.get()
+                self.target_ssh_user.get(),
+                self.target_ssh_password.get()
             )
             self.target_session = ssh
             self.log_message("QA server connection successful!")
             
-            # Test .bash_profile sourcing
+            # Resolve the Oracle environment once; later commands reuse the cached values
             self.log_message("Sourcing QA server .bash_profile...")
-            stdin, stdout, stderr = ssh.exec_command("source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1; env | grep ORACLE")
-            env_output = stdout.read().decode()
-            if env_output:
-                self.log_message("QA Oracle environment loaded successfully")
+            env_vars = default_env_cache.get(ssh, refresh=True)
+            if env_vars.get('ORACLE_HOME'):
+                self.log_message(f"QA Oracle environment loaded successfully (ORACLE_HOME={env_vars['ORACLE_HOME']})")
             else:
                 self.log_message("Warning: No Oracle environment variables found in QA")
                 
@@ -630,379 +957,194 @@ class OracleRefreshGUI:
             self.log_message(f"Error connecting to QA: {str(e)}")
             messagebox.showerror("Connection Error", f"Failed to connect to QA server: {str(e)}")
             
-    def execute_remote_command(self, session, command, server_type=""):
-        """Execute command and show output in terminal"""
-        if not session:
-            raise Exception(f"No active {server_type} session")
-            
-        self.log_message(f"Executing on {server_type}:\n{command}\n")
-        stdin, stdout, stderr = session.exec_command(command)
-        
-        # Show output in real-time
-        while True:
-            line = stdout.readline()
-            if not line:
-                break
-            self.log_message(f"{server_type} > {line.strip()}")
-            
-        error = stderr.read().decode()
-        if error:
-            self.log_message(f"{server_type} ERROR > {error}")
-            raise Exception(f"{server_type} command error: {error}")
-            
-    def backup_schema_grants(self, schema):
-        """Backup roles, grants, and tablespace settings for a schema"""
-        try:
-            self.log_message(f"\n=== Backing up grants for schema {schema} ===")
-            backup_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            
-            sqlplus -s {self.target_oracle_user.get()}/{self.target_oracle_password.get()}@{self.target_pdb_name.get()} << 'ENDOFSQL'
-            SET PAGESIZE 0 FEEDBACK OFF VERIFY OFF HEADING OFF ECHO OFF
-            SPOOL {self.target_dir_path.get()}/qa_{schema}_grants_$(date +%Y%m%d_%H%M%S).sql
-
-            -- Capture roles and admin options
-            SELECT 'GRANT '||granted_role||' TO {schema}'||
-                   CASE WHEN admin_option='YES' THEN ' WITH ADMIN OPTION;' ELSE ';' END 
-            FROM dba_role_privs WHERE grantee = UPPER('{schema}');
-
-            -- Capture system privileges
-            SELECT 'GRANT '||privilege||' TO {schema}'||
-                   CASE WHEN admin_option='YES' THEN ' WITH ADMIN OPTION;' ELSE ';' END 
-            FROM dba_sys_privs WHERE grantee = UPPER('{schema}');
-
-            -- Capture object privileges
-            SELECT 'GRANT '||privilege||' ON '||owner||'.'||table_name||' TO {schema}'||
-                   CASE WHEN grantable='YES' THEN ' WITH GRANT OPTION;' ELSE ';' END 
-            FROM dba_tab_privs WHERE grantee = UPPER('{schema}');
-
-            -- Capture tablespace settings
-            SELECT 'ALTER USER {schema} DEFAULT TABLESPACE '||default_tablespace||
-                   ' TEMPORARY TABLESPACE '||temporary_tablespace||';'
-            FROM dba_users WHERE username = UPPER('{schema}');
-
-            SELECT 'ALTER USER {schema} QUOTA '||
-                   CASE WHEN max_bytes=-1 THEN 'UNLIMITED' 
-                        ELSE TO_CHAR(ROUND(max_bytes/1024/1024))||'M' END||
-                   ' ON '||tablespace_name||';'
-            FROM dba_ts_quotas WHERE username = UPPER('{schema}');
-
-            SPOOL OFF
-            EXIT;
-ENDOFSQL
-            """
-            self.execute_remote_command(self.target_session, backup_cmd, "QA")
-            
-        except Exception as e:
-            self.log_message(f"Warning: Error backing up grants for {schema}: {str(e)}")
-            self.log_message("Continuing with refresh operation...")
-
-    def clean_schema(self, schema):
-        """Clean schema by dropping all objects"""
-        try:
-            self.log_message(f"\n=== Cleaning schema {schema} ===")
-            clean_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            
-            sqlplus -s {self.target_oracle_user.get()}/{self.target_oracle_password.get()}@{self.target_pdb_name.get()} << 'ENDOFSQL'
-            SET SERVEROUTPUT ON
-            BEGIN
-                -- Drop all tables with cascade constraints
-                FOR t IN (SELECT table_name FROM dba_tables WHERE owner = UPPER('{schema}')) LOOP
-                    BEGIN
-                        EXECUTE IMMEDIATE 'DROP TABLE {schema}.'||t.table_name||' CASCADE CONSTRAINTS PURGE';
-                    EXCEPTION WHEN OTHERS THEN NULL; END;
-                END LOOP;
-
-                -- Drop other objects (sequences, views, procedures, etc.)
-                FOR o IN (SELECT object_name, object_type 
-                         FROM dba_objects 
-                         WHERE owner = UPPER('{schema}')
-                         AND object_type NOT IN ('TABLE','INDEX','TABLE PARTITION','INDEX PARTITION')) LOOP
-                    BEGIN
-                        EXECUTE IMMEDIATE 'DROP '||o.object_type||' {schema}.'||o.object_name||
-                                        CASE o.object_type WHEN 'TYPE' THEN ' FORCE' ELSE '' END;
-                    EXCEPTION WHEN OTHERS THEN NULL; END;
-                END LOOP;
-
-                -- Purge recyclebin
-                EXECUTE IMMEDIATE 'PURGE RECYCLEBIN';
-            END;
-/
-            EXIT;
-ENDOFSQL
-            """
-            self.execute_remote_command(self.target_session, clean_cmd, "QA")
-            
-        except Exception as e:
-            self.log_message(f"Error cleaning schema {schema}: {str(e)}")
-            raise
+    def collect_config(self):
+        """Snapshot the form into a plain dict so the worker thread never reads Tk widgets"""
+        return {
+            'source': {
+                'host': self.source_host.get(),
+                'ssh_user': self.source_ssh_user.get(),
+                'ssh_password': self.source_ssh_password.get(),
+                'oracle_user': self.source_oracle_user.get(),
+                'oracle_password': self.source_oracle_password.get(),
+                'pdb_name': self.source_pdb_name.get(),
+                'dir_name': self.source_dir_name.get(),
+                'dir_path': self.source_dir_path.get()
+            },
+            'target': {
+                'host': self.target_host.get(),
+                'ssh_user': self.target_ssh_user.get(),
+                'ssh_password': self.target_ssh_password.get(),
+                'oracle_user': self.target_oracle_user.get(),
+                'oracle_password': self.target_oracle_password.get(),
+                'pdb_name': self.target_pdb_name.get(),
+                'dir_name': self.target_dir_name.get(),
+                'dir_path': self.target_dir_path.get()
+            },
+            'refresh_type': self.refresh_type.get(),
+            'schemas': self.schema_entry.get(),
+            'pipelined': self.pipelined_var.get(),
+            'filesize': self.filesize_entry.get().strip(),
+            'transfer_codec': self.codec_combo.get(),
+            'compression_level': self.compression_level.get(),
+            'expdp_compression': self.expdp_compression_var.get(),
+            'auto_size': self.auto_size_var.get(),
+            'schema_concurrency': self.schema_concurrency.get(),
+            'clean_mode': self.clean_mode_combo.get(),
+            'clean_sessions': self.clean_sessions.get(),
+            'recompile_threads': self.recompile_threads.get(),
+            'stats_mode': self.stats_mode_combo.get(),
+            'stats_sessions': self.stats_sessions.get(),
+            'incremental': self.incremental_var.get(),
+            'reuse_dump_minutes': self.reuse_dump_minutes.get(),
+            'dump_retention_hours': self.dump_retention_hours.get(),
+            'preflight': self.preflight_var.get(),
+            'resume': "latest" if self.resume_var.get() else None
+        }
 
-    def restore_schema_grants(self, schema, timestamp):
-        """Restore previously backed up grants"""
+    def start_refresh(self):
+        """Start the refresh process on a background worker"""
         try:
-            self.log_message(f"\n=== Restoring grants for schema {schema} ===")
-            restore_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            
-            sqlplus -s {self.target_oracle_user.get()}/{self.target_oracle_password.get()}@{self.target_pdb_name.get()} << 'ENDOFSQL'
-            @{self.target_dir_path.get()}/qa_{schema}_grants_{timestamp}.sql
-            EXIT;
-ENDOFSQL
-            """
-            self.execute_remote_command(self.target_session, restore_cmd, "QA")
-            
-        except Exception as e:
-            self.log_message(f"Warning: Error restoring grants for {schema}: {str(e)}")
-            self.log_message("Continuing with refresh operation...")
+            if self.runner and self.runner.is_running():
+                raise Exception("A refresh is already running")
 
-    def post_refresh_tasks(self, schemas):
-        """Perform post-refresh tasks: recompile invalid objects and gather statistics"""
-        try:
-            self.log_message("\n=== Performing post-refresh tasks ===")
-            schema_list = ",".join(f"'{schema.strip().upper()}'" for schema in schemas.split(","))
-            post_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            
-            sqlplus -s {self.target_oracle_user.get()}/{self.target_oracle_password.get()}@{self.target_pdb_name.get()} << 'ENDOFSQL'
-            SET SERVEROUTPUT ON
+            if not self.source_session or not self.target_session:
+                raise Exception("Please test both PROD and QA connections first")
 
-            -- Recompile invalid objects
-            BEGIN
-                FOR obj IN (
-                    SELECT owner, object_name, object_type 
-                    FROM dba_objects 
-                    WHERE status = 'INVALID' 
-                    AND owner IN ({schema_list})
-                ) LOOP
-                    BEGIN
-                        EXECUTE IMMEDIATE 'ALTER '||obj.object_type||' '||obj.owner||'.'||obj.object_name||
-                                        CASE WHEN obj.object_type='PACKAGE BODY' 
-                                             THEN ' COMPILE BODY' 
-                                             ELSE ' COMPILE' 
-                                        END;
-                    EXCEPTION WHEN OTHERS THEN NULL; END;
-                END LOOP;
-            END;
-/
+            config = self.collect_config()
+            if config['refresh_type'] != FULL_REFRESH and not config['schemas']:
+                raise Exception("Please specify schema names")
 
-            -- Gather schema statistics
-            BEGIN
-                FOR user_rec IN (
-                    SELECT username 
-                    FROM dba_users 
-                    WHERE username IN ({schema_list})
-                ) LOOP
-                    DBMS_STATS.GATHER_SCHEMA_STATS(
-                        ownname => user_rec.username,
-                        options => 'GATHER AUTO',
-                        degree => DBMS_STATS.AUTO_DEGREE
-                    );
-                END LOOP;
-            END;
-/
+            self.runner = RefreshRunner(config, self.source_session, self.target_session)
+            self.log_sink.start_run_log(f"refresh_{self.runner.timestamp}")
+            self.log_message(f"Run log: {self.log_sink.log_path}")
+            self.set_refresh_controls(running=True)
+            self.status_label.configure(text="Starting refresh...")
+            self.progress_bar.configure(value=0)
+            self.runner.start()
+            self.root.after(self.EVENT_POLL_MS, self.poll_refresh_events)
 
-            EXIT;
-ENDOFSQL
-            """
-            self.execute_remote_command(self.target_session, post_cmd, "QA")
-            self.log_message("Post-refresh tasks completed successfully")
-            
         except Exception as e:
-            self.log_message(f"Warning: Error in post-refresh tasks: {str(e)}")
-            self.log_message("Continuing with completion...")
+            self.log_message(f"\nERROR: {str(e)}")
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
-    def copy_dumpfile(self, dump_file):
-        """Copy dump file using expect script to handle interactive password prompts"""
+    def poll_refresh_events(self):
+        """Drain runner events on the Tk thread and reschedule while the worker is alive"""
+        runner = self.runner
+        finished = False
         try:
-            self.log_message("\n=== Copying dump file from PROD to QA using expect ===")
-            
-            # Create and execute expect script for file transfer
-            prod_copy_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            cd {self.source_dir_path.get()}
-            chmod 644 {dump_file}
-            
-            # Create expect script
-            cat << 'EOF' > /tmp/transfer.exp
-#!/usr/bin/expect -f
-set timeout -1
+            while True:
+                kind, payload = runner.events.get_nowait()
+                if kind == "log":
+                    self.log_message(payload)
+                elif kind == "progress":
+                    self.status_label.configure(text=payload)
+                elif kind == "meter":
+                    # No estimate yet (e.g. impdp without a preceding export): leave the bar alone
+                    if payload is not None:
+                        self.progress_bar.configure(value=payload)
+                elif kind == "paused":
+                    self.status_label.configure(text="Paused")
+                    self.pause_button.configure(text="Resume")
+                elif kind == "resumed":
+                    self.status_label.configure(text="Resuming...")
+                    self.pause_button.configure(text="Pause")
+                elif kind == "done":
+                    finished = True
+                    self.status_label.configure(text="Refresh completed")
+                    messagebox.showinfo("Success", "Database refresh completed successfully!")
+                elif kind == "cancelled":
+                    finished = True
+                    self.status_label.configure(text="Refresh cancelled")
+                elif kind == "failed":
+                    finished = True
+                    self.status_label.configure(text="Refresh failed")
+                    messagebox.showerror("Error", f"An error occurred: {payload}")
+        except queue.Empty:
+            pass
 
-# Get arguments
-set src_file [lindex $argv 0]
-set target_user [lindex $argv 1]
-set target_host [lindex $argv 2]
-set target_path [lindex $argv 3]
-set password [lindex $argv 4]
-
-# Start scp
-spawn scp $src_file $target_user@$target_host:$target_path
+        if finished:
+            self.set_refresh_controls(running=False)
+        else:
+            self.root.after(self.EVENT_POLL_MS, self.poll_refresh_events)
 
-# Handle password prompt
-expect {{
-    "yes/no" {{ send "yes\r"; exp_continue }}
-    "password:" {{ send "$password\r" }}
-}}
+    def toggle_pause(self):
+        """Pause or resume the running refresh"""
+        if not self.runner or not self.runner.is_running():
+            return
+        if self.runner.is_paused():
+            self.runner.resume()
+        else:
+            self.log_message("Pausing refresh after the current step...")
+            self.runner.pause()
 
-# Wait for completion
-expect eof
-EOF
+    def cancel_refresh(self):
+        """Cancel the running refresh and stop its Data Pump job"""
+        if not self.runner or not self.runner.is_running():
+            return
+        if messagebox.askyesno("Cancel Refresh", "Cancel the running refresh? The active Data Pump job will be killed."):
+            self.log_message("Cancelling refresh...")
+            self.status_label.configure(text="Cancelling...")
+            self.runner.cancel()
 
-            # Make expect script executable
-            chmod +x /tmp/transfer.exp
-            
-            # Run expect script
-            /tmp/transfer.exp "{dump_file}" "{self.target_ssh_user.get()}" "{self.target_host.get()}" "{self.target_dir_path.get()}" "{self.target_ssh_password.get()}"
-            
-            # Clean up
-            rm -f /tmp/transfer.exp
-            """
-            self.execute_remote_command(self.source_session, prod_copy_cmd, "PROD")
-            
-            # Set permissions on target
-            qa_chmod_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            chmod 644 {self.target_dir_path.get()}/{dump_file}
-            """
-            self.execute_remote_command(self.target_session, qa_chmod_cmd, "QA")
-            
-            self.log_message("Dump file transfer completed successfully")
-            
-        except Exception as e:
-            self.log_message(f"Error copying dump file: {str(e)}")
-            raise
+    def set_refresh_controls(self, running):
+        """Enable or disable the refresh buttons for a running/idle worker"""
+        self.start_button.configure(state="disabled" if running else "normal")
+        self.pause_button.configure(state="normal" if running else "disabled", text="Pause")
+        self.cancel_button.configure(state="normal" if running else "disabled")
 
-    def is_operation_successful(self, error_msg, operation_type=""):
-        """Check if an operation was actually successful despite error popup"""
-        error_msg = error_msg.lower()
-        
-        # Common success indicators
-        success_indicators = [
-            "successfully completed",
-            "successfully loaded/unloaded",
-            "job", "successfully",
-            "master table", "successfully"
-        ]
+    def run_in_background(self, task, on_success, description):
+        """Run task() off the Tk thread and call on_success(result) back on it"""
+        results = queue.Queue()
         
-        # Import-specific indicators
-        if operation_type.lower() == "import":
-            success_indicators.extend([
-                "processing object type",
-                "imported",
-                "completed at"
-            ])
-        # Export-specific indicators
-        elif operation_type.lower() == "export":
-            success_indicators.extend([
-                "dump file set",
-                "exported",
-                "completed at"
-            ])
-            
-        return any(indicator in error_msg for indicator in success_indicators)
-
-    def start_refresh(self):
-        """Start the refresh process"""
-        try:
-            if not self.source_session or not self.target_session:
-                raise Exception("Please test both PROD and QA connections first")
-                
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            dump_file = f"refresh_{timestamp}.dmp"
-            
-            # Export from PROD
-            self.log_message("\n=== Starting Export from PROD ===")
-            export_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            cd {self.source_dir_path.get()}
-            expdp {self.source_oracle_user.get()}/{self.source_oracle_password.get()}@{self.source_pdb_name.get()} \
-            directory={self.source_dir_name.get()} \
-            dumpfile={dump_file} \
-            logfile=export_{timestamp}.log \
-            parallel=2 """
-            
-            if self.refresh_type.get() == "Schema":
-                schemas = self.schema_entry.get()
-                if not schemas:
-                    raise Exception("Please specify schema names")
-                export_cmd += f"schemas={schemas} "
-            else:
-                export_cmd += "full=y "
-                
+        def worker():
             try:
-                self.execute_remote_command(self.source_session, export_cmd, "PROD")
+                results.put((True, task()))
             except Exception as e:
-                if self.is_operation_successful(str(e), "export"):
-                    self.log_message("Export completed successfully (ignore error popup)")
-                else:
-                    raise Exception(f"Export failed: {str(e)}")
-
-            # Continue with the rest of the refresh process...
-            self.log_message("\n=== Export completed, proceeding with file transfer ===")
-            
-            # Copy dump file from PROD to QA
-            self.copy_dumpfile(dump_file)
-            
-            if self.refresh_type.get() == "Schema":
-                schemas = self.schema_entry.get().split(",")
-                
-                # Backup grants for each schema
-                for schema in schemas:
-                    schema = schema.strip()
-                    self.backup_schema_grants(schema)
-                
-                # Clean each schema
-                for schema in schemas:
-                    schema = schema.strip()
-                    self.clean_schema(schema)
-            
-            # Import to QA
-            self.log_message("\n=== Starting Import to QA ===")
-            import_cmd = f"""
-            source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1
-            cd {self.target_dir_path.get()}
-            impdp {self.target_oracle_user.get()}/{self.target_oracle_password.get()}@{self.target_pdb_name.get()} \
-            directory={self.target_dir_name.get()} \
-            dumpfile={dump_file} \
-            logfile=import_{timestamp}.log \
-            parallel=2 \
-            table_exists_action=replace \
-            transform=oid:n \
-            exclude=user,role_grant,default_role,tablespace_quota """
-            
-            if self.refresh_type.get() == "Schema":
-                schemas = self.schema_entry.get()
-                import_cmd += f"schemas={schemas} "
-            else:
-                import_cmd += "full=y "
-            
+                results.put((False, e))
+        
+        def poll():
             try:
-                self.execute_remote_command(self.target_session, import_cmd, "QA")
-            except Exception as e:
-                if self.is_operation_successful(str(e), "import"):
-                    self.log_message("Import completed successfully (ignore error popup)")
-                else:
-                    raise Exception(f"Import failed: {str(e)}")
-            
-            # Restore grants and perform post-refresh tasks for schema refresh
-            if self.refresh_type.get() == "Schema":
-                schemas = self.schema_entry.get().split(",")
-                for schema in schemas:
-                    schema = schema.strip()
-                    self.restore_schema_grants(schema, timestamp)
-                
-                self.post_refresh_tasks(self.schema_entry.get())
-            
-            self.log_message("\n=== Refresh completed successfully! ===")
-            messagebox.showinfo("Success", "Database refresh completed successfully!")
-            
-        except Exception as e:
-            self.log_message(f"\nERROR: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                ok, value = results.get_nowait()
+            except queue.Empty:
+                self.root.after(self.EVENT_POLL_MS, poll)
+                return
+            if ok:
+                on_success(value)
+            else:
+                self.log_message(f"Error during {description}: {str(value)}")
+                messagebox.showerror("Error", f"{description.capitalize()} failed: {str(value)}")
+        
+        threading.Thread(target=worker, name=description, daemon=True).start()
+        self.root.after(self.EVENT_POLL_MS, poll)
+        
+    def preview_plan(self):
+        """Show the PARALLEL/FILESIZE plan before starting a refresh"""
+        if not self.source_session or not self.target_session:
+            messagebox.showerror("Error", "Please test both PROD and QA connections first")
+            return
+        
+        config = self.collect_config()
+        schemas = None
+        if config['refresh_type'] != FULL_REFRESH:
+            schemas = [schema.strip() for schema in config['schemas'].split(",") if schema.strip()]
+        source_session, target_session = self.source_session, self.target_session
+        planner = SizingPlanner(
+            lambda sql: run_query(source_session, config['source'], sql),
+            lambda sql: run_query(target_session, config['target'], sql)
+        )
+        
+        def show_plan(plan):
+            self.plan_label.configure(text=str(plan))
+            self.log_message(f"Sizing plan: {plan}")
+        
+        self.log_message("Computing sizing plan from PROD/QA capacity...")
+        self.plan_label.configure(text="Computing plan...")
+        self.run_in_background(lambda: planner.plan(schemas), show_plan, "sizing plan")
             
     def on_refresh_type_change(self, event):
         """Handle refresh type change"""
-        if self.refresh_type.get() == "Schema":
+        # Schema and NETWORK_LINK refreshes both take a schema list
+        if self.refresh_type.get() in (SCHEMA_REFRESH, NETWORK_REFRESH):
             self.schema_entry.configure(state="normal")
         else:
             self.schema_entry.configure(state="disabled")
@@ -1036,7 +1178,28 @@ EOF
         try:
             with open('config.json', 'r') as f:
                 config = json.load(f)
-                
+
+            if not isinstance(config, dict):
+                raise ValueError("expected a JSON object")
+
+            # config.json may hold the CLI layouts: several profiles, or a profile
+            # with a 'targets' list; the window shows the first of each
+            profiles = config.get('profiles')
+            if profiles:
+                name = next(iter(profiles))
+                config = profiles[name]
+                if len(profiles) > 1:
+                    self.log_message(f"config.json has {len(profiles)} profiles; loaded '{name}'")
+            targets = config.get('targets')
+            if 'target' not in config and targets:
+                config = dict(config, target=targets[0])
+                self.log_message(
+                    f"config.json lists {len(targets)} targets; loaded {target_label(targets[0])}. "
+                    "Refresh all of them with refresh_cli.py"
+                )
+            if 'source' not in config or 'target' not in config:
+                raise KeyError('source' if 'source' not in config else 'target')
+
             # Clear and load source fields
             self.source_host.delete(0, tk.END)
             self.source_ssh_user.delete(0, tk.END)
@@ -1071,8 +1234,15 @@ EOF
         except FileNotFoundError:
             self.log_message("Error: Configuration file not found!")
             messagebox.showerror("Error", "Configuration file not found!")
+        except (ValueError, KeyError, TypeError) as e:
+            message = f"Configuration file is not valid: {'missing ' + str(e) if isinstance(e, KeyError) else str(e)}"
+            self.log_message(f"Error: {message}")
+            messagebox.showerror("Error", message)
 
 if __name__ == "__main__":
     root = ttk.Window(themename="darkly")  # Start with dark theme by default
     app = OracleRefreshGUI(root)
+    if os.environ.get("ORACLE_REFRESH_STARTUP_PROBE"):
+        from startup_benchmark import probe
+        probe(root, app)
     root.mainloop() 
\ No newline at end of file
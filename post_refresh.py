@@ -0,0 +1,146 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from remote_sql import sql_in_list
+from run_spans import KIND_RECOMPILE, KIND_STATS, SPAN_FAILED
+
+# How statistics are gathered for several schemas
+STATS_SESSIONS = "sessions"
+STATS_CONCURRENT = "concurrent"
+
+
+class SchemaPostRefresh:
+    """Recompile/statistics timings and invalid object counts for one schema"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.recompile_seconds = 0.0
+        self.stats_seconds = 0.0
+        self.invalid_before = 0
+        self.invalid_after = 0
+        self.errors = []
+
+    def __str__(self):
+        text = (
+            f"{self.schema:<20} recompile {self.recompile_seconds:7.1f}s  "
+            f"stats {self.stats_seconds:7.1f}s  invalid {self.invalid_before} -> {self.invalid_after}"
+        )
+        if self.errors:
+            text += f"  ({'; '.join(self.errors)})"
+        return text
+
+
+class PostRefreshEngine:
+    """Recompile invalid objects and gather statistics after an import.
+
+    Invalid objects are recompiled with ``UTL_RECOMP.RECOMP_PARALLEL`` using
+    ``recompile_threads`` job slaves per schema. Statistics are gathered
+    either in ``stats_sessions`` concurrent sqlplus sessions, one schema per
+    session, or with DBMS_STATS CONCURRENT=AUTOMATIC, which the database
+    parallelises itself (the previous preference is restored afterwards).
+
+    ``run_script`` and ``query`` are the same callables ``SchemaCleaner``
+    uses. ``span(kind, name)``, when given, returns a context manager that
+    times each schema's recompile and statistics as a span.
+    """
+
+    def __init__(self, run_script, query, log=None, recompile_threads=4,
+                 stats_sessions=4, stats_mode=STATS_SESSIONS, span=None):
+        self.run_script = run_script
+        self.query = query
+        self.span = span or (lambda kind, name: nullcontext())
+        self.log = log or (lambda message: None)
+        self.recompile_threads = max(1, int(recompile_threads))
+        self.stats_sessions = max(1, int(stats_sessions))
+        self.stats_mode = stats_mode
+
+    def invalid_counts(self, schemas):
+        """INVALID object count per schema"""
+        rows = self.query(
+            "SELECT owner||'|'||COUNT(*) FROM dba_objects "
+            f"WHERE status = 'INVALID' AND owner IN ({sql_in_list(schemas)}) GROUP BY owner"
+        )
+        return {owner: int(count) for owner, count in rows}
+
+    def recompile(self, result):
+        errors = len(result.errors)
+        with self.span(KIND_RECOMPILE, result.schema) as span:
+            self._recompile(result)
+            if span is not None and len(result.errors) > errors:
+                span.outcome = SPAN_FAILED
+
+    def _recompile(self, result):
+        started = time.monotonic()
+        try:
+            self.run_script(f"""
+BEGIN
+    UTL_RECOMP.RECOMP_PARALLEL({self.recompile_threads}, '{result.schema}');
+END;
+/
+""")
+        except Exception as e:
+            result.errors.append(f"recompile: {str(e)}")
+        finally:
+            result.recompile_seconds = time.monotonic() - started
+
+    def gather_stats(self, result):
+        errors = len(result.errors)
+        with self.span(KIND_STATS, result.schema) as span:
+            self._gather_stats(result)
+            if span is not None and len(result.errors) > errors:
+                span.outcome = SPAN_FAILED
+
+    def _gather_stats(self, result):
+        started = time.monotonic()
+        try:
+            self.run_script(f"""
+BEGIN
+    DBMS_STATS.GATHER_SCHEMA_STATS(
+        ownname => '{result.schema}',
+        options => 'GATHER AUTO',
+        degree => DBMS_STATS.AUTO_DEGREE
+    );
+END;
+/
+""")
+        except Exception as e:
+            result.errors.append(f"stats: {str(e)}")
+        finally:
+            result.stats_seconds = time.monotonic() - started
+
+    def gather_stats_concurrent(self, results):
+        """Gather with CONCURRENT=AUTOMATIC in one session, then put the preference back"""
+        previous = self.query("SELECT DBMS_STATS.GET_PREFS('CONCURRENT') FROM dual")[0][0]
+        self.run_script("EXEC DBMS_STATS.SET_GLOBAL_PREFS('CONCURRENT', 'AUTOMATIC')")
+        try:
+            for result in results:
+                self.gather_stats(result)
+        finally:
+            self.run_script(f"EXEC DBMS_STATS.SET_GLOBAL_PREFS('CONCURRENT', '{previous}')")
+
+    def run(self, schemas):
+        """Recompile, then gather statistics; return a SchemaPostRefresh per schema"""
+        results = [SchemaPostRefresh(schema.strip().upper()) for schema in schemas if schema.strip()]
+        before = self.invalid_counts(schemas)
+        for result in results:
+            result.invalid_before = before.get(result.schema, 0)
+
+        # RECOMP_PARALLEL already fans out to job slaves; schemas go one after another
+        # so dependencies between them resolve in order
+        for result in results:
+            if result.invalid_before:
+                self.log(f"Recompiling {result.invalid_before} invalid objects in {result.schema} "
+                         f"with {self.recompile_threads} threads")
+                self.recompile(result)
+
+        self.log(f"Gathering statistics for {len(results)} schemas ({self.stats_mode})")
+        if self.stats_mode == STATS_CONCURRENT:
+            self.gather_stats_concurrent(results)
+        else:
+            with ThreadPoolExecutor(max_workers=self.stats_sessions, thread_name_prefix="gather-stats") as pool:
+                list(pool.map(self.gather_stats, results))
+
+        after = self.invalid_counts(schemas)
+        for result in results:
+            result.invalid_after = after.get(result.schema, 0)
+        return results
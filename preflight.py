@@ -0,0 +1,158 @@
+import glob
+import os
+import statistics
+import time
+from remote_sql import sql_in_list
+from run_journal import RUN_COMPLETED, STAGE_DONE, RunJournal
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+# Throughput assumed while no journalled run of this tool has measured one
+DEFAULT_EXPORT_MB_S = 100
+DEFAULT_IMPORT_MB_S = 50
+
+
+def format_bytes(size):
+    return f"{size / GB:.1f} GB" if size >= GB else f"{size / MB:.0f} MB"
+
+
+def parse_df(output):
+    """Available bytes from ``df -Pk <dir>`` output"""
+    lines = [line for line in output.splitlines() if line.strip()]
+    fields = lines[-1].split()
+    return int(fields[3]) * 1024
+
+
+def free_space(run_command, dir_path):
+    return parse_df(run_command(f"df -Pk {dir_path}"))
+
+
+def measure_link(relay, run_source, run_target, source_dir, target_dir, size_mb=64):
+    """Copy size_mb of random data PROD -> QA through the relay and return MB/s.
+
+    Random data does not compress, so the rate is what an uncompressible
+    dump would get; the probe files are removed on both hosts.
+    """
+    name = f".refresh_link_probe_{int(time.time())}"
+    source_path = f"{source_dir}/{name}"
+    target_path = f"{target_dir}/{name}"
+    run_source(f"head -c {int(size_mb)}M /dev/urandom > {source_path} && chmod 644 {source_path}")
+    try:
+        stats = relay.copy(source_path, target_path)
+    finally:
+        run_source(f"rm -f {source_path}")
+        run_target(f"rm -f {target_path}")
+    return stats.rate_mb_s
+
+
+def past_rates(journal_dir, scope=None):
+    """Median export and import MB/s over completed, journalled runs.
+
+    Runs of the same scope are preferred when there are any. Returns
+    ``{'export': (mb_s, runs), 'import': (mb_s, runs)}`` with None for a
+    stage no run has measured.
+    """
+    samples = {'export': [], 'import': []}
+    same_scope = {'export': [], 'import': []}
+    for path in glob.glob(os.path.join(journal_dir, "journal_*.json")):
+        try:
+            data = RunJournal.load(path).data
+        except (OSError, ValueError):
+            continue
+        size = (data.get('state', {}).get('export_bytes') or {}).get("")
+        if data.get('status') != RUN_COMPLETED or not size:
+            continue
+        for kind, stage_name in (('export', "Export"), ('import', "Import")):
+            stage = data['stages'].get(stage_name)
+            if not stage or stage.get('status') != STAGE_DONE:
+                continue
+            elapsed = stage.get('finished_at', 0) - stage.get('started_at', 0)
+            if elapsed > 0:
+                rate = size / MB / elapsed
+                samples[kind].append(rate)
+                if scope is not None and data.get('scope') == scope:
+                    same_scope[kind].append(rate)
+
+    rates = {}
+    for kind in samples:
+        chosen = same_scope[kind] or samples[kind]
+        rates[kind] = (statistics.median(chosen), len(chosen)) if chosen else None
+    return rates
+
+
+class PreflightReport:
+    """What a refresh will need and how long it should take, with the reasons to refuse it"""
+
+    def __init__(self):
+        self.dump_bytes = None
+        self.dump_basis = ""
+        # (label, free bytes, needed bytes)
+        self.disks = []
+        # (tablespace, headroom bytes, needed bytes); headroom None when it does not exist on QA
+        self.tablespaces = []
+        self.link_mb_s = None
+        # (stage, seconds, basis)
+        self.durations = []
+        self.notes = []
+        self.problems = []
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    @property
+    def total_seconds(self):
+        return sum(seconds for stage, seconds, basis in self.durations)
+
+
+class TablespaceChecker:
+    """Compare the space PROD's segments take per tablespace with what QA can hold.
+
+    Segments of the refreshed owners already on QA are dropped or replaced
+    by the refresh, so their space counts as available. Headroom is free
+    extents plus what autoextensible data files may still grow by.
+    """
+
+    def __init__(self, query_source, query_target):
+        self.query_source = query_source
+        self.query_target = query_target
+
+    @staticmethod
+    def owner_filter(schemas):
+        if schemas:
+            return f"owner IN ({sql_in_list(schemas)})"
+        return "owner IN (SELECT username FROM dba_users WHERE oracle_maintained = 'N')"
+
+    def used(self, query, schemas):
+        rows = query(
+            "SELECT tablespace_name||'|'||SUM(bytes) FROM dba_segments "
+            f"WHERE {self.owner_filter(schemas)} GROUP BY tablespace_name"
+        )
+        return {name: int(size) for name, size in rows}
+
+    def headroom(self):
+        rows = self.query_target(
+            "SELECT t.tablespace_name||'|'||(NVL(f.free, 0) + NVL(d.growth, 0)) FROM dba_tablespaces t "
+            "LEFT JOIN (SELECT tablespace_name, SUM(bytes) free FROM dba_free_space GROUP BY tablespace_name) f "
+            "ON f.tablespace_name = t.tablespace_name "
+            "LEFT JOIN (SELECT tablespace_name, SUM(CASE WHEN autoextensible = 'YES' AND maxbytes > bytes "
+            "THEN maxbytes - bytes ELSE 0 END) growth FROM dba_data_files GROUP BY tablespace_name) d "
+            "ON d.tablespace_name = t.tablespace_name "
+            "WHERE t.contents = 'PERMANENT'"
+        )
+        return {name: int(size) for name, size in rows}
+
+    def check(self, schemas=None, margin=0.1):
+        """[(tablespace, headroom or None, needed bytes)] for each tablespace PROD's data lands in"""
+        needed = self.used(self.query_source, schemas)
+        reclaimed = self.used(self.query_target, schemas)
+        headroom = self.headroom()
+        results = []
+        for name, size in sorted(needed.items()):
+            need = int(size * (1 + margin))
+            available = headroom.get(name)
+            if available is not None:
+                available += reclaimed.get(name, 0)
+            results.append((name, available, need))
+        return results
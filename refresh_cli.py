@@ -0,0 +1,278 @@
+"""Run a refresh without the GUI, e.g. from cron or CI.
+
+    python refresh_cli.py --profile nightly --type Schema --schemas HR,SALES --json
+
+Connection details come from ``config.json`` (the file the GUI saves), either
+a single ``{"source": ..., "target": ...}`` profile or several under
+``"profiles"``. Passwords are never read from it: they come from the
+environment variables in ``PASSWORD_VARIABLES`` or from a ``KEY=VALUE`` file
+with the same keys (``--password-file``); the environment wins.
+
+A profile with a ``targets`` list instead of ``target`` refreshes every
+listed target from one export. Their passwords use the target's ``name``
+in place of ``TARGET`` (``ORACLE_REFRESH_UAT_SSH_PASSWORD``) and fall back
+to the ``TARGET`` variables.
+
+A failed or cancelled run is continued with ``--resume``: the latest
+unfinished run journal of the same scope is picked up and its finished
+stages are skipped.
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import sys
+import time
+from datetime import datetime
+
+from db_operations import OracleRefreshOperations
+from fanout_runner import duplicate_labels, target_label
+from refresh_runner import FULL_REFRESH, NETWORK_REFRESH, SCHEMA_REFRESH
+from run_journal import redact_text
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_CONNECT = 3
+EXIT_CANCELLED = 130
+
+PASSWORD_VARIABLES = {
+    ('source', 'ssh_password'): "ORACLE_REFRESH_SOURCE_SSH_PASSWORD",
+    ('source', 'oracle_password'): "ORACLE_REFRESH_SOURCE_ORACLE_PASSWORD",
+    ('target', 'ssh_password'): "ORACLE_REFRESH_TARGET_SSH_PASSWORD",
+    ('target', 'oracle_password'): "ORACLE_REFRESH_TARGET_ORACLE_PASSWORD",
+}
+
+REFRESH_TYPES = (FULL_REFRESH, SCHEMA_REFRESH, NETWORK_REFRESH)
+
+
+class UsageError(Exception):
+    """Bad arguments, profile or missing passwords"""
+
+
+def load_profile(path, name=None):
+    """Return the profile dict from a config.json-style file"""
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise UsageError(f"Cannot read {path}: {str(e)}")
+
+    profiles = config.get('profiles')
+    if profiles is None:
+        if name:
+            raise UsageError(f"{path} has no 'profiles' section; omit --profile")
+        return config
+    if not name:
+        if len(profiles) != 1:
+            raise UsageError(f"{path} has several profiles ({', '.join(profiles)}); pick one with --profile")
+        name = next(iter(profiles))
+    if name not in profiles:
+        raise UsageError(f"Profile '{name}' not found in {path}")
+    return profiles[name]
+
+
+def read_password_file(path):
+    """KEY=VALUE lines; blank lines and # comments are skipped"""
+    values = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            values[key.strip()] = value.strip().strip("'\"")
+    return values
+
+
+def fill_passwords(profile, password_file=None):
+    """Put passwords into the source/target details from the file and environment"""
+    values = read_password_file(password_file) if password_file else {}
+
+    def lookup(*variables):
+        for variable in variables:
+            value = os.environ.get(variable) or values.get(variable)
+            if value:
+                return value
+        return None
+
+    missing = []
+    for (side, field), variable in PASSWORD_VARIABLES.items():
+        if side not in profile:
+            continue
+        value = lookup(variable)
+        if not value:
+            missing.append(variable)
+            continue
+        profile[side][field] = value
+
+    for details in profile.get('targets') or []:
+        name = target_label(details).upper()
+        for field in ('ssh_password', 'oracle_password'):
+            variable = f"ORACLE_REFRESH_{name}_{field.upper()}"
+            value = lookup(variable, PASSWORD_VARIABLES[('target', field)])
+            if not value:
+                missing.append(variable)
+                continue
+            details[field] = value
+    if missing:
+        raise UsageError(f"Missing passwords: {', '.join(missing)}")
+
+
+def parse_option(text):
+    """KEY=VALUE from --set, with true/false and integers converted"""
+    if "=" not in text:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{text}'")
+    key, value = text.split("=", 1)
+    lowered = value.lower()
+    if lowered in ("true", "yes", "on"):
+        return key, True
+    if lowered in ("false", "no", "off"):
+        return key, False
+    try:
+        return key, int(value)
+    except ValueError:
+        return key, value
+
+
+def build_config(args):
+    """The same dict the GUI's collect_config produces"""
+    profile = load_profile(args.config, args.profile)
+    if 'source' not in profile:
+        raise UsageError("Profile has no 'source' section")
+    if 'target' not in profile and not profile.get('targets'):
+        raise UsageError("Profile has neither a 'target' section nor a 'targets' list")
+    duplicates = duplicate_labels(profile.get('targets') or [])
+    if duplicates:
+        raise UsageError(f"Several targets are called {', '.join(duplicates)}; give each target a distinct 'name'")
+    fill_passwords(profile, args.password_file)
+
+    config = dict(profile)
+    config.update(dict(args.set or []))
+    if args.type:
+        config['refresh_type'] = args.type
+    if args.schemas is not None:
+        config['schemas'] = args.schemas
+    if args.resume:
+        config['resume'] = args.resume
+    config.setdefault('refresh_type', FULL_REFRESH)
+    config.setdefault('schemas', "")
+
+    if config['refresh_type'] not in REFRESH_TYPES:
+        raise UsageError(f"Unknown refresh type '{config['refresh_type']}' (use one of {', '.join(REFRESH_TYPES)})")
+    if config['refresh_type'] != FULL_REFRESH and not config['schemas']:
+        raise UsageError("Please specify schema names")
+    return config
+
+
+class EventPrinter:
+    """Write runner events to stdout as text or JSON lines, and every log line to the run log, passwords masked"""
+
+    def __init__(self, as_json, log_path, stream=None):
+        self.as_json = as_json
+        self.stream = stream or sys.stdout
+        self.log_file = open(log_path, 'a', encoding='utf-8') if log_path else None
+
+    def emit(self, kind, payload):
+        now = datetime.now()
+        # Echoed commands and DDL carry Oracle passwords; stdout often ends up in cron mail
+        if isinstance(payload, str):
+            payload = redact_text(payload)
+        if kind in ("log", "failed") and self.log_file:
+            self.log_file.write(f"[{now.strftime('%H:%M:%S')}] {payload}\n")
+            self.log_file.flush()
+
+        if self.as_json:
+            self.stream.write(json.dumps({'time': now.isoformat(timespec='seconds'), 'event': kind, 'data': payload}) + "\n")
+        elif kind == "log":
+            self.stream.write(f"[{now.strftime('%H:%M:%S')}] {payload}\n")
+        elif kind == "progress":
+            self.stream.write(f"[{now.strftime('%H:%M:%S')}] -- {payload}\n")
+        elif kind in ("paused", "resumed", "done", "cancelled", "failed"):
+            self.stream.write(f"[{now.strftime('%H:%M:%S')}] == {kind}{f': {payload}' if payload else ''}\n")
+        elif kind == "exit":
+            self.stream.write(f"[{now.strftime('%H:%M:%S')}] == exit code {payload['code']} "
+                              f"after {payload['seconds']}s, log {payload['log']}\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.log_file:
+            self.log_file.close()
+
+
+def run_refresh(config, printer, poll_interval=0.5):
+    """Run one refresh on the runner's worker thread, print its events and return an exit code"""
+    ops = OracleRefreshOperations(config['source'], config.get('target') or config['targets'][0])
+    try:
+        runner = ops.make_runner(config)
+    except Exception as e:
+        printer.emit("failed", f"Connection failed: {str(e)}")
+        return EXIT_CONNECT
+
+    def on_signal(signum, frame):
+        printer.emit("log", f"Received signal {signum}, cancelling refresh")
+        runner.cancel()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    runner.start()
+    outcome = None
+    while True:
+        try:
+            kind, payload = runner.events.get(timeout=poll_interval)
+        except queue.Empty:
+            if not runner.is_running():
+                break
+            continue
+        printer.emit(kind, payload)
+        if kind in ("done", "failed", "cancelled"):
+            outcome = kind
+
+    if outcome == "done":
+        return EXIT_OK
+    if outcome == "cancelled":
+        return EXIT_CANCELLED
+    return EXIT_FAILED
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run an Oracle PDB refresh without the GUI")
+    parser.add_argument("--config", default="config.json", help="config.json-style profile file")
+    parser.add_argument("--profile", help="profile name under 'profiles' in the config file")
+    parser.add_argument("--type", choices=REFRESH_TYPES, help="refresh type (default: profile's, else FULL)")
+    parser.add_argument("--schemas", help="comma-separated schemas for Schema/Network Link refreshes")
+    parser.add_argument("--password-file", help="KEY=VALUE file with the ORACLE_REFRESH_*_PASSWORD keys")
+    parser.add_argument("--set", action="append", type=parse_option, metavar="KEY=VALUE",
+                        help="runner option, e.g. clean_mode=parallel or auto_size=true (repeatable)")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="JOURNAL",
+                        help="continue the latest unfinished run of this scope (or the given journal file) "
+                             "from its first unfinished stage")
+    parser.add_argument("--json", action="store_true", help="write events to stdout as JSON lines")
+    parser.add_argument("--log-dir", default="logs", help="directory for the run log")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = build_config(args)
+    except (UsageError, OSError) as e:
+        sys.stderr.write(f"ERROR: {str(e)}\n")
+        return EXIT_USAGE
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    log_path = os.path.join(args.log_dir, f"refresh_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    printer = EventPrinter(args.json, log_path)
+    started = time.monotonic()
+    try:
+        code = run_refresh(config, printer)
+        printer.emit("exit", {'code': code, 'seconds': round(time.monotonic() - started, 1), 'log': log_path})
+        return code
+    finally:
+        printer.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import math
+from remote_sql import sql_in_list
+
+GB = 1024 ** 3
+
+# Segment types whose bytes end up in the dump file (indexes are rebuilt, not exported)
+DATA_SEGMENT_TYPES = (
+    'TABLE', 'TABLE PARTITION', 'TABLE SUBPARTITION',
+    'LOBSEGMENT', 'LOB PARTITION', 'LOB SUBPARTITION', 'NESTED TABLE'
+)
+
+
+class RefreshPlan:
+    """PARALLEL degree and dump file layout chosen for a refresh"""
+
+    def __init__(self, parallel, dump_files, filesize_gb, data_bytes, table_segments,
+                 source_capacity, target_capacity):
+        self.parallel = parallel
+        self.dump_files = dump_files
+        self.filesize_gb = filesize_gb
+        self.data_bytes = data_bytes
+        self.table_segments = table_segments
+        self.source_capacity = source_capacity
+        self.target_capacity = target_capacity
+
+    @property
+    def filesize(self):
+        """FILESIZE value for expdp"""
+        return f"{self.filesize_gb}G"
+
+    def __str__(self):
+        return (
+            f"PARALLEL={self.parallel}, {self.dump_files} dump file(s) of FILESIZE={self.filesize} "
+            f"for {self.data_bytes / GB:.1f} GB in {self.table_segments} table segments "
+            f"(PROD cpu_count={self.source_capacity['cpu_count']}, "
+            f"QA cpu_count={self.target_capacity['cpu_count']})"
+        )
+
+
+class SizingPlanner:
+    """Pick PARALLEL, the number of dump files and FILESIZE from host capacity and data volume.
+
+    ``query_source`` and ``query_target`` take a SQL string and return rows
+    (see ``remote_sql.run_query``). PARALLEL is bounded by the smaller
+    cpu_count and parallel_max_servers of the two databases, by the number
+    of table segments (a worker unloads one segment at a time) and by
+    ``BYTES_PER_WORKER`` of data per worker. Each worker gets at least one
+    dump file.
+    """
+
+    BYTES_PER_WORKER = 2 * GB
+    MAX_PARALLEL = 32
+    MIN_FILESIZE_GB = 1
+    MAX_FILESIZE_GB = 32
+
+    def __init__(self, query_source, query_target):
+        self.query_source = query_source
+        self.query_target = query_target
+
+    def capacity(self, query):
+        """cpu_count and parallel_max_servers from v$parameter"""
+        rows = query(
+            "SELECT name||'|'||value FROM v$parameter "
+            "WHERE name IN ('cpu_count', 'parallel_max_servers')"
+        )
+        capacity = {'cpu_count': 1, 'parallel_max_servers': 1}
+        for name, value in rows:
+            capacity[name] = int(value)
+        return capacity
+
+    def segment_stats(self, schemas=None):
+        """Return (table segment count, data bytes) for the schemas, or all non-Oracle users"""
+        if schemas:
+            owner_filter = f"owner IN ({sql_in_list(schemas)})"
+        else:
+            owner_filter = "owner IN (SELECT username FROM dba_users WHERE oracle_maintained = 'N')"
+        types = ",".join(f"'{segment_type}'" for segment_type in DATA_SEGMENT_TYPES)
+        rows = self.query_source(
+            "SELECT COUNT(CASE WHEN segment_type LIKE 'TABLE%' THEN 1 END)||'|'||NVL(SUM(bytes), 0) "
+            f"FROM dba_segments WHERE {owner_filter} AND segment_type IN ({types})"
+        )
+        table_segments, data_bytes = rows[0]
+        return int(table_segments), int(data_bytes)
+
+    def plan(self, schemas=None):
+        """Build a RefreshPlan for the given schema list (None for FULL)"""
+        source_capacity = self.capacity(self.query_source)
+        target_capacity = self.capacity(self.query_target)
+        table_segments, data_bytes = self.segment_stats(schemas)
+
+        hardware_limit = min(
+            source_capacity['cpu_count'], target_capacity['cpu_count'],
+            source_capacity['parallel_max_servers'], target_capacity['parallel_max_servers'],
+            self.MAX_PARALLEL
+        )
+        data_limit = max(1, data_bytes // self.BYTES_PER_WORKER)
+        parallel = max(1, min(hardware_limit, data_limit, max(table_segments, 1)))
+
+        filesize_gb = math.ceil(data_bytes / parallel / GB) if data_bytes else self.MIN_FILESIZE_GB
+        filesize_gb = max(self.MIN_FILESIZE_GB, min(filesize_gb, self.MAX_FILESIZE_GB))
+        dump_files = max(parallel, math.ceil(data_bytes / (filesize_gb * GB)))
+
+        return RefreshPlan(
+            parallel, dump_files, filesize_gb, data_bytes, table_segments,
+            source_capacity, target_capacity
+        )
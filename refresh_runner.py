@@ -0,0 +1,1705 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from datetime import datetime
+from remote_env import default_env_cache
+from remote_sql import sql_in_list
+from channel_reader import run_command
+from datapump_jobs import DataPumpJobState, DataPumpJobTracker, make_job_name
+from datapump_progress import DataPumpEvent, DataPumpOutputParser, DataPumpProgress
+from dump_transfer import DumpPieceShipper, SftpRelay, TransferCancelled, parse_size
+from refresh_planner import SizingPlanner
+from dump_catalog import DumpCatalog, DumpEntry, dump_glob, list_pieces
+from incremental_refresh import POINT_TIME_FORMAT, IncrementalPlanner, RefreshPoints, sequence_sync_script
+from preflight import (DEFAULT_EXPORT_MB_S, DEFAULT_IMPORT_MB_S, MB, PreflightReport, TablespaceChecker,
+                       format_bytes, free_space, measure_link, past_rates)
+from sql_session import SqlSessionPool
+from schema_scheduler import SchemaJob, SchemaScheduler, pack_schema_jobs, schema_sizes
+from schema_clean import CLEAN_OBJECTS, CLEAN_PARALLEL, CLEAN_RECREATE, SchemaCleaner, as_script
+from oracle_pool import default_oracle_pool
+from grant_snapshot import (GrantSnapshot, capture_grants, capture_grants_sqlplus,
+                            restore_grants, restore_grants_sqlplus)
+from post_refresh import STATS_SESSIONS, PostRefreshEngine
+from run_spans import (KIND_CLEAN, KIND_ENV_PROBE, KIND_EXPORT, KIND_GRANT_BACKUP, KIND_GRANT_RESTORE, KIND_IMPORT,
+                       KIND_STAGE, KIND_TRANSFER, SPAN_CANCELLED, Span, SpanRecorder)
+from run_journal import (JOB_COMPLETED, JOB_STARTED, RUN_CANCELLED, RUN_COMPLETED, RUN_FAILED, STAGE_DONE,
+                         STAGE_FAILED, RunJournal, scope_of)
+
+
+class RefreshCancelled(Exception):
+    """Raised on the worker thread when the user cancels a refresh"""
+
+
+class RemoteCommandFailed(Exception):
+    """A remote command ran to the end and exited with a non-zero status"""
+
+    def __init__(self, message, exit_status):
+        super().__init__(message)
+        self.exit_status = exit_status
+
+
+# Refresh types offered in the GUI
+FULL_REFRESH = "FULL"
+SCHEMA_REFRESH = "Schema"
+NETWORK_REFRESH = "Network Link"
+
+# Database link created on QA for NETWORK_LINK imports
+DEFAULT_DB_LINK = "REFRESH_PROD_LINK"
+
+
+def format_duration(seconds):
+    """Format seconds as H:MM:SS"""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class RefreshRunner:
+    """Run the export, transfer, import and post-refresh stages on a worker thread.
+
+    The runner never touches Tk. Log lines and progress are posted to
+    ``self.events`` as ``(kind, payload)`` tuples and the GUI drains the queue
+    with ``after()``. Kinds are ``log``, ``progress``, ``meter`` (percent or
+    None for the progress bar), ``paused``, ``resumed``, ``done``, ``failed``
+    and ``cancelled``.
+    """
+
+    def __init__(self, config, source_session, target_session, env_cache=None, events=None, label=None,
+                 timestamp=None, spans=None):
+        self.config = config
+        self.source = config['source']
+        self.target = config['target']
+        self.refresh_type = config['refresh_type']
+        self.schemas = config.get('schemas', "")
+        self.source_session = source_session
+        self.target_session = target_session
+        self.env_cache = env_cache or default_env_cache
+
+        # A fan-out run shares one queue and timestamp between its target runners;
+        # the label prefixes each runner's log lines
+        self.events = events or queue.Queue()
+        self.label = label
+        self.timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        # Data Pump sizing; replaced by the planner's choice when auto_size is on
+        self.auto_size = bool(config.get('auto_size'))
+        self.parallel = int(config.get('parallel') or 2)
+        self.plan = None
+
+        # Dump files are named after dump_stamp; a reused export keeps its own
+        self.dump_stamp = self.timestamp
+
+        # Pipelined mode writes a %U piece set and ships pieces while expdp runs
+        self.pipelined = bool(config.get('pipelined'))
+        self.filesize = config.get('filesize') or "2G"
+        self.set_dump_layout(multi_piece=self.pipelined)
+
+        # Compression: on the wire (gzip/zstd pipes) or inside expdp (needs Advanced Compression)
+        self.transfer_codec = config.get('transfer_codec') if config.get('transfer_codec') != "none" else None
+        self.compression_level = int(config.get('compression_level') or 3)
+        self.expdp_compression = bool(config.get('expdp_compression'))
+
+        self.db_link = config.get('db_link') or DEFAULT_DB_LINK
+        # Seconds a Data Pump job whose client exited without a final status may
+        # take to show up in DBA_DATAPUMP_JOBS or its log before the stage fails
+        self.job_startup_timeout = int(config.get('job_startup_timeout') or 60)
+        self.stage_timings = []
+
+        # Bytes each export wrote (by job tag), used as the matching import's ETA baseline
+        self.export_bytes = {}
+        # {'scn', 'time'} each export was taken at (flashback_scn), by job tag
+        self.export_points = {}
+
+        # Exports are catalogued on this host; one younger than reuse_dump_minutes
+        # replaces the export, and files older than dump_retention_hours are removed
+        self.catalog = DumpCatalog(config.get('dump_catalog') or os.path.join("snapshots", "dump_catalog.json"))
+        self.reuse_dump_minutes = int(config.get('reuse_dump_minutes') or 0)
+        self.dump_retention_hours = float(config.get('dump_retention_hours') or 0)
+        self.dump_checksums = config.get('dump_checksums', True)
+        self.reused_dump = None
+        # {name: {'name', 'bytes', 'sha256'}} of the dump being refreshed, from list_pieces
+        self.dump_pieces = {}
+
+        # Incremental schema refresh: only tables changed since each schema's
+        # last refresh point move, with TABLES= and TABLE_EXISTS_ACTION=REPLACE
+        self.incremental = bool(config.get('incremental'))
+        self.incremental_max_fraction = float(config.get('incremental_max_fraction') or 0.5)
+        self.refresh_points = RefreshPoints(
+            config.get('refresh_points') or os.path.join("snapshots", "refresh_points.json")
+        )
+        self.incremental_tables = None
+
+        # Schema refreshes with more than one schema run one Data Pump job per
+        # schema (or bin of small schemas), this many at a time on each host
+        self.schema_concurrency = max(1, int(config.get('schema_concurrency') or 1))
+        self.schema_jobs = []
+
+        # How QA schemas are emptied before import; see schema_clean
+        self.clean_mode = config.get('clean_mode') or CLEAN_OBJECTS
+        self.clean_sessions = max(1, int(config.get('clean_sessions') or 4))
+        self.snapshot_dir = config.get('snapshot_dir') or "snapshots"
+
+        # Post-refresh recompile and statistics fan-out
+        self.recompile_threads = int(config.get('recompile_threads') or 4)
+        self.stats_sessions = int(config.get('stats_sessions') or 4)
+        self.stats_mode = config.get('stats_mode') or STATS_SESSIONS
+
+        # SQL sessions reused across steps: cx_Oracle when client libraries and
+        # the listener are reachable, long-lived sqlplus over SSH otherwise
+        self.oracle_pool = default_oracle_pool
+        self.source_sql = SqlSessionPool(source_session, self.source, self.env_cache, self.oracle_pool, log=self.log)
+        self.target_sql = SqlSessionPool(target_session, self.target, self.env_cache, self.oracle_pool, log=self.log)
+
+        # Pre-flight: dump estimate, free space, tablespace headroom and predicted
+        # duration; a refresh that would not fit is refused before any work
+        self.preflight_checks = config.get('preflight', True)
+        self.space_margin = float(config.get('space_margin') or 0.1)
+        self.link_probe_mb = int(config.get('link_probe_mb') if config.get('link_probe_mb') is not None else 64)
+        self.preflight_report = None
+
+        # Durable journal of this run's stages; with 'resume' set ("latest" or a
+        # journal path) the run continues an unfinished one from its first open stage
+        self.journal_dir = config.get('journal_dir') or os.path.join("snapshots", "journals")
+        self.use_journal = config.get('journal', True)
+        self.resume_from = config.get('resume')
+        self.journal = None
+
+        # Timing spans of every stage and step, written to span_dir as JSONL per
+        # run and summarised in an optional Prometheus textfile-collector file.
+        # A fan-out run passes one recorder shared by all its runners
+        self.span_dir = config.get('span_dir') or "logs"
+        self.prometheus_textfile = config.get('prometheus_textfile')
+        self.spans = spans
+        self._own_spans = spans is None
+
+        # Data Pump jobs currently running by job name, used by pause/cancel
+        self.active_jobs = {}
+        self._job_lock = threading.Lock()
+
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Worker control (called from the GUI thread)
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the refresh pipeline on a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name="refresh-runner", daemon=True)
+        self._thread.start()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_paused(self):
+        return not self._resumed.is_set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self):
+        """Pause at the next stage boundary and stop the active Data Pump job, keeping its master table"""
+        if self._cancelled.is_set() or self.is_paused():
+            return
+        self._resumed.clear()
+        self.events.put(("paused", None))
+        self._control_job(immediate=0, keep_master=1, reason="pause")
+
+    def resume(self):
+        """Let the worker continue; a stopped Data Pump job is restarted by re-attaching to it"""
+        if not self.is_paused():
+            return
+        self._resumed.set()
+        self.events.put(("resumed", None))
+
+    def cancel(self):
+        """Cancel the refresh and kill the active Data Pump job"""
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        self._resumed.set()
+        self._control_job(immediate=1, keep_master=0, reason="cancel")
+
+    # ------------------------------------------------------------------
+    # Event helpers (called from the worker thread)
+    # ------------------------------------------------------------------
+    def log(self, message):
+        """Queue a log line for the GUI"""
+        if self.label:
+            message = "\n".join(f"[{self.label}] {line}" for line in message.split("\n"))
+        self.events.put(("log", message))
+
+    def progress(self, stage):
+        """Queue a progress update for the GUI"""
+        self.events.put(("progress", f"{self.label}: {stage}" if self.label else stage))
+
+    def meter(self, percent):
+        """Queue a progress bar value (0-100), or None when there is no estimate"""
+        self.events.put(("meter", percent))
+
+    def checkpoint(self):
+        """Block while paused and raise RefreshCancelled once cancelled"""
+        self._resumed.wait()
+        if self._cancelled.is_set():
+            raise RefreshCancelled("Refresh cancelled by user")
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage, log its duration and record its outcome in the journal"""
+        self.checkpoint()
+        self.progress(name)
+        if self.journal:
+            self.journal.start_stage(name)
+        started = time.monotonic()
+        outcome = "failed"
+        try:
+            with self.span(KIND_STAGE, name):
+                yield
+            outcome = "ok"
+        finally:
+            elapsed = time.monotonic() - started
+            self.stage_timings.append((name, elapsed, outcome))
+            self.log(f"Stage '{name}' {outcome} in {format_duration(elapsed)}")
+            if self.journal:
+                self.journal.finish_stage(name, STAGE_DONE if outcome == "ok" else STAGE_FAILED, self.run_state())
+
+    @contextmanager
+    def span(self, kind, name, **attributes):
+        """Record a timing span; the yielded Span takes bytes, rows and attributes"""
+        if self.spans is None:
+            yield Span(kind, name, None, None)
+            return
+        source, target = self.databases()
+        with self.spans.span(kind, name, source, target, **attributes) as current:
+            try:
+                yield current
+            except (RefreshCancelled, TransferCancelled):
+                current.outcome = SPAN_CANCELLED
+                raise
+
+    def databases(self):
+        """PROD and QA as "host/pdb_name", the way spans are tagged"""
+        return (
+            f"{self.source['host']}/{self.source['pdb_name']}",
+            f"{self.target['host']}/{self.target['pdb_name']}"
+        )
+
+    def finished_earlier(self, name, quiet=False):
+        """True when an earlier attempt of a resumed run finished this stage"""
+        if self.journal is None or not self.journal.stage_done(name):
+            return False
+        if not quiet:
+            self.log(f"Stage '{name}' finished in an earlier attempt; skipping")
+        return True
+
+    def log_stage_timings(self):
+        """Log a summary of stage durations for comparing refresh modes"""
+        total = sum(elapsed for name, elapsed, outcome in self.stage_timings)
+        self.log(f"\n=== Stage timings ({self.refresh_type} refresh) ===")
+        for name, elapsed, outcome in self.stage_timings:
+            self.log(f"  {name:<30} {format_duration(elapsed)}  {outcome}")
+        self.log(f"  {'Total':<30} {format_duration(total)}")
+
+    def _run(self):
+        try:
+            self.run()
+            self.finish_run(RUN_COMPLETED)
+            self.events.put(("done", None))
+        except RefreshCancelled as e:
+            self.log(f"\n=== {str(e)} ===")
+            self.finish_run(RUN_CANCELLED)
+            self.events.put(("cancelled", str(e)))
+        except Exception as e:
+            self.log(f"\nERROR: {str(e)}")
+            self.finish_run(RUN_FAILED)
+            self.events.put(("failed", str(e)))
+        finally:
+            self.close()
+
+    def close(self):
+        """Close the reused SQL sessions"""
+        self.source_sql.close()
+        self.target_sql.close()
+
+    # ------------------------------------------------------------------
+    # Run journal
+    # ------------------------------------------------------------------
+    def open_journal(self):
+        """Start this run's journal, or load the unfinished one being resumed and restore its state"""
+        if not self.use_journal:
+            return
+        if not self.resume_from:
+            self.journal = RunJournal.create(self.journal_dir, self.timestamp, self.config)
+            self.log(f"Run journal: {self.journal.path}")
+            return
+
+        if self.resume_from in (True, "latest"):
+            journal = RunJournal.latest(self.journal_dir, self.config)
+            if journal is None:
+                raise Exception(f"No unfinished refresh of this scope in {self.journal_dir} to resume")
+        else:
+            journal = RunJournal.load(self.resume_from)
+            if journal.status == RUN_COMPLETED:
+                raise Exception(f"Refresh {journal.timestamp} already completed; there is nothing to resume")
+            if journal.data.get('scope') != scope_of(self.config):
+                raise Exception(f"{self.resume_from} is a refresh of {journal.data.get('scope')}, not of this scope")
+
+        journal.reopen()
+        self.journal = journal
+        # Job, dump, log and snapshot names all derive from the original timestamp
+        self.timestamp = journal.timestamp
+        self.dump_stamp = self.timestamp
+        self.set_dump_layout(multi_piece=self.multi_piece)
+        self.restore_state(journal.state())
+        for job in self.schema_jobs:
+            if journal.stage_done(f"Schema job {job.index}"):
+                job.status = "COMPLETED"
+
+        self.log(f"\n=== Resuming refresh {self.timestamp} (attempt {journal.data['attempts']}) from {journal.path} ===")
+        self.log(f"Finished stages: {', '.join(journal.finished_stages()) or 'none'}")
+
+    def run_state(self):
+        """Runner state the later stages depend on, kept in the journal"""
+        return {
+            'parallel': self.parallel,
+            'filesize': self.filesize,
+            'multi_piece': self.multi_piece,
+            'dump_stamp': self.dump_stamp,
+            'export_points': dict(self.export_points),
+            'export_bytes': dict(self.export_bytes),
+            'dump_pieces': dict(self.dump_pieces),
+            'reused_dump': self.reused_dump.to_dict() if self.reused_dump else None,
+            'incremental_tables': self.incremental_tables,
+            'schema_jobs': [[job.index, job.schemas, job.size_bytes] for job in self.schema_jobs]
+        }
+
+    def restore_state(self, state):
+        """Take back the state an earlier attempt recorded"""
+        if not state:
+            return
+        self.parallel = state['parallel']
+        self.filesize = state['filesize']
+        self.dump_stamp = state['dump_stamp']
+        self.set_dump_layout(multi_piece=state['multi_piece'])
+        self.export_points = state['export_points']
+        self.export_bytes = state['export_bytes']
+        self.dump_pieces = state['dump_pieces']
+        self.reused_dump = DumpEntry.from_dict(state['reused_dump']) if state['reused_dump'] else None
+        self.incremental_tables = state['incremental_tables']
+        self.schema_jobs = [SchemaJob(index, schemas, size) for index, schemas, size in state['schema_jobs']]
+
+    def save_state(self):
+        if self.journal:
+            self.journal.update_state(self.run_state())
+
+    def finish_run(self, status):
+        """Close the journal and write the Prometheus textfile with the run's outcome"""
+        if self.journal:
+            try:
+                self.journal.finish(status)
+            except Exception as e:
+                self.log(f"Warning: Could not update run journal {self.journal.path}: {str(e)}")
+        if self.spans is not None and self._own_spans:
+            try:
+                self.spans.write_prometheus(status == RUN_COMPLETED)
+            except Exception as e:
+                self.log(f"Warning: Could not write {self.prometheus_textfile}: {str(e)}")
+
+    def open_spans(self):
+        """Start this run's span file, unless a fan-out run shares its recorder"""
+        if self.spans is None:
+            source, target = self.databases()
+            self.spans = SpanRecorder(
+                os.path.join(self.span_dir, f"spans_{self.timestamp}.jsonl"),
+                self.timestamp,
+                self.prometheus_textfile,
+                run_labels={'source': source, 'target': target, 'refresh_type': self.refresh_type}
+            )
+            self.log(f"Timing spans: {self.spans.path}")
+
+    def probe_environment(self):
+        """Resolve the Oracle environment of PROD and QA afresh, one span per host"""
+        for session, server_type in ((self.source_session, "PROD"), (self.target_session, "QA")):
+            with self.span(KIND_ENV_PROBE, server_type) as current:
+                env_vars = self.env_cache.get(session, refresh=True)
+                current.attributes['oracle_home'] = env_vars.get('ORACLE_HOME')
+            if not env_vars.get('ORACLE_HOME'):
+                self.log(f"Warning: No ORACLE_HOME found in the {server_type} login profile")
+
+    # ------------------------------------------------------------------
+    # Data Pump job control
+    # ------------------------------------------------------------------
+    def _control_job(self, immediate, keep_master, reason):
+        """Stop the active Data Pump jobs from a helper thread so the caller never blocks"""
+        with self._job_lock:
+            jobs = list(self.active_jobs.values())
+        if not jobs:
+            return
+
+        def stop_jobs():
+            for job in jobs:
+                try:
+                    self.log(f"Stopping Data Pump job {job['name']} on {job['server_type']} ({reason})...")
+                    self.stop_datapump_job(job, immediate, keep_master)
+                except Exception as e:
+                    self.log(f"Warning: Could not stop Data Pump job {job['name']}: {str(e)}")
+
+        threading.Thread(target=stop_jobs, name=f"refresh-{reason}", daemon=True).start()
+
+    def stop_datapump_job(self, job, immediate, keep_master):
+        """Stop a running Data Pump job through DBMS_DATAPUMP"""
+        details = job['details']
+        stop_cmd = f"""
+            sqlplus -s {details['oracle_user']}/{details['oracle_password']}@{details['pdb_name']} << 'ENDOFSQL'
+            SET SERVEROUTPUT ON
+            DECLARE
+                h NUMBER;
+            BEGIN
+                h := DBMS_DATAPUMP.ATTACH('{job['name']}', UPPER('{details['oracle_user']}'));
+                DBMS_DATAPUMP.STOP_JOB(h, immediate => {immediate}, keep_master => {keep_master});
+            END;
+/
+            EXIT;
+ENDOFSQL
+            """
+        stdin, stdout, stderr = job['session'].exec_command(self.env_cache.wrap(job['session'], stop_cmd))
+        stdout.channel.recv_exit_status()
+
+    def run_datapump(self, session, details, server_type, tool, job_name, log_file, command, operation_type,
+                     expected_bytes=None, fresh_start=None):
+        """Run expdp/impdp under a timing span with the bytes and rows it moved; see run_datapump_job"""
+        kind = KIND_EXPORT if operation_type == "export" else KIND_IMPORT
+        with self.span(kind, job_name, server=server_type) as current:
+            state = self.run_datapump_job(session, details, server_type, tool, job_name, log_file, command,
+                                          operation_type, expected_bytes, fresh_start)
+            current.bytes = state.progress.done_bytes
+            current.rows = state.progress.rows
+            return state
+
+    def run_datapump_job(self, session, details, server_type, tool, job_name, log_file, command, operation_type,
+                         expected_bytes=None, fresh_start=None):
+        """Run expdp/impdp and return its final DataPumpJobState.
+
+        The client output is parsed as it streams: table events drive the
+        progress bar, rate and ETA, and the completion line decides the
+        outcome. If the client went away before printing one, the job's own
+        log is read instead. A job stopped by a pause is restarted by
+        re-attaching to it once the user resumes. The returned state carries
+        the DataPumpProgress as ``progress``.
+
+        A job an earlier attempt of a resumed run started is re-attached
+        while its master table exists; when it is gone the job runs again
+        from the start, after ``fresh_start()`` clears what it left behind.
+        """
+        job = {
+            'session': session,
+            'details': details,
+            'server_type': server_type,
+            'name': job_name
+        }
+        tracker = DataPumpJobTracker(job_name, details['oracle_user'])
+        parser = DataPumpOutputParser(job_name)
+        progress = DataPumpProgress(operation_type, expected_bytes)
+        log_path = f"{details['dir_path']}/{log_file}"
+
+        def on_line(line):
+            for event in parser.feed(line):
+                progress.update(event)
+                if event.kind in (DataPumpEvent.TABLE, DataPumpEvent.PHASE, DataPumpEvent.ESTIMATE):
+                    self.progress(str(progress))
+                    self.meter(progress.percent)
+
+        if self.journal and self.journal.job_status(job_name) == JOB_STARTED:
+            finished, attach = self.recover_datapump_job(session, details, tool, job_name, tracker, log_path)
+            if finished is not None:
+                self.log(f"Data Pump job {job_name} finished after the earlier attempt ended")
+                finished.progress = progress
+                self.journal.record_job(job_name, JOB_COMPLETED)
+                return self.check_job_state(finished, operation_type)
+            if attach:
+                self.log(f"\n=== Re-attaching to Data Pump job {job_name} on {server_type} ===")
+                command = attach
+            else:
+                self.log(f"Data Pump job {job_name} no longer exists on {server_type}; starting it again")
+                if fresh_start:
+                    fresh_start()
+        if self.journal:
+            self.journal.record_job(job_name, JOB_STARTED, server_type)
+
+        with self._job_lock:
+            self.active_jobs[job_name] = job
+        try:
+            while True:
+                try:
+                    self.execute_remote_command(session, command, server_type, on_line=on_line)
+                except RemoteCommandFailed:
+                    # expdp/impdp exit non-zero on job errors; the parsed completion line decides the outcome
+                    pass
+
+                if not self.is_paused() and not self._cancelled.is_set():
+                    state = parser.state
+                    if state is None:
+                        # The client has exited without a status line; the job may still be running
+                        # on the server or landing in the log, so follow it until it shows a final state
+                        state = tracker.follow(
+                            lambda: tracker.poll_query(self.query_for(details)), session, log_path,
+                            startup_timeout=self.job_startup_timeout,
+                            should_stop=self._cancelled.is_set
+                        )
+                        if state.state == DataPumpJobState.UNKNOWN:
+                            self.checkpoint()
+                    if not self.is_paused():
+                        self.log(f"{progress}")
+                        state.progress = progress
+                        state = self.check_job_state(state, operation_type)
+                        if self.journal:
+                            self.journal.record_job(job_name, JOB_COMPLETED)
+                        return state
+
+                # The job was stopped by pause or cancel; wait for the user
+                self.checkpoint()
+                self.log(f"\n=== Restarting Data Pump job {job_name} on {server_type} ===")
+                command = self.attach_command(details, tool, job_name)
+        finally:
+            with self._job_lock:
+                self.active_jobs.pop(job_name, None)
+
+    def attach_command(self, details, tool, job_name, start=True):
+        """Client command that attaches to a Data Pump job, restarts it if asked and follows it to the end"""
+        commands = "START_JOB\\nCONTINUE_CLIENT\\n" if start else "CONTINUE_CLIENT\\n"
+        return f"""
+            cd {details['dir_path']}
+            printf '{commands}' | {tool} {details['oracle_user']}/{details['oracle_password']}@{details['pdb_name']} \
+            attach={job_name} """
+
+    def recover_datapump_job(self, session, details, tool, job_name, tracker, log_path):
+        """Find out how to continue a job an earlier attempt started.
+
+        Returns (final state, None) when the job completed after that attempt
+        went away, (None, attach command) while its master table still exists
+        and (None, None) when it has to run again from the start.
+        """
+        rows = self.query_for(details)(
+            "SELECT state FROM dba_datapump_jobs "
+            f"WHERE job_name = '{job_name}' AND owner_name = UPPER('{details['oracle_user']}')"
+        )
+        if rows:
+            # A job still executing on the server only needs a client again
+            return None, self.attach_command(details, tool, job_name, start=rows[0][0] != "EXECUTING")
+        final = tracker.poll_log(session, log_path, missing_ok=True)
+        if final is not None and final.completed:
+            return final, None
+        return None, None
+
+    def query_for(self, details):
+        """Query function of the database details describe (source or target)"""
+        return self.source_query if details is self.source else self.target_query
+
+    def check_job_state(self, state, operation_type):
+        """Log a finished job's state and raise unless it completed"""
+        if state.state == DataPumpJobState.COMPLETED:
+            self.log(f"{operation_type.capitalize()} job {state.job_name} completed successfully")
+        elif state.state == DataPumpJobState.COMPLETED_WITH_ERRORS:
+            self.log(f"{operation_type.capitalize()} job {state.job_name} completed with errors ({state.detail})")
+            for error in state.errors[:20]:
+                self.log(f"  {error}")
+        else:
+            raise Exception(f"{operation_type.capitalize()} failed: {state}")
+        return state
+
+    # ------------------------------------------------------------------
+    # Remote execution
+    # ------------------------------------------------------------------
+    def execute_remote_command(self, session, command, server_type="", echo=True, on_line=None):
+        """Execute command, stream its output to the log and return it.
+
+        stdout and stderr are drained together as they arrive and only a
+        bounded tail is kept, so chatty commands cannot stall on a full
+        stream or grow memory. The exit status decides success: stderr
+        output alone is logged but is not an error. With ``echo`` off neither
+        the command nor its output is logged, for scripts that carry password
+        hashes. ``on_line`` also receives every stdout and stderr line.
+        """
+        if not session:
+            raise Exception(f"No active {server_type} session")
+
+        if echo:
+            self.log(f"Executing on {server_type}:\n{command}\n")
+
+        def stdout_line(line):
+            if echo:
+                self.log(f"{server_type} > {line.strip()}")
+            if on_line:
+                on_line(line)
+
+        def stderr_line(line):
+            if echo:
+                self.log(f"{server_type} ERROR > {line.strip()}")
+            if on_line:
+                on_line(line)
+
+        # The Oracle environment is resolved once per host and injected here
+        result = run_command(
+            session,
+            self.env_cache.wrap(session, command),
+            on_stdout=stdout_line,
+            on_stderr=stderr_line
+        )
+        if result.exit_status < 0:
+            # paramiko reports -1 when the channel closed without an exit status
+            raise Exception(f"{server_type} connection closed before the command exited")
+        if not result.ok:
+            detail = result.error.strip() or result.output.strip()[-2000:]
+            raise RemoteCommandFailed(
+                f"{server_type} command exited with status {result.exit_status}: {detail}", result.exit_status
+            )
+        return result.output
+
+    def run_target_script(self, script, echo=True):
+        """Run SQL*Plus input on a reused QA session with SERVEROUTPUT on and return its output.
+
+        With ``echo`` off neither the script nor its output is logged.
+        """
+        if echo:
+            self.log(f"Executing on QA:\n{script}\n")
+        on_line = (lambda line: self.log(f"QA > {line.strip()}")) if echo else None
+        return self.target_sql.run_script(script, on_line)
+
+    def source_query(self, sql):
+        """Single-column query on PROD over a reused session"""
+        return self.source_sql.query(sql)
+
+    def target_query(self, sql):
+        """Single-column query on QA over a reused session"""
+        return self.target_sql.query(sql)
+
+    # ------------------------------------------------------------------
+    # Refresh stages
+    # ------------------------------------------------------------------
+    def schema_list(self):
+        return [schema.strip() for schema in self.schemas.split(",") if schema.strip()]
+
+    def set_dump_layout(self, multi_piece):
+        """Use a single dump file or a %U piece set limited by FILESIZE"""
+        self.multi_piece = multi_piece
+        self.dump_file = self.dump_file_for()
+
+    def dump_file_for(self, tag=""):
+        """Dump file name for the whole run, or for one scheduled schema job's tag"""
+        if self.multi_piece:
+            return f"refresh_{self.dump_stamp}{tag}_%U.dmp"
+        return f"refresh_{self.dump_stamp}{tag}.dmp"
+
+    def plan_sizing(self):
+        """Choose PARALLEL and the dump file layout from PROD/QA capacity"""
+        self.log("\n=== Sizing PARALLEL and FILESIZE from host capacity ===")
+        planner = SizingPlanner(
+            self.source_query,
+            self.target_query
+        )
+        self.plan = planner.plan(self.schema_list() if self.is_schema_mode() else None)
+        self.log(f"Plan: {self.plan}")
+
+        self.parallel = self.plan.parallel
+        if self.plan.dump_files > 1 or self.pipelined:
+            self.filesize = self.plan.filesize
+            self.set_dump_layout(multi_piece=True)
+
+    def is_schema_mode(self):
+        """Schema and network-link refreshes both work on an explicit schema list"""
+        return self.refresh_type in (SCHEMA_REFRESH, NETWORK_REFRESH)
+
+    def run(self, export=True):
+        """Run the full refresh pipeline.
+
+        With ``export`` off the PROD dump already exists (a fan-out run
+        exported it once for every target) and the run starts at the transfer.
+        A resumed run skips the stages its journal shows as finished.
+        """
+        if self.is_schema_mode() and not self.schemas:
+            raise Exception("Please specify schema names")
+
+        self.open_journal()
+        self.open_spans()
+        try:
+            with self.stage("Environment probe"):
+                self.probe_environment()
+
+            if self.auto_size and not self.finished_earlier("Sizing plan"):
+                with self.stage("Sizing plan"):
+                    self.plan_sizing()
+
+            if (export and self.refresh_type == SCHEMA_REFRESH and self.incremental
+                    and not self.finished_earlier("Change detection")):
+                with self.stage("Change detection"):
+                    changed = self.plan_incremental()
+                if not changed:
+                    self.log("\n=== No table changed since the last refresh; nothing to move ===")
+                    return
+
+            scheduled = self.use_schema_jobs()
+            reused = self.reused_dump is not None or (
+                export
+                and self.refresh_type != NETWORK_REFRESH
+                and not scheduled
+                and not self.finished_earlier("Export", quiet=True)
+                and self.reuse_catalogued_dump()
+            )
+            if self.preflight_checks and not self.finished_earlier("Pre-flight"):
+                with self.stage("Pre-flight"):
+                    self.preflight(reused, export)
+
+            if self.refresh_type == NETWORK_REFRESH:
+                # Pull straight over a database link: no dump file, no copy
+                if not self.finished_earlier("Database link"):
+                    with self.stage("Database link"):
+                        self.ensure_database_link()
+            elif scheduled:
+                # Export, transfer, grants, clean and import run per job; see run_schema_jobs
+                if not self.finished_earlier("Schema jobs"):
+                    with self.stage("Schema jobs"):
+                        self.run_schema_jobs()
+            elif self.pipelined and not reused:
+                if not self.finished_earlier("Export + pipelined transfer"):
+                    with self.stage("Export + pipelined transfer"):
+                        self.export_and_ship()
+                    self.catalog_export()
+                    self.catalog.add_location(self.dump_file, self.target['host'], self.target['dir_path'])
+            else:
+                if export and not reused and not self.finished_earlier("Export"):
+                    with self.stage("Export"):
+                        self.export_source()
+                    self.catalog_export()
+
+                # Continue with the rest of the refresh process...
+                if not self.finished_earlier("Transfer"):
+                    self.log("\n=== Export completed, proceeding with file transfer ===")
+                    with self.stage("Transfer"):
+                        self.transfer_dump()
+
+            if self.is_schema_mode() and not scheduled:
+                # Snapshot the grants of every schema in one query
+                if not self.finished_earlier("Grant backup"):
+                    with self.stage("Grant backup"):
+                        self.backup_grants(self.schema_list())
+
+                # Clean each schema; an incremental import replaces its tables instead
+                if self.incremental_tables is None and not self.finished_earlier("Schema clean"):
+                    with self.stage("Schema clean"):
+                        for schema in self.schema_list():
+                            self.checkpoint()
+                            self.clean_schema(schema)
+
+            if self.refresh_type == NETWORK_REFRESH:
+                if not self.finished_earlier("Network import"):
+                    with self.stage("Network import"):
+                        self.network_import()
+            elif not scheduled and not self.finished_earlier("Import"):
+                with self.stage("Import"):
+                    self.import_target()
+
+            if self.incremental_tables and not self.finished_earlier("Sequence sync"):
+                with self.stage("Sequence sync"):
+                    self.sync_sequences()
+
+            # Restore grants and perform post-refresh tasks for schema refresh
+            if self.is_schema_mode():
+                if not scheduled and not self.finished_earlier("Grant restore"):
+                    with self.stage("Grant restore"):
+                        self.restore_grants(self.schema_list())
+
+                refreshed = self.refreshed_schemas()
+                if refreshed and not self.finished_earlier("Post-refresh tasks"):
+                    with self.stage("Post-refresh tasks"):
+                        self.post_refresh_tasks(refreshed)
+
+            if self.refresh_type == SCHEMA_REFRESH:
+                self.record_refresh_points(scheduled)
+
+            if self.dump_retention_hours and not self.finished_earlier("Dump cleanup"):
+                with self.stage("Dump cleanup"):
+                    self.cleanup_expired_dumps()
+
+            if scheduled:
+                self.check_schema_jobs()
+        finally:
+            self.log_stage_timings()
+
+        self.log("\n=== Refresh completed successfully! ===")
+
+    # ------------------------------------------------------------------
+    # Incremental refresh
+    # ------------------------------------------------------------------
+    def plan_incremental(self):
+        """Pick the tables changed since the last refresh; False when there is nothing to move"""
+        self.log("\n=== Finding tables changed since the last refresh ===")
+        point = self.current_point()
+        schemas = self.schema_list()
+        points = {
+            schema.upper(): self.refresh_points.get(self.source, self.target, schema)
+            for schema in schemas
+        }
+        planner = IncrementalPlanner(
+            self.source_query,
+            self.target_query,
+            self.source_sql.run_script,
+            log=self.log,
+            max_fraction=self.incremental_max_fraction
+        )
+        plan = planner.plan(schemas, points)
+        self.log(f"Incremental plan: {plan}")
+        if not plan.incremental:
+            return True
+        if not plan.tables:
+            if point:
+                self.refresh_points.record(self.source, self.target, schemas, point['scn'], point['time'])
+            return False
+        self.incremental_tables = plan.tables
+        return True
+
+    def sync_sequences(self):
+        """Move QA sequences of the refreshed schemas forward to PROD's values"""
+        sql = (
+            "SELECT sequence_owner||'|'||sequence_name||'|'||TO_CHAR(last_number) FROM dba_sequences "
+            f"WHERE sequence_owner IN ({sql_in_list(self.schema_list())})"
+        )
+        script = sequence_sync_script(self.source_query(sql), self.target_query(sql))
+        if not script:
+            self.log("QA sequences are already at or past PROD's values")
+            return
+        output = self.run_target_script(script)
+        failures = [line.split("|", 2) for line in output.splitlines() if line.startswith("SEQUENCE_FAILED|")]
+        for _, name, error in failures:
+            self.log(f"Warning: Could not move sequence {name} forward: {error}")
+
+    def record_refresh_points(self, scheduled):
+        """Remember the SCN the refreshed schemas are now consistent with"""
+        if scheduled:
+            refreshed = [
+                (job.schemas, self.export_points.get(job.tag))
+                for job in self.schema_jobs if job.status == "COMPLETED"
+            ]
+        elif self.reused_dump:
+            refreshed = [(self.schema_list(), {'scn': self.reused_dump.scn, 'time': self.reused_dump.scn_time})]
+        else:
+            refreshed = [(self.schema_list(), self.export_points.get(""))]
+
+        for schemas, point in refreshed:
+            if point and point.get('scn') and point.get('time'):
+                self.refresh_points.record(self.source, self.target, schemas, point['scn'], point['time'])
+
+    def use_schema_jobs(self):
+        """Split a multi-schema dump refresh into concurrently scheduled per-schema jobs"""
+        return (
+            self.refresh_type == SCHEMA_REFRESH
+            and self.schema_concurrency > 1
+            and len(self.schema_list()) > 1
+            and self.incremental_tables is None
+        )
+
+    def run_schema_jobs(self):
+        """Bin-pack the schemas by size and run their jobs under the per-host concurrency limit"""
+        self.log(f"\n=== Scheduling schema jobs, {self.schema_concurrency} at a time per host ===")
+        if not self.schema_jobs:
+            sizes = schema_sizes(
+                self.source_query,
+                self.schema_list()
+            )
+            self.schema_jobs = pack_schema_jobs(sizes)
+            self.save_state()
+        for job in self.schema_jobs:
+            self.log(f"  {job}")
+
+        scheduler = SchemaScheduler(
+            self.schema_jobs,
+            export_concurrency=self.schema_concurrency,
+            import_concurrency=self.schema_concurrency,
+            log=self.log,
+            should_stop=self._cancelled.is_set
+        )
+        scheduler.run(self.run_schema_job)
+
+        self.log("\n=== Schema job timings ===")
+        for job in self.schema_jobs:
+            self.log(f"  {str(job):<50} {format_duration(job.elapsed)}  {job.status}")
+        self.checkpoint()
+
+    def run_schema_job(self, job, export_slot, import_slot):
+        """Export, ship and import one scheduled job; its grants and clean run right before the import"""
+        if self.finished_earlier(f"Schema job {job.index}"):
+            return
+        schemas = ",".join(job.schemas)
+        # Concurrent jobs share the host's CPUs, so split PARALLEL between them
+        parallel = max(1, self.parallel // self.schema_concurrency)
+
+        with export_slot:
+            self.checkpoint()
+            self.progress(f"Exporting {schemas}")
+            if self.pipelined:
+                self.export_and_ship(schemas, job.tag, parallel)
+            else:
+                self.export_source(schemas, job.tag, parallel)
+
+        if not self.pipelined:
+            self.checkpoint()
+            self.progress(f"Copying {schemas}")
+            if self.multi_piece:
+                self.copy_dump_pieces(job.tag)
+            else:
+                self.copy_dumpfile(self.dump_file_for(job.tag))
+
+        with import_slot:
+            # Grants are captured once: after the clean they would be gone
+            if not any(self.journal and self.journal.is_cleaned(schema) for schema in job.schemas):
+                self.backup_grants(job.schemas, job.tag)
+            for schema in job.schemas:
+                self.checkpoint()
+                self.clean_schema(schema)
+
+            self.checkpoint()
+            self.progress(f"Importing {schemas}")
+            self.import_target(schemas, job.tag, parallel)
+
+            self.restore_grants(job.schemas, job.tag)
+
+        if self.journal:
+            self.journal.finish_stage(f"Schema job {job.index}", STAGE_DONE, self.run_state())
+
+    def refreshed_schemas(self):
+        """Schemas whose import finished, as a comma-separated list"""
+        if not self.schema_jobs:
+            return self.schemas
+        return ",".join(
+            schema for job in self.schema_jobs if job.status == "COMPLETED" for schema in job.schemas
+        )
+
+    def check_schema_jobs(self):
+        """Fail the refresh if any scheduled schema job failed"""
+        failed = [job for job in self.schema_jobs if job.status != "COMPLETED"]
+        if failed:
+            raise Exception(
+                f"{len(failed)} of {len(self.schema_jobs)} schema jobs failed: "
+                + "; ".join(f"{','.join(job.schemas)}: {job.error}" for job in failed)
+            )
+
+    def ensure_database_link(self):
+        """Create the PROD database link on QA, or validate it and recreate it if it is broken"""
+        self.log(f"\n=== Preparing database link {self.db_link} on QA ===")
+        connect_string = f"//{self.source['host']}:{self.source.get('port') or 1521}/{self.source['pdb_name']}"
+        link_script = f"""
+            DECLARE
+                n  NUMBER;
+                ok NUMBER;
+            BEGIN
+                SELECT COUNT(*) INTO n FROM user_db_links WHERE db_link LIKE UPPER('{self.db_link}') || '%';
+                IF n > 0 THEN
+                    BEGIN
+                        EXECUTE IMMEDIATE 'SELECT 1 FROM dual@{self.db_link}' INTO ok;
+                        DBMS_OUTPUT.PUT_LINE('LINK_VALID');
+                        RETURN;
+                    EXCEPTION WHEN OTHERS THEN
+                        EXECUTE IMMEDIATE 'DROP DATABASE LINK {self.db_link}';
+                    END;
+                END IF;
+                EXECUTE IMMEDIATE 'CREATE DATABASE LINK {self.db_link} CONNECT TO {self.source['oracle_user']} ' ||
+                                  'IDENTIFIED BY "{self.source['oracle_password']}" USING ''{connect_string}''';
+                EXECUTE IMMEDIATE 'SELECT 1 FROM dual@{self.db_link}' INTO ok;
+                DBMS_OUTPUT.PUT_LINE('LINK_CREATED');
+            END;
+/
+"""
+        # The script carries the PROD password, so it is not echoed
+        self.log(f"Checking or creating database link {self.db_link} on QA")
+        output = self.run_target_script(link_script, echo=False)
+        if "LINK_VALID" in output:
+            self.log(f"Database link {self.db_link} is valid")
+        elif "LINK_CREATED" in output:
+            self.log(f"Database link {self.db_link} created to {connect_string}")
+        else:
+            raise Exception(f"Could not create or validate database link {self.db_link}")
+
+    def network_import(self):
+        """Import into QA straight from PROD over the database link"""
+        self.log("\n=== Starting NETWORK_LINK Import to QA ===")
+        job_name = make_job_name("REFRESH_NET", self.timestamp)
+        import_cmd = f"""
+            cd {self.target['dir_path']}
+            impdp {self.target['oracle_user']}/{self.target['oracle_password']}@{self.target['pdb_name']} \
+            directory={self.target['dir_name']} \
+            network_link={self.db_link} \
+            logfile=netimport_{self.timestamp}.log \
+            job_name={job_name} \
+            flashback_time=systimestamp \
+            parallel={self.parallel} \
+            table_exists_action=replace \
+            transform=oid:n \
+            exclude=user,role_grant,default_role,tablespace_quota \
+            schemas={self.schemas} """
+
+        self.run_datapump(self.target_session, self.target, "QA", "impdp", job_name,
+                          f"netimport_{self.timestamp}.log", import_cmd, "import")
+
+    def export_source(self, schemas=None, tag="", parallel=None):
+        """Export from PROD with expdp; a tag exports one scheduled schema job"""
+        schemas = schemas or self.schemas
+        self.log(f"\n=== Starting Export from PROD{' of ' + schemas if tag else ''} ===")
+        job_name = make_job_name("REFRESH_EXP", f"{self.timestamp}{tag}")
+        options = [
+            f"directory={self.source['dir_name']}",
+            f"dumpfile={self.dump_file_for(tag)}",
+            f"logfile=export_{self.timestamp}{tag}.log",
+            f"job_name={job_name}",
+            f"parallel={parallel or self.parallel}"
+        ]
+
+        # Consistent as of one SCN, which the dump catalog records; a resumed
+        # export keeps the SCN its first attempt started at
+        resumed = self.journal is not None and self.journal.job_status(job_name) == JOB_STARTED
+        point = self.export_points.get(tag) if resumed else None
+        point = point or self.current_point()
+        if point:
+            options.append(f"flashback_scn={point['scn']}")
+            self.export_points[tag] = point
+            self.save_state()
+        if self.multi_piece:
+            options.append(f"filesize={self.filesize}")
+        if self.expdp_compression:
+            options.append("compression=all")
+        options += self.export_scope(schemas, tag)
+
+        parfile = self.write_parfile(self.source_command, self.source, f"export_{self.timestamp}{tag}.par", options)
+        export_cmd = f"""
+            cd {self.source['dir_path']}
+            expdp {self.source['oracle_user']}/{self.source['oracle_password']}@{self.source['pdb_name']} \
+            parfile={parfile}"""
+
+        def remove_partial_dump():
+            self.log(f"Removing the partial dump {self.dump_file_for(tag)} from PROD")
+            self.source_command(f"cd {self.source['dir_path']} && rm -f {dump_glob(self.dump_file_for(tag))}")
+
+        state = self.run_datapump(self.source_session, self.source, "PROD", "expdp", job_name,
+                                  f"export_{self.timestamp}{tag}.log", export_cmd, "export",
+                                  fresh_start=remove_partial_dump)
+        self.export_bytes[tag] = state.progress.done_bytes or None
+
+    def export_scope(self, schemas=None, tag=""):
+        """TABLES=, SCHEMAS= or FULL=Y parameter file lines of an export or import"""
+        if self.incremental_tables and not tag:
+            # One table per line: the list can be far longer than a command line allows
+            return ["tables=(", ",\n".join(f"  {table}" for table in self.incremental_tables), ")"]
+        if self.is_schema_mode():
+            return [f"schemas={schemas or self.schemas}"]
+        return ["full=y"]
+
+    def write_parfile(self, command, details, name, options):
+        """Write Data Pump parameters to a parameter file in details' dir_path and return its path.
+
+        Parameters go in a file rather than on the command line, which Data
+        Pump (UDE-00019) and the shell limit in length; the credentials stay
+        on the command line so they are never written to disk.
+        """
+        path = f"{details['dir_path']}/{name}"
+        text = "\n".join(options)
+        command(f"cat > {path} << 'ENDOFPARFILE'\n{text}\nENDOFPARFILE")
+        self.log(f"Data Pump parameters ({path}):\n{text}")
+        return path
+
+    def current_point(self):
+        """PROD's current SCN and clock as {'scn', 'time'}, or None when they cannot be read"""
+        try:
+            scn, taken = self.source_query(
+                f"SELECT TO_CHAR(current_scn)||'|'||TO_CHAR(SYSDATE, '{POINT_TIME_FORMAT}') FROM v$database"
+            )[0]
+            return {'scn': scn, 'time': taken}
+        except Exception as e:
+            self.log(f"Warning: Cannot read the current SCN ({str(e)}); exporting without flashback_scn")
+            return None
+
+    # ------------------------------------------------------------------
+    # Pre-flight
+    # ------------------------------------------------------------------
+    def estimate_dump(self):
+        """Dump size from expdp ESTIMATE_ONLY=Y ESTIMATE=STATISTICS; nothing is written"""
+        job_name = make_job_name("REFRESH_EST", self.timestamp)
+        parser = DataPumpOutputParser(job_name)
+        estimates = []
+
+        def on_line(line):
+            estimates.extend(event.bytes for event in parser.feed(line) if event.kind == DataPumpEvent.ESTIMATE)
+
+        options = [
+            f"directory={self.source['dir_name']}",
+            f"job_name={job_name}",
+            "nologfile=y",
+            "estimate_only=y",
+            "estimate=statistics"
+        ] + self.export_scope()
+        parfile = self.write_parfile(self.source_command, self.source, f"estimate_{self.timestamp}.par", options)
+        estimate_cmd = f"""
+            expdp {self.source['oracle_user']}/{self.source['oracle_password']}@{self.source['pdb_name']} \
+            parfile={parfile}"""
+        try:
+            self.execute_remote_command(self.source_session, estimate_cmd, "PROD", echo=False, on_line=on_line)
+        except Exception as e:
+            if not estimates:
+                raise Exception(f"expdp ESTIMATE_ONLY failed: {str(e)}")
+        if not estimates:
+            raise Exception("expdp ESTIMATE_ONLY did not print an estimate")
+        return estimates[-1]
+
+    def preflight(self, reused, export=True):
+        """Size the dump, check disk and tablespace space and predict the duration; refuse a refresh that cannot fit"""
+        self.log("\n=== Pre-flight checks ===")
+        report = PreflightReport()
+        network = self.refresh_type == NETWORK_REFRESH
+        on_qa = reused and self.reused_dump.has_copy(self.target['host'], self.target['dir_path'])
+        transfer = not network and not on_qa
+
+        if not network and (reused or not export):
+            # The dump is already on PROD: take its real size
+            pieces = list_pieces(self.source_command, self.source['dir_path'], self.dump_file, checksums=False)
+            report.dump_bytes = sum(piece['bytes'] for piece in pieces)
+            report.dump_basis = "existing dump files on PROD"
+        else:
+            report.dump_bytes = self.estimate_dump()
+            report.dump_basis = "expdp ESTIMATE=STATISTICS"
+            if self.expdp_compression:
+                report.dump_basis += ", before COMPRESSION=ALL"
+
+        if not network:
+            needed = int(report.dump_bytes * (1 + self.space_margin))
+            if export and not reused:
+                report.disks.append((f"PROD {self.source['dir_path']}",
+                                     free_space(self.source_command, self.source['dir_path']), needed))
+            if not on_qa:
+                report.disks.append((f"QA {self.target['dir_path']}",
+                                     free_space(self.target_command, self.target['dir_path']), needed))
+
+        if self.incremental_tables:
+            report.notes.append("Tablespace headroom is not checked for an incremental refresh; "
+                                "its tables replace their QA copies")
+        else:
+            checker = TablespaceChecker(self.source_query, self.target_query)
+            report.tablespaces = checker.check(self.schema_list() if self.is_schema_mode() else None,
+                                               self.space_margin)
+
+        if transfer and self.link_probe_mb:
+            relay = self.make_relay()
+            try:
+                report.link_mb_s = measure_link(relay, self.source_command, self.target_command,
+                                                self.source['dir_path'], self.target['dir_path'], self.link_probe_mb)
+            except Exception as e:
+                report.notes.append(f"Link speed not measured: {str(e)}")
+            finally:
+                relay.close()
+
+        # Export and import rates come from earlier journalled runs, preferably of this scope
+        rates = past_rates(self.journal_dir, scope_of(self.config))
+
+        def rate(kind, default):
+            if rates[kind]:
+                mb_s, runs = rates[kind]
+                return mb_s, f"{mb_s:.0f} MB/s, median of {runs} earlier runs"
+            return default, f"{default} MB/s, default"
+
+        size_mb = report.dump_bytes / MB
+        if export and not reused and not network:
+            mb_s, basis = rate('export', DEFAULT_EXPORT_MB_S)
+            report.durations.append(("Export", size_mb / mb_s, basis))
+        if transfer and report.link_mb_s:
+            report.durations.append(("Transfer", size_mb / report.link_mb_s, f"{report.link_mb_s:.1f} MB/s measured"))
+        mb_s, basis = rate('import', DEFAULT_IMPORT_MB_S)
+        report.durations.append(("Import", size_mb / mb_s, basis))
+        if self.pipelined and not reused:
+            report.notes.append("The pipelined transfer overlaps the export, so the total is an upper bound")
+
+        for label, free, needed in report.disks:
+            if free < needed:
+                report.problems.append(f"{label} has {format_bytes(free)} free but the dump needs {format_bytes(needed)}")
+        for name, headroom, needed in report.tablespaces:
+            if headroom is None:
+                report.problems.append(f"QA has no tablespace {name} for {format_bytes(needed)} of PROD data")
+            elif headroom < needed:
+                report.problems.append(f"QA tablespace {name} can grow by {format_bytes(headroom)} "
+                                       f"but needs {format_bytes(needed)}")
+
+        self.preflight_report = report
+        self.log_preflight(report)
+        if not report.ok:
+            raise Exception("Pre-flight check refused the refresh: " + "; ".join(report.problems))
+
+    def log_preflight(self, report):
+        self.log(f"Dump size: {format_bytes(report.dump_bytes)} ({report.dump_basis})")
+        for label, free, needed in report.disks:
+            flag = "ok" if free >= needed else "TOO SMALL"
+            self.log(f"  {label}: {format_bytes(free)} free, needs {format_bytes(needed)}  {flag}")
+        for name, headroom, needed in report.tablespaces:
+            if headroom is None:
+                self.log(f"  QA tablespace {name}: missing, needs {format_bytes(needed)}  MISSING")
+            else:
+                flag = "ok" if headroom >= needed else "TOO SMALL"
+                self.log(f"  QA tablespace {name}: {format_bytes(headroom)} headroom, "
+                         f"needs {format_bytes(needed)}  {flag}")
+        if report.link_mb_s is not None:
+            self.log(f"Link PROD -> QA: {report.link_mb_s:.1f} MB/s ({self.link_probe_mb} MB probe)")
+        self.log("Predicted duration:")
+        for stage, seconds, basis in report.durations:
+            self.log(f"  {stage:<12} {format_duration(seconds)}  ({basis})")
+        self.log(f"  {'Total':<12} {format_duration(report.total_seconds)}  (grants and post-refresh not included)")
+        for note in report.notes:
+            self.log(f"Note: {note}")
+
+    # ------------------------------------------------------------------
+    # Dump catalog
+    # ------------------------------------------------------------------
+    def catalog_key(self):
+        """(source, mode, schemas) an export of this refresh is catalogued under"""
+        if self.incremental_tables:
+            return f"{self.source['host']}/{self.source['pdb_name']}", "Incremental", self.incremental_tables
+        schemas = self.schema_list() if self.is_schema_mode() else []
+        return f"{self.source['host']}/{self.source['pdb_name']}", self.refresh_type, schemas
+
+    def source_command(self, command):
+        return self.execute_remote_command(self.source_session, command, "PROD", echo=False)
+
+    def target_command(self, command):
+        return self.execute_remote_command(self.target_session, command, "QA", echo=False)
+
+    def reuse_catalogued_dump(self):
+        """Switch to a catalogued export young enough to reuse; True when one was found"""
+        if not self.reuse_dump_minutes:
+            return False
+        source, mode, schemas = self.catalog_key()
+        entry = self.catalog.find(source, mode, schemas, self.reuse_dump_minutes * 60)
+        if entry is None:
+            self.log(f"No catalogued export of this scope newer than {self.reuse_dump_minutes} minutes; exporting")
+            return False
+
+        # The files must still be on PROD exactly as catalogued
+        pieces = list_pieces(self.source_command, self.source['dir_path'], entry.dump_file, checksums=False)
+        if not entry.same_pieces(pieces):
+            self.log(f"Catalogued export {entry.dump_file} is missing or changed on PROD; exporting")
+            self.catalog.remove_location(entry.dump_file, self.source['host'], self.source['dir_path'])
+            return False
+
+        self.use_dump(entry)
+        return True
+
+    def use_dump(self, entry):
+        """Take the dump file names, layout and size from a catalogued export"""
+        self.log(f"\n=== Reusing export {entry} ===")
+        self.reused_dump = entry
+        self.dump_stamp = entry.stamp
+        self.set_dump_layout(multi_piece="%U" in entry.dump_file)
+        self.export_bytes[""] = entry.total_bytes or None
+        self.dump_pieces = {piece['name']: piece for piece in entry.pieces}
+
+    def catalog_export(self, tag=""):
+        """Record a finished export (pieces, sizes, checksums, SCN) in the dump catalog"""
+        try:
+            source, mode, schemas = self.catalog_key()
+            dump_file = self.dump_file_for(tag)
+            pieces = list_pieces(self.source_command, self.source['dir_path'], dump_file, self.dump_checksums)
+            point = self.export_points.get(tag) or {}
+            entry = DumpEntry(
+                self.dump_stamp, source, mode, schemas, dump_file,
+                scn=point.get('scn'),
+                scn_time=point.get('time'),
+                pieces=pieces,
+                locations=[{'host': self.source['host'], 'dir_path': self.source['dir_path']}],
+                data_time=self.scn_epoch(point.get('scn'))
+            )
+            self.catalog.record(entry)
+            self.dump_pieces.update({piece['name']: piece for piece in pieces})
+            self.save_state()
+            self.log(f"Catalogued export {entry}")
+        except Exception as e:
+            self.log(f"Warning: Could not catalogue export {self.dump_file_for(tag)}: {str(e)}")
+
+    def scn_epoch(self, scn):
+        """This host's clock at SCN_TO_TIMESTAMP(scn), or None when PROD cannot map the SCN.
+
+        PROD measures how long ago the SCN was on its own clock, so the two
+        hosts' clocks and time zones do not have to agree.
+        """
+        if not scn:
+            return None
+        try:
+            seconds = self.source_query(
+                f"SELECT TO_CHAR(ROUND((SYSDATE - CAST(SCN_TO_TIMESTAMP({scn}) AS DATE)) * 86400)) FROM dual"
+            )[0][0]
+            return time.time() - int(seconds)
+        except Exception as e:
+            self.log(f"Warning: Cannot map SCN {scn} to a time ({str(e)}); the export's age counts from now")
+            return None
+
+    def transfer_dump(self):
+        """Copy the dump to QA unless a catalogued copy is already there"""
+        entry = self.reused_dump
+        if entry and entry.has_copy(self.target['host'], self.target['dir_path']):
+            pieces = list_pieces(self.target_command, self.target['dir_path'], entry.dump_file, checksums=False)
+            if entry.same_pieces(pieces):
+                self.log(f"QA already holds {entry.dump_file}; skipping the transfer")
+                return
+            self.log(f"QA copy of {entry.dump_file} is missing or incomplete; copying again")
+
+        if self.multi_piece:
+            self.copy_dump_pieces()
+        else:
+            self.copy_dumpfile(self.dump_file)
+        self.catalog.add_location(self.dump_file, self.target['host'], self.target['dir_path'])
+
+    def cleanup_expired_dumps(self):
+        """Remove catalogued dump files older than the retention period from PROD/QA dir_path"""
+        sessions = {
+            self.source['host']: (self.source_session, "PROD"),
+            self.target['host']: (self.target_session, "QA"),
+        }
+        for entry in self.catalog.expired(self.dump_retention_hours * 3600):
+            if entry.dump_file == self.dump_file:
+                continue
+            for location in list(entry.locations):
+                session, server_type = sessions.get(location['host'], (None, None))
+                if session is None:
+                    # Another host; cleaned by a refresh that connects to it
+                    continue
+                try:
+                    self.execute_remote_command(
+                        session,
+                        f"cd {location['dir_path']} && rm -f {dump_glob(entry.dump_file)}",
+                        server_type
+                    )
+                    self.catalog.remove_location(entry.dump_file, location['host'], location['dir_path'])
+                    self.log(f"Removed expired dump {entry.dump_file} from {server_type} {location['dir_path']}")
+                except Exception as e:
+                    self.log(f"Warning: Could not remove {entry.dump_file} from {server_type}: {str(e)}")
+
+    def import_target(self, schemas=None, tag="", parallel=None):
+        """Import into QA with impdp; a tag imports one scheduled schema job"""
+        schemas = schemas or self.schemas
+        self.log(f"\n=== Starting Import to QA{' of ' + schemas if tag else ''} ===")
+        job_name = make_job_name("REFRESH_IMP", f"{self.timestamp}{tag}")
+        options = [
+            f"directory={self.target['dir_name']}",
+            f"dumpfile={self.dump_file_for(tag)}",
+            f"logfile=import_{self.timestamp}{tag}.log",
+            f"job_name={job_name}",
+            f"parallel={parallel or self.parallel}",
+            "table_exists_action=replace",
+            "transform=oid:n"
+        ]
+        if not (self.incremental_tables and not tag):
+            # Users, role grants and quotas are not part of a table-mode dump
+            options.append("exclude=user,role_grant,default_role,tablespace_quota")
+        options += self.export_scope(schemas, tag)
+
+        parfile = self.write_parfile(self.target_command, self.target, f"import_{self.timestamp}{tag}.par", options)
+        import_cmd = f"""
+            cd {self.target['dir_path']}
+            impdp {self.target['oracle_user']}/{self.target['oracle_password']}@{self.target['pdb_name']} \
+            parfile={parfile}"""
+
+        def clean_again():
+            # Objects the lost job already created would collide with a new one
+            if self.is_schema_mode() and not (self.incremental_tables and not tag):
+                self.log("The import starts over; cleaning the partly imported schemas again")
+                for schema in schemas.split(","):
+                    self.clean_schema(schema.strip(), force=True)
+
+        self.run_datapump(self.target_session, self.target, "QA", "impdp", job_name,
+                          f"import_{self.timestamp}{tag}.log", import_cmd, "import",
+                          expected_bytes=self.export_bytes.get(tag), fresh_start=clean_again)
+
+    def on_target_database(self, direct, fallback):
+        """Run direct(connection) when QA sessions are cx_Oracle connections, else fallback() over sqlplus"""
+        with self.target_sql.session() as sql:
+            if sql.connection is not None:
+                return direct(sql.connection)
+        return fallback()
+
+    def grant_snapshot_path(self, tag=""):
+        """Local grant snapshot file for this run (or one scheduled schema job)"""
+        return os.path.join(self.snapshot_dir, f"grants_{self.timestamp}{tag}.json")
+
+    def backup_grants(self, schemas, tag=""):
+        """Snapshot role, system, object and quota grants of the QA schemas in one query"""
+        try:
+            self.log(f"\n=== Backing up grants for {', '.join(schemas)} ===")
+            with self.span(KIND_GRANT_BACKUP, ",".join(schemas)) as current:
+                snapshot = self.on_target_database(
+                    lambda connection: capture_grants(connection, schemas),
+                    lambda: capture_grants_sqlplus(self.run_target_script, schemas)
+                )
+                os.makedirs(self.snapshot_dir, exist_ok=True)
+                path = self.grant_snapshot_path(tag)
+                snapshot.save(path)
+                current.rows = snapshot.count()
+            self.log(f"Saved {snapshot.count()} grant statements to {path}")
+
+        except Exception as e:
+            self.log(f"Warning: Error backing up grants for {', '.join(schemas)}: {str(e)}")
+            self.log("Continuing with refresh operation...")
+
+    def clean_schema(self, schema, force=False):
+        """Empty a QA schema before import using the configured clean mode.
+
+        A schema an earlier attempt of a resumed run already cleaned is
+        skipped unless ``force`` is set.
+        """
+        if self.journal and self.journal.is_cleaned(schema) and not force:
+            self.log(f"Schema {schema} was cleaned in an earlier attempt; skipping")
+            return
+        with self.span(KIND_CLEAN, schema.upper(), mode=self.clean_mode) as current:
+            current.attributes['not_dropped'] = len(self.empty_schema(schema))
+        if self.journal:
+            self.journal.mark_cleaned(schema)
+
+    def empty_schema(self, schema):
+        """Drop the schema's objects (or the user) and return the objects that could not be dropped"""
+        self.log(f"\n=== Cleaning schema {schema} ({self.clean_mode}) ===")
+        cleaner = SchemaCleaner(
+            self.run_target_script,
+            self.target_query,
+            log=self.log,
+            sessions=self.clean_sessions if self.clean_mode == CLEAN_PARALLEL else 1
+        )
+        try:
+            if self.clean_mode == CLEAN_RECREATE:
+                self.recreate_schema(cleaner, schema)
+                return []
+            remaining = cleaner.drop_objects(schema)
+        except Exception as e:
+            self.log(f"Error cleaning schema {schema}: {str(e)}")
+            raise
+
+        if remaining:
+            self.log(f"Warning: {len(remaining)} objects could not be dropped from {schema}:")
+            for object_type, name, error in remaining:
+                self.log(f"  {object_type} {name}: {error}")
+        else:
+            self.log(f"Schema {schema} is empty")
+        return remaining
+
+    def recreate_schema(self, cleaner, schema):
+        """Capture the user's DDL, keep a local copy, then drop and recreate the user"""
+        statements = cleaner.capture_user_ddl(schema)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = os.path.join(self.snapshot_dir, f"{schema.upper()}_user_{self.timestamp}.sql")
+        with open(path, "w") as f:
+            f.write(as_script(statements))
+        self.log(f"Captured {len(statements)} DDL statements for {schema} in {path}")
+
+        failed = cleaner.recreate_user(schema, statements)
+        for statement, error in failed:
+            self.log(f"Warning: could not replay '{statement}': {error}")
+        self.log(f"User {schema} dropped and recreated")
+
+    def restore_grants(self, schemas, tag=""):
+        """Replay the grant snapshot taken before the clean as one batch"""
+        try:
+            self.log(f"\n=== Restoring grants for {', '.join(schemas)} ===")
+            path = self.grant_snapshot_path(tag)
+            if not os.path.exists(path):
+                self.log(f"Warning: No grant snapshot at {path}; grants were not restored")
+                return
+            statements = GrantSnapshot.load(path).for_schemas(schemas)
+            with self.span(KIND_GRANT_RESTORE, ",".join(schemas)) as current:
+                failed = self.on_target_database(
+                    lambda connection: restore_grants(connection, statements),
+                    lambda: restore_grants_sqlplus(self.run_target_script, statements)
+                )
+                current.rows = len(statements) - len(failed)
+                current.attributes['failed'] = len(failed)
+            for statement, error in failed:
+                self.log(f"Warning: {statement.splitlines()[0]}: {error}")
+            self.log(f"Restored {len(statements) - len(failed)} of {len(statements)} grant statements")
+
+        except Exception as e:
+            self.log(f"Warning: Error restoring grants for {', '.join(schemas)}: {str(e)}")
+            self.log("Continuing with refresh operation...")
+
+    def post_refresh_tasks(self, schemas):
+        """Recompile invalid objects with UTL_RECOMP and gather statistics concurrently"""
+        try:
+            self.log("\n=== Performing post-refresh tasks ===")
+            engine = PostRefreshEngine(
+                self.run_target_script,
+                self.target_query,
+                log=self.log,
+                recompile_threads=self.recompile_threads,
+                stats_sessions=self.stats_sessions,
+                stats_mode=self.stats_mode,
+                span=self.span
+            )
+            results = engine.run([schema for schema in schemas.split(",") if schema.strip()])
+
+            self.log("\n=== Post-refresh per schema ===")
+            for result in results:
+                self.log(f"  {result}")
+            remaining = sum(result.invalid_after for result in results)
+            if remaining:
+                self.log(f"Warning: {remaining} objects are still invalid after recompilation")
+            self.log("Post-refresh tasks completed successfully")
+
+        except Exception as e:
+            self.log(f"Warning: Error in post-refresh tasks: {str(e)}")
+            self.log("Continuing with completion...")
+
+    def export_and_ship(self, schemas=None, tag="", parallel=None):
+        """Run expdp on a helper thread and ship each closed dump piece as soon as it appears"""
+        export_done = threading.Event()
+        export_failure = []
+
+        def export():
+            try:
+                self.export_source(schemas, tag, parallel)
+            except Exception as e:
+                export_failure.append(e)
+            finally:
+                export_done.set()
+
+        exporter = threading.Thread(target=export, name=f"refresh-export{tag}", daemon=True)
+        self.log(f"\n=== Pipelined export: shipping {self.filesize} pieces while expdp runs ===")
+        relay = self.make_relay()
+        shipper = self.make_shipper(relay, tag)
+        exporter.start()
+        try:
+            shipper.run(export_done, should_stop=lambda: self._cancelled.is_set() or bool(export_failure))
+        except TransferCancelled as e:
+            if not export_failure:
+                raise RefreshCancelled(str(e))
+        finally:
+            exporter.join()
+            relay.close()
+
+        if export_failure:
+            raise export_failure[0]
+        total = sum(stats.bytes_sent for stats in shipper.stats)
+        self.log(f"Shipped {len(shipper.shipped)} dump pieces ({total / 1024 / 1024:.0f} MB)")
+
+    def make_shipper(self, relay, tag="", skip=None):
+        """Piece shipper for this run's (or one schema job's) %U dump file set"""
+        return DumpPieceShipper(
+            relay,
+            self.source['dir_path'],
+            self.target['dir_path'],
+            f"refresh_{self.dump_stamp}{tag}_",
+            parse_size(self.filesize),
+            log=self.log,
+            skip=skip,
+            on_copied=self.record_copy
+        )
+
+    def record_copy(self, stats):
+        """Journal a dump file (or piece) that reached QA, with its PROD checksum when catalogued, and time it"""
+        name = stats.path.rsplit("/", 1)[-1]
+        if self.journal:
+            self.journal.record_piece(name, stats.bytes_sent, self.dump_pieces.get(name, {}).get('sha256'))
+        if self.spans is not None:
+            source, target = self.databases()
+            self.spans.record(
+                KIND_TRANSFER, name, source, target,
+                started_at=time.time() - stats.elapsed,
+                size=stats.bytes_sent,
+                wire_bytes=stats.wire_bytes,
+                codec=stats.codec
+            )
+
+    def copied_earlier(self, dump_file):
+        """Files of dump_file an earlier attempt copied to QA that are still intact there"""
+        if self.journal is None:
+            return set()
+        pattern = dump_glob(dump_file)
+        recorded = {name: piece for name, piece in self.journal.pieces().items() if fnmatch(name, pattern)}
+        if not recorded:
+            return set()
+
+        checksums = any(piece['sha256'] for piece in recorded.values())
+        on_target = {
+            piece['name']: piece
+            for piece in list_pieces(self.target_command, self.target['dir_path'], dump_file, checksums)
+        }
+        intact = set()
+        for name, piece in recorded.items():
+            found = on_target.get(name)
+            if found and found['bytes'] == piece['bytes'] and (not piece['sha256'] or found['sha256'] == piece['sha256']):
+                intact.add(name)
+            else:
+                self.journal.forget_piece(name)
+        self.log(f"{len(intact)} of {len(recorded)} dump files copied in an earlier attempt are intact on QA")
+        return intact
+
+    def copy_dump_pieces(self, tag=""):
+        """Copy every piece of a finished %U dump file set not already intact on QA"""
+        self.log("\n=== Copying dump file pieces from PROD to QA over SFTP ===")
+        skip = self.copied_earlier(self.dump_file_for(tag))
+        relay = self.make_relay()
+        try:
+            shipper = self.make_shipper(relay, tag, skip)
+            shipper.ship_ready(final=True)
+        except TransferCancelled as e:
+            raise RefreshCancelled(str(e))
+        finally:
+            relay.close()
+        total = sum(stats.bytes_sent for stats in shipper.stats)
+        self.log(f"Copied {len(shipper.shipped)} dump pieces ({total / 1024 / 1024:.0f} MB)")
+
+    def make_relay(self):
+        """SFTP relay from PROD to QA with the configured wire compression"""
+        return SftpRelay(
+            self.source_session,
+            self.target_session,
+            progress=self.report_transfer,
+            should_stop=self._cancelled.is_set,
+            codec=self.transfer_codec,
+            level=self.compression_level
+        )
+
+    def report_transfer(self, path, sent, total, rate):
+        """Relay progress callback: live throughput in the status line"""
+        if total is None:
+            # Compressed stream: only wire bytes are known
+            self.progress(
+                f"Copying {path.rsplit('/', 1)[-1]} ({self.transfer_codec}): "
+                f"{sent / 1024 / 1024:.0f} MB on the wire at {rate / 1024 / 1024:.1f} MB/s"
+            )
+            return
+        percent = sent * 100 / total if total else 100
+        self.progress(
+            f"Copying {path.rsplit('/', 1)[-1]}: {sent / 1024 / 1024:.0f}/{total / 1024 / 1024:.0f} MB "
+            f"({percent:.0f}%) at {rate / 1024 / 1024:.1f} MB/s"
+        )
+
+    def copy_dumpfile(self, dump_file):
+        """Stream the dump file from PROD to QA through this host over SFTP"""
+        if dump_file in self.copied_earlier(dump_file):
+            self.log(f"QA already holds {dump_file} from an earlier attempt; skipping the copy")
+            return
+        try:
+            codec = f" with {self.transfer_codec} -{self.compression_level}" if self.transfer_codec else ""
+            self.log(f"\n=== Copying dump file from PROD to QA over SFTP{codec} ===")
+
+            # Dump files are created 0640 by the database
+            self.execute_remote_command(self.source_session, f"chmod 644 {self.source['dir_path']}/{dump_file}", "PROD")
+
+            relay = self.make_relay()
+            try:
+                stats = relay.copy(
+                    f"{self.source['dir_path']}/{dump_file}",
+                    f"{self.target['dir_path']}/{dump_file}"
+                )
+            finally:
+                relay.close()
+
+            self.log(f"Transferred {stats}")
+            self.record_copy(stats)
+            self.log("Dump file transfer completed successfully")
+
+        except TransferCancelled as e:
+            raise RefreshCancelled(str(e))
+        except Exception as e:
+            self.log(f"Error copying dump file: {str(e)}")
+            raise
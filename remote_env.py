@@ -0,0 +1,78 @@
+import shlex
+import threading
+import time
+
+# Variables resolved from the login profile and injected into every command
+ORACLE_ENV_VARS = ("ORACLE_HOME", "ORACLE_BASE", "ORACLE_SID", "PATH", "TNS_ADMIN", "LD_LIBRARY_PATH")
+
+PROFILE_SOURCE = "source ~/.bash_profile > /dev/null 2>&1 || source ~/.profile > /dev/null 2>&1"
+
+
+class RemoteEnvCache:
+    """Per-host cache of the Oracle environment from the remote login profile.
+
+    The profile is sourced once per host and the resolved variables are
+    injected as plain ``export`` lines in front of later commands. Entries
+    expire after ``ttl`` seconds or when ``invalidate`` is called.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _key(self, session):
+        return (session.host, session.port, session.username)
+
+    def resolve(self, session):
+        """Source the profile on the host and return the Oracle variables"""
+        pattern = "|".join(ORACLE_ENV_VARS)
+        cmd = f"{PROFILE_SOURCE}; env | grep -E '^({pattern})='"
+        stdin, stdout, stderr = session.exec_command(cmd)
+        env_output = stdout.read().decode()
+
+        env_vars = {}
+        for line in env_output.splitlines():
+            if '=' in line:
+                key, value = line.split('=', 1)
+                env_vars[key.strip()] = value.strip()
+        return env_vars
+
+    def get(self, session, refresh=False):
+        """Return the cached environment for session's host, resolving it if needed"""
+        key = self._key(session)
+        with self._lock:
+            entry = self._entries.get(key)
+        if refresh or entry is None or time.monotonic() - entry[0] > self.ttl:
+            env_vars = self.resolve(session)
+            with self._lock:
+                self._entries[key] = (time.monotonic(), env_vars)
+            return env_vars
+        return entry[1]
+
+    def invalidate(self, session=None):
+        """Forget one host's environment, or every host when session is None"""
+        with self._lock:
+            if session is None:
+                self._entries = {}
+            else:
+                self._entries.pop(self._key(session), None)
+
+    def export_prefix(self, session):
+        """Shell lines that set up the Oracle environment without sourcing the profile"""
+        env_vars = self.get(session)
+        if not env_vars.get('ORACLE_HOME'):
+            # Nothing usable was resolved; fall back to the profile
+            return PROFILE_SOURCE
+        return "\n".join(
+            f"export {name}={shlex.quote(env_vars[name])}"
+            for name in ORACLE_ENV_VARS if name in env_vars
+        )
+
+    def wrap(self, session, command):
+        """Prefix command with the cached environment"""
+        return f"{self.export_prefix(session)}\n{command}"
+
+
+# Shared by the GUI and OracleRefreshOperations
+default_env_cache = RemoteEnvCache()
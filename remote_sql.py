@@ -0,0 +1,39 @@
+from remote_env import default_env_cache
+from channel_reader import run_command
+
+# Rows are selected as one string with fields joined by this separator
+FIELD_SEPARATOR = "|"
+
+QUERY_SETTINGS = "SET PAGESIZE 0 FEEDBACK OFF HEADING OFF VERIFY OFF ECHO OFF LINESIZE 32767 TRIMOUT ON TRIMSPOOL ON"
+
+
+def sql_in_list(values):
+    """Render values as a quoted, upper-cased SQL IN list"""
+    return ",".join(f"'{value.strip().upper()}'" for value in values if value.strip())
+
+
+def run_query(session, details, sql, env_cache=None):
+    """Run a query through sqlplus on the database host and return its rows.
+
+    ``sql`` must select a single column with fields joined by ``|``;
+    each returned row is a list of strings.
+    """
+    env_cache = env_cache or default_env_cache
+    statement = sql.strip().rstrip(";")
+    command = f"""
+            sqlplus -s {details['oracle_user']}/{details['oracle_password']}@{details['pdb_name']} << 'ENDOFSQL'
+            {QUERY_SETTINGS}
+            WHENEVER SQLERROR EXIT FAILURE
+            {statement};
+            EXIT;
+ENDOFSQL
+            """
+    result = run_command(session, env_cache.wrap(session, command))
+    output = result.output
+    status = result.exit_status
+
+    errors = [line.strip() for line in output.splitlines() if line.strip().startswith(("ORA-", "SP2-"))]
+    if status != 0 or errors:
+        raise Exception(f"Query failed on {details['pdb_name']}: {'; '.join(errors) or output.strip()}")
+
+    return [line.strip().split(FIELD_SEPARATOR) for line in output.splitlines() if line.strip()]
@@ -0,0 +1,230 @@
+import copy
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+# Run and stage states kept in the journal
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+RUN_CANCELLED = "cancelled"
+
+STAGE_RUNNING = "running"
+STAGE_DONE = "done"
+STAGE_FAILED = "failed"
+
+# Data Pump jobs an attempt started; a resumed run attaches to or restarts the unfinished ones
+JOB_STARTED = "started"
+JOB_COMPLETED = "completed"
+
+SECRET_KEYS = ('ssh_password', 'oracle_password')
+
+
+def redacted(config):
+    """Copy of a runner config without passwords, safe to keep on disk"""
+    def strip(value):
+        if isinstance(value, dict):
+            return {key: strip(item) for key, item in value.items() if key not in SECRET_KEYS}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+    return strip(copy.deepcopy(config))
+
+
+# user/password@connect on sqlplus and Data Pump command lines, and IDENTIFIED BY clauses in DDL
+CONNECT_PASSWORD_RE = re.compile(r"\b([A-Za-z][\w$#]*)/[^\s/]+@")
+IDENTIFIED_BY_RE = re.compile(r"""(IDENTIFIED\s+BY\s+(?:VALUES\s+)?)("[^"]*"|'[^']*'|[^\s;]+)""", re.IGNORECASE)
+
+
+def redact_text(text):
+    """Copy of a log line with Oracle passwords masked, safe to keep on disk"""
+    text = CONNECT_PASSWORD_RE.sub(r"\1/********@", text)
+    def mask(match):
+        quote = match.group(2)[0] if match.group(2)[0] in "\"'" else ""
+        return f"{match.group(1)}{quote}********{quote}"
+    return IDENTIFIED_BY_RE.sub(mask, text)
+
+
+def scope_of(config):
+    """What a run refreshes: the same scope is required to resume it"""
+    def database(details):
+        return f"{details['host']}/{details['pdb_name']}"
+    schemas = sorted(schema.strip().upper() for schema in (config.get('schemas') or "").split(",") if schema.strip())
+    return {
+        'source': database(config['source']),
+        'target': database(config['target']),
+        'refresh_type': config['refresh_type'],
+        'schemas': schemas
+    }
+
+
+class RunJournal:
+    """Durable record of one refresh, rewritten atomically after every change.
+
+    The journal holds the run's timestamp (job, dump and log names derive
+    from it), the status of each stage, the runner state later stages depend
+    on (sizing, dump layout, export SCN, incremental tables, schema jobs),
+    the Data Pump jobs that were started, the dump pieces already on QA with
+    their checksums and the schemas already cleaned. A failed, cancelled or
+    interrupted run is resumed from it: finished stages are skipped, an
+    unfinished Data Pump job is re-attached with ``ATTACH=`` when its master
+    table still exists, and only unverified pieces are copied again.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, directory, timestamp, config):
+        data = {
+            'timestamp': timestamp,
+            'status': RUN_RUNNING,
+            'started_at': time.time(),
+            'updated_at': time.time(),
+            'attempts': 1,
+            'scope': scope_of(config),
+            'config': redacted(config),
+            'stages': {},
+            'state': {},
+            'jobs': {},
+            'pieces': {},
+            'cleaned': []
+        }
+        journal = cls(os.path.join(directory, f"journal_{timestamp}.json"), data)
+        with journal._lock:
+            journal._save()
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def latest(cls, directory, config):
+        """Newest unfinished journal of the same scope as config, or None"""
+        scope = scope_of(config)
+        for path in sorted(glob.glob(os.path.join(directory, "journal_*.json")), reverse=True):
+            try:
+                journal = cls.load(path)
+            except (OSError, ValueError):
+                continue
+            if journal.status != RUN_COMPLETED and journal.data.get('scope') == scope:
+                return journal
+        return None
+
+    def _save(self):
+        self.data['updated_at'] = time.time()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+    @property
+    def timestamp(self):
+        return self.data['timestamp']
+
+    @property
+    def status(self):
+        return self.data['status']
+
+    def reopen(self):
+        """Start another attempt of the run"""
+        with self._lock:
+            self.data['status'] = RUN_RUNNING
+            self.data['attempts'] = self.data.get('attempts', 1) + 1
+            self._save()
+
+    def finish(self, status):
+        with self._lock:
+            self.data['status'] = status
+            self._save()
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+    def stage_done(self, name):
+        with self._lock:
+            return self.data['stages'].get(name, {}).get('status') == STAGE_DONE
+
+    def start_stage(self, name):
+        with self._lock:
+            self.data['stages'][name] = {'status': STAGE_RUNNING, 'started_at': time.time()}
+            self._save()
+
+    def finish_stage(self, name, status, state=None):
+        """Close a stage and store the runner state the later stages need"""
+        with self._lock:
+            stage = self.data['stages'].setdefault(name, {})
+            stage['status'] = status
+            stage['finished_at'] = time.time()
+            if state is not None:
+                self.data['state'] = state
+            self._save()
+
+    def finished_stages(self):
+        with self._lock:
+            return [name for name, stage in self.data['stages'].items() if stage.get('status') == STAGE_DONE]
+
+    def update_state(self, state):
+        with self._lock:
+            self.data['state'] = state
+            self._save()
+
+    def state(self):
+        with self._lock:
+            return dict(self.data['state'])
+
+    # ------------------------------------------------------------------
+    # Data Pump jobs
+    # ------------------------------------------------------------------
+    def record_job(self, job_name, status, server_type=None):
+        with self._lock:
+            job = self.data['jobs'].setdefault(job_name, {})
+            job['status'] = status
+            if server_type:
+                job['server_type'] = server_type
+            job['updated_at'] = time.time()
+            self._save()
+
+    def job_status(self, job_name):
+        with self._lock:
+            return self.data['jobs'].get(job_name, {}).get('status')
+
+    # ------------------------------------------------------------------
+    # Transfer and clean progress
+    # ------------------------------------------------------------------
+    def record_piece(self, name, size, sha256=None):
+        """Note a dump file (or piece) copied to QA in full"""
+        with self._lock:
+            self.data['pieces'][name] = {'bytes': size, 'sha256': sha256, 'copied_at': time.time()}
+            self._save()
+
+    def forget_piece(self, name):
+        with self._lock:
+            if self.data['pieces'].pop(name, None) is not None:
+                self._save()
+
+    def pieces(self):
+        with self._lock:
+            return dict(self.data['pieces'])
+
+    def mark_cleaned(self, schema):
+        with self._lock:
+            if schema.upper() not in self.data['cleaned']:
+                self.data['cleaned'].append(schema.upper())
+                self._save()
+
+    def is_cleaned(self, schema):
+        with self._lock:
+            return schema.upper() in self.data['cleaned']
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+SPAN_OK = "ok"
+SPAN_FAILED = "failed"
+SPAN_CANCELLED = "cancelled"
+
+# Span kinds: one per pipeline stage, and the steps inside them
+KIND_STAGE = "stage"
+KIND_ENV_PROBE = "env_probe"
+KIND_EXPORT = "export"
+KIND_TRANSFER = "transfer"
+KIND_GRANT_BACKUP = "grant_backup"
+KIND_CLEAN = "clean"
+KIND_IMPORT = "import"
+KIND_GRANT_RESTORE = "grant_restore"
+KIND_RECOMPILE = "recompile"
+KIND_STATS = "stats"
+
+METRIC_PREFIX = "oracle_refresh"
+
+
+class Span:
+    """One timed piece of a refresh; ``bytes``, ``rows`` and ``attributes`` may be filled in while it runs"""
+
+    def __init__(self, kind, name, source, target, started_at=None):
+        self.kind = kind
+        self.name = name
+        self.source = source
+        self.target = target
+        self.started_at = started_at or time.time()
+        self.ended_at = None
+        self.outcome = None
+        self.bytes = None
+        self.rows = None
+        self.attributes = {}
+
+    @property
+    def duration(self):
+        return (self.ended_at or time.time()) - self.started_at
+
+    def to_dict(self, run_id):
+        return {
+            'run_id': run_id,
+            'kind': self.kind,
+            'name': self.name,
+            'source': self.source,
+            'target': self.target,
+            'start': datetime.fromtimestamp(self.started_at).isoformat(timespec='milliseconds'),
+            'end': datetime.fromtimestamp(self.ended_at).isoformat(timespec='milliseconds'),
+            'duration_s': round(self.duration, 3),
+            'bytes': self.bytes,
+            'rows': self.rows,
+            'outcome': self.outcome,
+            'attributes': self.attributes
+        }
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class SpanRecorder:
+    """Write a refresh's spans to a JSONL file as they end, and a Prometheus textfile at the end.
+
+    Every span is appended to ``path`` as one JSON object as soon as it
+    ends, so a run that dies still leaves its spans. ``write_prometheus``
+    summarises the run for the node_exporter textfile collector: one gauge
+    per stage (seconds, count, failed) and per step kind (also bytes and
+    rows), labelled with source and target, plus the run's duration and
+    outcome labelled with ``run_labels``; the run id only appears on an info
+    gauge so series stay the same from run to run. The textfile is replaced
+    atomically, so the collector never reads half of it. Spans may be
+    recorded from several threads.
+    """
+
+    def __init__(self, path, run_id, prometheus_path=None, run_labels=None):
+        self.path = path
+        self.run_id = run_id
+        self.prometheus_path = prometheus_path
+        self.run_labels = run_labels or {}
+        self.spans = []
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, kind, name, source, target, **attributes):
+        """Time the body as a span: ok when it returns, failed when it raises, unless the body set an outcome"""
+        current = Span(kind, name, source, target)
+        current.attributes.update(attributes)
+        try:
+            yield current
+        except BaseException:
+            current.outcome = current.outcome or SPAN_FAILED
+            raise
+        else:
+            current.outcome = current.outcome or SPAN_OK
+        finally:
+            self.finish(current)
+
+    def record(self, kind, name, source, target, started_at, ended_at=None, outcome=SPAN_OK, size=None,
+               rows=None, **attributes):
+        """Add a span measured elsewhere"""
+        current = Span(kind, name, source, target, started_at)
+        current.outcome = outcome
+        current.bytes = size
+        current.rows = rows
+        current.attributes.update(attributes)
+        current.ended_at = ended_at
+        self.finish(current)
+
+    def finish(self, current):
+        current.ended_at = current.ended_at or time.time()
+        line = json.dumps(current.to_dict(self.run_id))
+        with self._lock:
+            self.spans.append(current)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def prometheus_lines(self, success):
+        """Text exposition format of this run's spans"""
+        with self._lock:
+            spans = list(self.spans)
+
+        totals = {}
+        for current in spans:
+            group = "stage" if current.kind == KIND_STAGE else "step"
+            label = current.name if current.kind == KIND_STAGE else current.kind
+            key = (group, label, current.source, current.target)
+            total = totals.setdefault(key, {'seconds': 0.0, 'bytes': 0, 'rows': 0, 'count': 0, 'failed': 0})
+            total['seconds'] += current.duration
+            total['bytes'] += current.bytes or 0
+            total['rows'] += current.rows or 0
+            total['count'] += 1
+            total['failed'] += current.outcome != SPAN_OK
+
+        metrics = [
+            ('seconds', "Seconds spent", "gauge"),
+            ('bytes', "Bytes moved", "gauge"),
+            ('rows', "Rows moved", "gauge"),
+            ('count', "Spans recorded", "gauge"),
+            ('failed', "Spans that did not complete", "gauge"),
+        ]
+        lines = []
+        for group in ("stage", "step"):
+            for field, help_text, metric_type in metrics:
+                if group == "stage" and field in ('bytes', 'rows'):
+                    # Moved data is counted on the steps inside the stages
+                    continue
+                name = f"{METRIC_PREFIX}_{group}_{field}"
+                lines.append(f"# HELP {name} {help_text} per refresh {group} in the last run")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for (key_group, label, source, target), total in sorted(totals.items()):
+                    if key_group != group:
+                        continue
+                    labels = (f'{group}="{escape_label(label)}",source="{escape_label(source)}",'
+                              f'target="{escape_label(target)}"')
+                    lines.append(f"{name}{{{labels}}} {round(total[field], 3)}")
+
+        run_labels = ",".join(f'{key}="{escape_label(value)}"' for key, value in sorted(self.run_labels.items()))
+        info_labels = ",".join(filter(None, [run_labels, f'run_id="{escape_label(self.run_id)}"']))
+        lines += [
+            f"# HELP {METRIC_PREFIX}_run_info Id of the last refresh",
+            f"# TYPE {METRIC_PREFIX}_run_info gauge",
+            f"{METRIC_PREFIX}_run_info{{{info_labels}}} 1",
+            f"# HELP {METRIC_PREFIX}_run_seconds Duration of the last refresh",
+            f"# TYPE {METRIC_PREFIX}_run_seconds gauge",
+            f"{METRIC_PREFIX}_run_seconds{{{run_labels}}} {round(time.time() - self.started_at, 3)}",
+            f"# HELP {METRIC_PREFIX}_run_success 1 when the last refresh completed",
+            f"# TYPE {METRIC_PREFIX}_run_success gauge",
+            f"{METRIC_PREFIX}_run_success{{{run_labels}}} {1 if success else 0}",
+            f"# HELP {METRIC_PREFIX}_run_end_timestamp_seconds When the last refresh ended",
+            f"# TYPE {METRIC_PREFIX}_run_end_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_run_end_timestamp_seconds{{{run_labels}}} {round(time.time(), 3)}",
+        ]
+        return lines
+
+    def write_prometheus(self, success):
+        """Replace the textfile-collector file with this run's summary, if one is configured"""
+        if not self.prometheus_path:
+            return
+        directory = os.path.dirname(self.prometheus_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # node_exporter only reads *.prom files, so the temporary name is skipped
+        temporary = f"{self.prometheus_path}.tmp"
+        with open(temporary, "w") as f:
+            f.write("\n".join(self.prometheus_lines(success)) + "\n")
+        os.replace(temporary, self.prometheus_path)
@@ -0,0 +1,238 @@
+import threading
+
+# Schema clean modes offered in the GUI
+CLEAN_OBJECTS = "objects"
+CLEAN_PARALLEL = "parallel"
+CLEAN_RECREATE = "recreate"
+CLEAN_MODES = (CLEAN_OBJECTS, CLEAN_PARALLEL, CLEAN_RECREATE)
+
+# Object types that go away with their parent and are never dropped on their own
+DEPENDENT_TYPES = (
+    'TABLE', 'INDEX', 'TABLE PARTITION', 'TABLE SUBPARTITION', 'INDEX PARTITION',
+    'INDEX SUBPARTITION', 'LOB', 'LOB PARTITION', 'LOB SUBPARTITION',
+    'PACKAGE BODY', 'TYPE BODY', 'JOB'
+)
+
+# DBMS_METADATA object types captured before DROP USER, with their filter name
+USER_METADATA = (
+    ('USER', 'NAME'),
+    ('SYSTEM_GRANT', 'GRANTEE'),
+    ('ROLE_GRANT', 'GRANTEE'),
+    ('DEFAULT_ROLE', 'GRANTEE'),
+    ('TABLESPACE_QUOTA', 'GRANTEE'),
+    ('OBJECT_GRANT', 'GRANTEE'),
+)
+
+
+def quote_literal(text):
+    """Render text as a q'...' literal so embedded quotes need no escaping"""
+    for open_char, close_char in (("[", "]"), ("{", "}"), ("<", ">"), ("~", "~"), ("#", "#"), ("!", "!")):
+        if f"{close_char}'" not in text:
+            return f"q'{open_char}{text}{close_char}'"
+    return "'" + text.replace("'", "''") + "'"
+
+
+def as_script(statements):
+    """Render captured statements as a SQL*Plus script: SQL ends in ;, PL/SQL blocks in /"""
+    lines = []
+    for statement in statements:
+        if statement.upper().startswith(("DECLARE", "BEGIN")):
+            lines.append(f"{statement}\n/")
+        else:
+            lines.append(f"{statement};")
+    return "\n".join(lines) + "\n"
+
+
+def parse_tagged(output, tag):
+    """Return the |-separated fields of every output line starting with tag|"""
+    prefix = f"{tag}|"
+    return [
+        line.strip()[len(prefix):].split("|", 2)
+        for line in output.splitlines() if line.strip().startswith(prefix)
+    ]
+
+
+class SchemaCleaner:
+    """Empty a QA schema before import.
+
+    ``run_script(script, echo=True)`` takes SQL*Plus input (PL/SQL blocks
+    ended by ``/``) and returns its output with SERVEROUTPUT on; scripts
+    carrying password hashes are run with ``echo=False``. ``query`` returns
+    rows as in ``remote_sql.run_query``. Failed drops are printed as ``DROP_FAILED``
+    lines instead of being swallowed, and whatever is still in the schema
+    afterwards is returned to the caller as ``(type, name, error)``.
+
+    ``drop_objects`` keeps the user and drops its objects, split by
+    ORA_HASH over ``sessions`` concurrent database sessions.
+    ``recreate_user`` captures the user, its grants and quotas with
+    DBMS_METADATA, runs DROP USER ... CASCADE and replays the DDL, which is
+    one dictionary operation instead of one per object.
+    """
+
+    def __init__(self, run_script, query, log=None, sessions=1):
+        self.run_script = run_script
+        self.query = query
+        self.log = log or (lambda message: None)
+        self.sessions = max(1, int(sessions))
+
+    def drop_block(self, schema, tables, bucket=0, buckets=1):
+        """PL/SQL that drops this session's share of the schema's tables or other objects"""
+        owner = schema.upper()
+        if tables:
+            cursor = f"""SELECT 'TABLE' object_type, table_name object_name FROM dba_tables
+                  WHERE owner = '{owner}' AND table_name NOT LIKE 'BIN$%'
+                  AND MOD(ORA_HASH(table_name), {buckets}) = {bucket}"""
+            statement = f"""'DROP TABLE "{owner}"."'||o.object_name||'" CASCADE CONSTRAINTS PURGE'"""
+        else:
+            types = ",".join(f"'{object_type}'" for object_type in DEPENDENT_TYPES)
+            cursor = f"""SELECT object_type, object_name FROM dba_objects
+                  WHERE owner = '{owner}' AND object_name NOT LIKE 'BIN$%'
+                  AND object_type NOT IN ({types})
+                  AND MOD(ORA_HASH(object_name), {buckets}) = {bucket}
+                  ORDER BY DECODE(object_type, 'TYPE', 2, 1)"""
+            statement = (f"""'DROP '||o.object_type||' "{owner}"."'||o.object_name||'"'||"""
+                         "CASE o.object_type WHEN 'TYPE' THEN ' FORCE' ELSE '' END")
+        return f"""
+BEGIN
+    FOR o IN ({cursor}) LOOP
+        BEGIN
+            EXECUTE IMMEDIATE {statement};
+        EXCEPTION WHEN OTHERS THEN
+            DBMS_OUTPUT.PUT_LINE('DROP_FAILED|'||o.object_type||'|'||o.object_name||'|'||SQLERRM);
+        END;
+    END LOOP;
+END;
+/
+"""
+
+    def _run_buckets(self, schema, tables):
+        """Run one drop phase across the configured number of sessions and collect failures"""
+        if self.sessions == 1:
+            return parse_tagged(self.run_script(self.drop_block(schema, tables)), "DROP_FAILED")
+
+        failures = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(bucket):
+            try:
+                output = self.run_script(self.drop_block(schema, tables, bucket, self.sessions))
+                with lock:
+                    failures.extend(parse_tagged(output, "DROP_FAILED"))
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+
+        threads = [
+            threading.Thread(target=worker, args=(bucket,), name=f"clean-{schema}-{bucket}", daemon=True)
+            for bucket in range(self.sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return failures
+
+    def remaining_objects(self, schema):
+        """Top-level objects still owned by the schema"""
+        types = ",".join(f"'{object_type}'" for object_type in DEPENDENT_TYPES if object_type != 'TABLE')
+        return self.query(
+            "SELECT object_type||'|'||object_name FROM dba_objects "
+            f"WHERE owner = '{schema.upper()}' AND object_name NOT LIKE 'BIN$%' "
+            f"AND object_type NOT IN ({types})"
+        )
+
+    def drop_objects(self, schema):
+        """Drop tables first, then everything else; return the objects that survived"""
+        self.log(f"Dropping objects of {schema} in {self.sessions} session(s)")
+        failures = self._run_buckets(schema, tables=True)
+        failures += self._run_buckets(schema, tables=False)
+
+        # Many drop errors are side effects (a trigger dropped with its table);
+        # only objects still present afterwards are worth reporting
+        errors = {(object_type, name): error for object_type, name, error in failures}
+        return [
+            (object_type, name, errors.get((object_type, name), "not dropped"))
+            for object_type, name in self.remaining_objects(schema)
+        ]
+
+    def capture_user_ddl(self, schema):
+        """Return the user's CREATE USER, grant, default role and quota DDL as single-line statements"""
+        calls = "\n".join(f"    emit('{object_type}', '{filter_name}');" for object_type, filter_name in USER_METADATA)
+        script = f"""
+DECLARE
+    PROCEDURE emit(p_type VARCHAR2, p_filter VARCHAR2) IS
+        h    NUMBER;
+        th   NUMBER;
+        ddls sys.ku$_ddls;
+    BEGIN
+        h := DBMS_METADATA.OPEN(p_type);
+        DBMS_METADATA.SET_FILTER(h, p_filter, '{schema.upper()}');
+        th := DBMS_METADATA.ADD_TRANSFORM(h, 'DDL');
+        LOOP
+            ddls := DBMS_METADATA.FETCH_DDL(h);
+            EXIT WHEN ddls IS NULL;
+            FOR i IN 1 .. ddls.COUNT LOOP
+                DBMS_OUTPUT.PUT_LINE('DDL|'||TRIM(REPLACE(REPLACE(
+                    DBMS_LOB.SUBSTR(ddls(i).ddltext, 32000, 1), CHR(10), ' '), CHR(13), ' ')));
+            END LOOP;
+        END LOOP;
+        DBMS_METADATA.CLOSE(h);
+    END;
+BEGIN
+{calls}
+END;
+/
+"""
+        output = self.run_script(script, echo=False)
+        statements = ["|".join(fields) for fields in parse_tagged(output, "DDL")]
+        if not statements or not statements[0].upper().startswith("CREATE USER"):
+            raise Exception(f"Could not capture CREATE USER DDL for {schema}; not dropping it")
+        return statements
+
+    def recreate_user(self, schema, statements):
+        """Drop the user with CASCADE and replay its captured DDL; return statements that failed"""
+        owner = schema.upper()
+        self.log(f"Dropping user {owner} with CASCADE")
+        output = self.run_script(f"""
+BEGIN
+    EXECUTE IMMEDIATE 'ALTER USER "{owner}" ACCOUNT LOCK';
+    FOR s IN (SELECT sid, serial# serial FROM v$session WHERE username = '{owner}') LOOP
+        BEGIN
+            EXECUTE IMMEDIATE 'ALTER SYSTEM KILL SESSION '''||s.sid||','||s.serial||''' IMMEDIATE';
+        EXCEPTION WHEN OTHERS THEN
+            DBMS_OUTPUT.PUT_LINE('KILL_FAILED|'||s.sid||','||s.serial||'|'||SQLERRM);
+        END;
+    END LOOP;
+    EXECUTE IMMEDIATE 'DROP USER "{owner}" CASCADE';
+    DBMS_OUTPUT.PUT_LINE('USER_DROPPED');
+END;
+/
+""")
+        for session, error in parse_tagged(output, "KILL_FAILED"):
+            self.log(f"Warning: could not kill session {session} of {owner}: {error}")
+        if "USER_DROPPED" not in output:
+            raise Exception(f"DROP USER {owner} CASCADE failed")
+
+        self.log(f"Recreating user {owner} from {len(statements)} captured statements")
+        calls = "\n".join(f"    run({quote_literal(statement)});" for statement in statements)
+        script = f"""
+DECLARE
+    PROCEDURE run(p_ddl VARCHAR2) IS
+    BEGIN
+        EXECUTE IMMEDIATE p_ddl;
+    EXCEPTION WHEN OTHERS THEN
+        DBMS_OUTPUT.PUT_LINE('DDL_FAILED|'||SUBSTR(p_ddl, 1, 200)||'|'||SQLERRM);
+    END;
+BEGIN
+{calls}
+END;
+/
+"""
+        output = self.run_script(script, echo=False)
+        failed = parse_tagged(output, "DDL_FAILED")
+        if any(statement.upper().startswith("CREATE USER") for statement, error in failed):
+            raise Exception(f"Could not recreate user {owner}: {failed[0][1]}")
+        return failed
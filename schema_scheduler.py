@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from remote_sql import sql_in_list
+
+GB = 1024 ** 3
+
+
+class SchemaJob:
+    """One Data Pump export/import job covering one or more schemas"""
+
+    def __init__(self, index, schemas, size_bytes):
+        self.index = index
+        self.schemas = schemas
+        self.size_bytes = size_bytes
+        self.status = "PENDING"
+        self.error = None
+        self.elapsed = 0.0
+
+    @property
+    def tag(self):
+        """Suffix for this job's dump, log and job names"""
+        return f"_J{self.index}"
+
+    def __str__(self):
+        return f"job {self.index} [{','.join(self.schemas)}] {self.size_bytes / GB:.1f} GB"
+
+
+def schema_sizes(query, schemas):
+    """Return {schema: bytes} from dba_segments; schemas without segments count as 0"""
+    rows = query(
+        "SELECT owner||'|'||SUM(bytes) FROM dba_segments "
+        f"WHERE owner IN ({sql_in_list(schemas)}) GROUP BY owner"
+    )
+    sizes = {schema.strip().upper(): 0 for schema in schemas if schema.strip()}
+    for owner, size in rows:
+        sizes[owner] = int(size)
+    return sizes
+
+
+def pack_schema_jobs(sizes, min_job_bytes=GB):
+    """Bin-pack schemas into jobs, largest first.
+
+    A schema of at least min_job_bytes gets a job of its own. Smaller
+    schemas are packed first-fit-decreasing into shared jobs of up to
+    min_job_bytes, so tiny schemas do not each pay Data Pump job start-up.
+    Jobs are returned largest first (LPT order) so the long ones start
+    early and the short ones fill the gaps.
+    """
+    ordered = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+    bins = []
+    for schema, size in ordered:
+        if size >= min_job_bytes:
+            bins.append([[schema], size])
+            continue
+        for packed in bins:
+            if packed[1] < min_job_bytes and packed[1] + size <= min_job_bytes:
+                packed[0].append(schema)
+                packed[1] += size
+                break
+        else:
+            bins.append([[schema], size])
+
+    bins.sort(key=lambda packed: packed[1], reverse=True)
+    return [SchemaJob(index, schemas, size) for index, (schemas, size) in enumerate(bins, 1)]
+
+
+class SchemaScheduler:
+    """Run per-schema refresh jobs concurrently under per-host limits.
+
+    ``run_job(job, export_slot, import_slot)`` performs one job's export,
+    transfer and import; it must hold ``export_slot`` while exporting on the
+    source and ``import_slot`` while cleaning/importing on the target. Jobs
+    are queued largest first, so a small schema can import while a large
+    one is still exporting and neither host sits idle. A failed job does not
+    stop the others; once ``should_stop`` returns True, queued jobs are
+    skipped and running ones are marked CANCELLED when they raise.
+    """
+
+    def __init__(self, jobs, export_concurrency=2, import_concurrency=2, log=None, should_stop=None):
+        self.jobs = jobs
+        self.export_concurrency = max(1, export_concurrency)
+        self.import_concurrency = max(1, import_concurrency)
+        self.export_slot = threading.BoundedSemaphore(self.export_concurrency)
+        self.import_slot = threading.BoundedSemaphore(self.import_concurrency)
+        self.log = log or (lambda message: None)
+        self.should_stop = should_stop or (lambda: False)
+
+    def _run_one(self, job, run_job):
+        if self.should_stop():
+            job.status = "CANCELLED"
+            return
+        job.status = "RUNNING"
+        started = time.monotonic()
+        try:
+            run_job(job, self.export_slot, self.import_slot)
+            job.status = "COMPLETED"
+        except Exception as e:
+            job.error = e
+            if self.should_stop():
+                job.status = "CANCELLED"
+            else:
+                job.status = "FAILED"
+                self.log(f"Schema {job} failed: {str(e)}")
+        finally:
+            job.elapsed = time.monotonic() - started
+
+    def run(self, run_job):
+        """Run every job and return them with status, error and elapsed time filled in"""
+        workers = min(len(self.jobs), self.export_concurrency + self.import_concurrency)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="schema-job") as pool:
+            for job in self.jobs:
+                pool.submit(self._run_one, job, run_job)
+        return self.jobs
@@ -0,0 +1,294 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from remote_env import default_env_cache
+from remote_sql import FIELD_SEPARATOR, QUERY_SETTINGS
+
+# Session settings shared by scripts and queries
+SESSION_SETTINGS = (
+    f"{QUERY_SETTINGS}\n"
+    "SET SERVEROUTPUT ON SIZE UNLIMITED FORMAT WRAPPED\n"
+    "SET DEFINE OFF SQLBLANKLINES ON TAB OFF\n"
+)
+
+
+def query_errors(lines):
+    return [line.strip() for line in lines if line.strip().startswith(("ORA-", "SP2-"))]
+
+
+class SqlPlusSession:
+    """One long-lived sqlplus process on an SSH channel.
+
+    The process is started once with ``/nolog`` and logged in with CONNECT
+    over stdin, so the password never shows up in ``ps``. Each call writes
+    the script followed by ``PROMPT <sentinel>`` and reads stdout up to the
+    sentinel line, which frames the result without restarting sqlplus.
+    ``run_script`` returns the raw output like a heredoc run would;
+    ``query`` returns rows split on ``|`` like ``remote_sql.run_query``.
+    """
+
+    connection = None
+
+    def __init__(self, ssh_session, details, env_cache=None):
+        self.ssh_session = ssh_session
+        self.details = details
+        self.env_cache = env_cache or default_env_cache
+        self._token = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._stdin = None
+        self._stdout = None
+        self._channel = None
+
+    def is_alive(self):
+        return self._channel is not None and not self._channel.exit_status_ready()
+
+    def open(self):
+        """Start sqlplus and log in"""
+        # stderr is folded into stdout so it cannot fill up unread and stall the session
+        command = self.env_cache.wrap(self.ssh_session, "sqlplus -s /nolog 2>&1")
+        self._stdin, self._stdout, stderr = self.ssh_session.exec_command(command)
+        self._channel = self._stdout.channel
+        output = self._exchange(
+            f"CONNECT {self.details['oracle_user']}/{self.details['oracle_password']}@{self.details['pdb_name']}\n"
+            f"{SESSION_SETTINGS}"
+        )
+        errors = query_errors(output.splitlines())
+        if errors:
+            self.close()
+            raise Exception(f"sqlplus login to {self.details['pdb_name']} failed: {'; '.join(errors)}")
+        return self
+
+    def _exchange(self, script, on_line=None):
+        """Send script, then read its output up to the sentinel"""
+        sentinel = f"__END_{self._token}__"
+        self._stdin.write(f"{script.rstrip()}\nPROMPT {sentinel}\n")
+        self._stdin.flush()
+
+        output = []
+        while True:
+            line = self._stdout.readline()
+            if not line:
+                self.close()
+                raise Exception(f"sqlplus session to {self.details['pdb_name']} ended unexpectedly")
+            if line.strip() == sentinel:
+                return "".join(output)
+            output.append(line)
+            if on_line:
+                on_line(line.rstrip("\n"))
+
+    def run_script(self, script, on_line=None):
+        """Run SQL*Plus input (PL/SQL blocks ended by /) and return its output"""
+        with self._lock:
+            return self._exchange(script, on_line)
+
+    def query(self, sql):
+        """Run a single-column query and return rows split on |"""
+        statement = sql.strip().rstrip(";")
+        with self._lock:
+            output = self._exchange(f"{statement};")
+        lines = output.splitlines()
+        errors = query_errors(lines)
+        if errors:
+            raise Exception(f"Query failed on {self.details['pdb_name']}: {'; '.join(errors)}")
+        return [line.strip().split(FIELD_SEPARATOR) for line in lines if line.strip()]
+
+    def close(self):
+        if self._channel is not None:
+            try:
+                if not self._channel.exit_status_ready():
+                    self._stdin.write("EXIT\n")
+                    self._stdin.flush()
+            except Exception:
+                pass
+            self._channel.close()
+        self._channel = None
+
+
+def split_script(script):
+    """Split SQL*Plus input into statements cx_Oracle can execute.
+
+    Understands what the refresh scripts use: PL/SQL blocks ended by a
+    ``/`` line, ``EXEC`` one-liners and SQL ended by ``;``. ``SET`` and
+    ``PROMPT`` lines are SQL*Plus-only and skipped.
+    """
+    statements = []
+    current = []
+    plsql = False
+    for line in script.splitlines():
+        stripped = line.strip()
+        if not current:
+            upper = stripped.upper()
+            if not stripped or upper.startswith(("SET ", "PROMPT", "--")):
+                continue
+            if upper.startswith("EXEC "):
+                statements.append(f"BEGIN {stripped[5:].rstrip(';')}; END;")
+                continue
+            plsql = upper.startswith(("DECLARE", "BEGIN"))
+        if plsql and stripped == "/":
+            statements.append("\n".join(current))
+            current = []
+            continue
+        current.append(line)
+        if not plsql and stripped.endswith(";"):
+            statements.append("\n".join(current).strip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+class OracleClientSession:
+    """The SqlPlusSession interface on a pooled cx_Oracle connection.
+
+    Used when Oracle client libraries are installed here and the database
+    listener is reachable. DBMS_OUTPUT is collected after every statement
+    and errors are returned as ``ORA-`` lines, so callers parse the output
+    exactly as they would sqlplus output.
+    """
+
+    def __init__(self, pool, details):
+        self.pool = pool
+        self.details = details
+        self.connection = pool.acquire()
+        self._lock = threading.Lock()
+        cursor = self.connection.cursor()
+        cursor.callproc("DBMS_OUTPUT.ENABLE", [None])
+        cursor.close()
+
+    def is_alive(self):
+        try:
+            self.connection.ping()
+            return True
+        except Exception:
+            return False
+
+    def _output(self, cursor):
+        lines_var = cursor.arrayvar(str, 1000, 32767)
+        count_var = cursor.var(int)
+        lines = []
+        while True:
+            count_var.setvalue(0, 1000)
+            cursor.callproc("DBMS_OUTPUT.GET_LINES", (lines_var, count_var))
+            count = count_var.getvalue()
+            lines.extend(line or "" for line in lines_var.getvalue()[:count])
+            if count < 1000:
+                return lines
+
+    def run_script(self, script, on_line=None):
+        output = []
+        with self._lock:
+            cursor = self.connection.cursor()
+            try:
+                for statement in split_script(script):
+                    try:
+                        cursor.execute(statement)
+                        lines = self._output(cursor)
+                    except Exception as e:
+                        lines = self._output(cursor) + [str(e)]
+                    for line in lines:
+                        output.append(line)
+                        if on_line:
+                            on_line(line)
+            finally:
+                cursor.close()
+        return "".join(f"{line}\n" for line in output)
+
+    def query(self, sql):
+        with self._lock:
+            cursor = self.connection.cursor()
+            try:
+                cursor.arraysize = 1000
+                cursor.execute(sql.strip().rstrip(";"))
+                return [str(row[0]).split(FIELD_SEPARATOR) for row in cursor]
+            except Exception as e:
+                raise Exception(f"Query failed on {self.details['pdb_name']}: {str(e)}")
+            finally:
+                cursor.close()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.pool.release(self.connection)
+            except Exception:
+                pass
+        self.connection = None
+
+
+class SqlSessionPool:
+    """Reusable SQL sessions to one database, opened on demand.
+
+    Steps borrow a session, run any number of scripts and queries on it and
+    hand it back, so sqlplus start-up, login and profile sourcing are paid
+    once per session instead of once per step. Steps that run concurrently
+    (parallel clean, statistics sessions, scheduled schema jobs) each get
+    their own session, up to ``max_sessions``.
+
+    With an ``oracle_pool`` whose client libraries load, sessions are
+    cx_Oracle connections; if the first direct connection fails, the pool
+    falls back to sqlplus over SSH for good.
+    """
+
+    def __init__(self, ssh_session, details, env_cache=None, oracle_pool=None, log=None, max_sessions=16):
+        self.ssh_session = ssh_session
+        self.details = details
+        self.env_cache = env_cache or default_env_cache
+        self.oracle_pool = oracle_pool
+        self.log = log or (lambda message: None)
+        self.direct = None
+        self._idle = []
+        self._all = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_sessions)
+
+    def _open(self):
+        if self.direct is None:
+            self.direct = bool(self.oracle_pool and self.oracle_pool.available())
+        if self.direct:
+            try:
+                return OracleClientSession(self.oracle_pool.pool_for(self.details), self.details)
+            except Exception as e:
+                self.direct = False
+                self.log(f"Direct connection to {self.details['pdb_name']} failed ({str(e)}); using sqlplus over SSH")
+        return SqlPlusSession(self.ssh_session, self.details, self.env_cache).open()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session; it is returned to the pool unless it died"""
+        self._slots.acquire()
+        sql = None
+        try:
+            with self._lock:
+                while self._idle and sql is None:
+                    candidate = self._idle.pop()
+                    if candidate.is_alive():
+                        sql = candidate
+                    else:
+                        self._all.remove(candidate)
+            if sql is None:
+                sql = self._open()
+                with self._lock:
+                    self._all.append(sql)
+            yield sql
+        finally:
+            if sql is not None:
+                with self._lock:
+                    if sql.is_alive():
+                        self._idle.append(sql)
+                    elif sql in self._all:
+                        self._all.remove(sql)
+            self._slots.release()
+
+    def run_script(self, script, on_line=None):
+        with self.session() as sql:
+            return sql.run_script(script, on_line)
+
+    def query(self, sql_text):
+        with self.session() as sql:
+            return sql.query(sql_text)
+
+    def close(self):
+        with self._lock:
+            for sql in self._all:
+                sql.close()
+            self._all = []
+            self._idle = []
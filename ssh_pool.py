@@ -0,0 +1,142 @@
+import threading
+
+
+class PooledSession:
+    """Long-lived SSH connection to one host/user.
+
+    Exposes ``exec_command`` and ``open_sftp`` like ``paramiko.SSHClient`` so
+    callers can use it in place of a client, but every call only opens a new
+    channel on an already authenticated transport. A dead transport is
+    reconnected transparently. When the server refuses another channel
+    (OpenSSH ``MaxSessions``, 10 by default) an extra transport is opened
+    alongside the first one.
+    """
+
+    def __init__(self, host, username, password, port=22, keepalive=30, timeout=30):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # paramiko takes a noticeable share of start-up; load it with the first connection
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            timeout=self.timeout
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def _active_clients(self):
+        """Drop dead transports and make sure at least one live one exists"""
+        with self._lock:
+            alive = []
+            for client in self._clients:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active():
+                    alive.append(client)
+                else:
+                    client.close()
+            if not alive:
+                alive.append(self._connect())
+            self._clients = alive
+            return list(alive)
+
+    def _add_client(self):
+        with self._lock:
+            client = self._connect()
+            self._clients.append(client)
+            return client
+
+    def is_active(self):
+        with self._lock:
+            return any(
+                client.get_transport() is not None and client.get_transport().is_active()
+                for client in self._clients
+            )
+
+    def connect(self):
+        """Open the first transport if needed"""
+        self._active_clients()
+        return self
+
+    def _open(self, opener):
+        """Run opener(client) on the first transport that accepts a new channel"""
+        import paramiko
+
+        for attempt in range(2):
+            for client in self._active_clients():
+                try:
+                    return opener(client)
+                except paramiko.ChannelException:
+                    # Channel limit reached on this transport, try the next one
+                    continue
+                except (paramiko.SSHException, EOFError, OSError):
+                    if attempt:
+                        raise
+                    # Transport died between the liveness check and the open
+                    client.close()
+                    break
+            else:
+                return opener(self._add_client())
+
+    def exec_command(self, command, **kwargs):
+        """Run command on a new channel and return (stdin, stdout, stderr)"""
+        return self._open(lambda client: client.exec_command(command, **kwargs))
+
+    def open_sftp(self):
+        """Open an SFTP session on a new channel"""
+        return self._open(lambda client: client.open_sftp())
+
+    def get_transport(self):
+        return self._active_clients()[0].get_transport()
+
+    def close(self):
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+
+
+class SSHSessionPool:
+    """Keyed pool of PooledSession objects, one per (host, port, user)"""
+
+    def __init__(self, keepalive=30):
+        self.keepalive = keepalive
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, username, password, port=22):
+        """Return a connected session, reusing the existing transport when possible"""
+        key = (host, port, username)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and session.password != password:
+                # Credentials changed; drop the old transport
+                session.close()
+                session = None
+            if session is None:
+                session = PooledSession(host, username, password, port=port, keepalive=self.keepalive)
+                self._sessions[key] = session
+        return session.connect()
+
+    def close_all(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+# Shared by the GUI and OracleRefreshOperations
+default_pool = SSHSessionPool()
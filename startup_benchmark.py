@@ -0,0 +1,160 @@
+"""Measure GUI start-up: import time and time to first paint.
+
+    python startup_benchmark.py            # 5 runs, text report
+    python startup_benchmark.py --json     # one JSON object, for tracking across releases
+
+Import time comes from ``python -X importtime -c "import oracle_refresh_gui"``
+(cumulative microseconds of each top-level import). Paint times are measured
+from launching ``oracle_refresh_gui.py`` until the probe reports that the
+window was first mapped (``first_paint``) and that every section was built
+(``ready``); this includes interpreter start-up. The medians are compared
+against the budgets below and the exit code is 1 when one is exceeded.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Budgets in milliseconds, tracked across releases
+IMPORT_BUDGET_MS = 700
+FIRST_PAINT_BUDGET_MS = 1500
+READY_BUDGET_MS = 2500
+
+PROBE_ENV = "ORACLE_REFRESH_STARTUP_PROBE"
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def probe(root, app):
+    """Installed by oracle_refresh_gui when PROBE_ENV is set: report paint milestones, then quit"""
+    def report(milestone):
+        sys.stdout.write(f"{milestone}\n")
+        sys.stdout.flush()
+
+    def on_map(event):
+        if event.widget is root:
+            root.unbind("<Map>")
+            # The window is drawn once Tk is idle after mapping it
+            root.after_idle(lambda: report("first_paint"))
+
+    def wait_until_built():
+        if app.is_built():
+            root.update_idletasks()
+            report("ready")
+            root.after(0, root.destroy)
+        else:
+            root.after(10, wait_until_built)
+
+    root.bind("<Map>", on_map)
+    root.after(0, wait_until_built)
+
+
+def import_times(module="oracle_refresh_gui", top=10):
+    """Total import time of module and its slowest top-level imports, in ms"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    entries = []
+    total = 0
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2].rstrip()
+        # Nesting is shown as two extra spaces per level after the separator's one
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            total = cumulative / 1000
+        elif depth == 1:
+            entries.append((name.strip(), cumulative / 1000))
+    # Entries printed before the module line belong to earlier imports (site, encodings)
+    slowest = sorted(entries, key=lambda entry: -entry[1])[:top]
+    return total, slowest
+
+
+def paint_times(timeout=60):
+    """Launch the GUI once with the probe and return (first_paint_ms, ready_ms)"""
+    env = dict(os.environ, **{PROBE_ENV: "1"})
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "oracle_refresh_gui.py")],
+        cwd=HERE, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    milestones = {}
+    try:
+        for line in process.stdout:
+            milestones[line.strip()] = (time.perf_counter() - started) * 1000
+            if "ready" in milestones:
+                break
+        process.wait(timeout=timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    if "ready" not in milestones:
+        raise RuntimeError(f"GUI exited without reaching ready: {process.stderr.read().strip()[-500:]}")
+    return milestones.get("first_paint", milestones["ready"]), milestones["ready"]
+
+
+def run(runs):
+    """Median import, first paint and ready times over runs"""
+    imports = []
+    slowest = []
+    first_paints = []
+    readies = []
+    for _ in range(runs):
+        total, slowest = import_times()
+        imports.append(total)
+        first_paint, ready = paint_times()
+        first_paints.append(first_paint)
+        readies.append(ready)
+
+    report = {
+        'runs': runs,
+        'python': sys.version.split()[0],
+        'import_ms': round(statistics.median(imports), 1),
+        'first_paint_ms': round(statistics.median(first_paints), 1),
+        'ready_ms': round(statistics.median(readies), 1),
+        'slowest_imports_ms': [[name, round(ms, 1)] for name, ms in slowest],
+        'budgets_ms': {
+            'import_ms': IMPORT_BUDGET_MS,
+            'first_paint_ms': FIRST_PAINT_BUDGET_MS,
+            'ready_ms': READY_BUDGET_MS
+        }
+    }
+    report['over_budget'] = [key for key, budget in report['budgets_ms'].items() if report[key] > budget]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure GUI import time and time to first paint")
+    parser.add_argument("--runs", type=int, default=5, help="launches to take the median over")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON object")
+    args = parser.parse_args(argv)
+
+    report = run(max(1, args.runs))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"Median of {report['runs']} runs (Python {report['python']})")
+        for key, budget in report['budgets_ms'].items():
+            flag = "OVER" if key in report['over_budget'] else "ok"
+            print(f"  {key:<16} {report[key]:8.1f} ms  budget {budget} ms  {flag}")
+        print("  Slowest imports:")
+        for name, ms in report['slowest_imports_ms']:
+            print(f"    {name:<30} {ms:8.1f} ms")
+    return 1 if report['over_budget'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
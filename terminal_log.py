@@ -0,0 +1,113 @@
+import os
+import threading
+import tkinter as tk
+from datetime import datetime
+from run_journal import redact_text
+
+
+class TerminalLogSink:
+    """Batched, bounded writer for the Operation Log widget.
+
+    ``write`` only appends to a pending buffer and is safe to call from any
+    thread. ``flush`` runs on the Tk thread once per frame: it inserts every
+    pending line with a single ``insert`` call (highlight tags included),
+    trims the widget to the last ``max_lines`` lines and appends the batch to
+    the run log on disk, so trimmed lines are never lost. Oracle passwords in
+    echoed commands and DDL are masked before the batch reaches the disk.
+
+    The sink may be created before its widget exists (``widget=None``);
+    lines written until ``attach`` are kept and shown on the first flush
+    after it.
+    """
+
+    FLUSH_MS = 50
+
+    ERROR_MARKERS = ("error", "ora-", "failed", "fatal")
+    SUCCESS_MARKERS = ("successfully", "success!")
+
+    def __init__(self, root, widget, max_lines=5000, log_dir="logs"):
+        self.root = root
+        self.widget = widget
+        self.max_lines = max_lines
+        self.log_dir = log_dir
+        self.log_path = None
+        self._log_file = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def attach(self, widget):
+        """Show pending and later lines in widget"""
+        self.widget = widget
+
+    def start(self):
+        """Begin flushing pending lines every frame"""
+        self.root.after(self.FLUSH_MS, self._flush_loop)
+
+    def _flush_loop(self):
+        self.flush()
+        self.root.after(self.FLUSH_MS, self._flush_loop)
+
+    def classify(self, message):
+        """Return the highlight tag for a log line"""
+        lowered = message.lower()
+        if any(marker in lowered for marker in self.ERROR_MARKERS):
+            return "error"
+        if any(marker in lowered for marker in self.SUCCESS_MARKERS):
+            return "success"
+        return ()
+
+    def write(self, message):
+        """Queue a timestamped line for the next flush"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        with self._lock:
+            self._pending.append((timestamp, message))
+
+    def start_run_log(self, name):
+        """Route the on-disk copy of the log to a new file for this run"""
+        self.close()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.log_path = os.path.join(self.log_dir, f"{name}.log")
+
+    def flush(self):
+        """Insert all pending lines in one batch and enforce the line cap"""
+        with self._lock:
+            if not self._pending or self.widget is None:
+                return
+            batch, self._pending = self._pending, []
+
+        insert_args = []
+        disk_lines = []
+        for timestamp, message in batch:
+            insert_args.extend((f"{timestamp} - ", "timestamp", f"{message}\n", self.classify(message)))
+            disk_lines.append(f"{timestamp} - {redact_text(message)}\n")
+
+        self.widget.insert(tk.END, *insert_args)
+        self._trim()
+        self.widget.see(tk.END)
+        self._write_disk("".join(disk_lines))
+
+    def _trim(self):
+        """Drop the oldest lines once the widget holds more than max_lines"""
+        # Every line ends with a newline, so "end-1c" sits on an empty last line
+        line_count = int(self.widget.index("end-1c").split(".")[0]) - 1
+        excess = line_count - self.max_lines
+        if excess > 0:
+            self.widget.delete("1.0", f"{excess + 1}.0")
+
+    def _write_disk(self, text):
+        if self.log_path is None:
+            self.start_run_log(f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        try:
+            if self._log_file is None:
+                self._log_file = open(self.log_path, "a", encoding="utf-8")
+            self._log_file.write(text)
+            self._log_file.flush()
+        except OSError:
+            # The widget is still the primary log; never fail a refresh over disk logging
+            pass
+
+    def close(self):
+        """Close the current run log file"""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None